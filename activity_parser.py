@@ -0,0 +1,68 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional; without it pages are decoded with the json module
+    orjson = None
+
+# Every activity field the store, rollups and analytics read. The rest of a summary (map
+# polylines, the nested athlete, kudos, speeds, ...) is most of a page's bytes and is dropped
+ACTIVITY_FIELDS = ('id', 'type', 'start_date', 'start_date_local', 'distance', 'moving_time', 'total_elevation_gain')
+# Activity streams kept for stream-based best efforts (see stream_store.py), in stored row order
+STREAM_KEYS = ('time', 'distance', 'heartrate', 'altitude')
+
+
+def parse_activity_page(body):
+    """Activities of one /athlete/activities response body (bytes), projected to ACTIVITY_FIELDS
+
+    Decoded with orjson when it is installed. Each activity becomes a small dict of just
+    those fields (None when Strava left one out), so neither a page kept in memory nor the
+    JSON the store writes for it carries anything the app never reads.
+    """
+    activities = orjson.loads(body) if orjson is not None else json.loads(body)
+    # Spelled out rather than a comprehension over ACTIVITY_FIELDS: about twice as fast
+    return [{
+        'id': activity.get('id'),
+        'type': activity.get('type'),
+        'start_date': activity.get('start_date'),
+        'start_date_local': activity.get('start_date_local'),
+        'distance': activity.get('distance'),
+        'moving_time': activity.get('moving_time'),
+        'total_elevation_gain': activity.get('total_elevation_gain'),
+    } for activity in activities]
+
+
+def parse_activity_detail(body):
+    """best_efforts and splits_standard of one /activities/{id} response body (bytes)
+
+    Only the fields the best-efforts store keeps are projected; either list is empty when
+    Strava has none (e.g. for anything but a run with GPS).
+    """
+    activity = orjson.loads(body) if orjson is not None else json.loads(body)
+    return {
+        'best_efforts': [{
+            'name': effort.get('name'),
+            'distance': effort.get('distance'),
+            'elapsed_time': effort.get('elapsed_time'),
+            'moving_time': effort.get('moving_time'),
+            'start_date': effort.get('start_date'),
+            'start_date_local': effort.get('start_date_local'),
+        } for effort in activity.get('best_efforts') or ()],
+        'splits_standard': [{
+            'split': split.get('split'),
+            'distance': split.get('distance'),
+            'elapsed_time': split.get('elapsed_time'),
+            'moving_time': split.get('moving_time'),
+            'elevation_difference': split.get('elevation_difference'),
+        } for split in activity.get('splits_standard') or ()],
+    }
+
+
+def parse_activity_streams(body):
+    """Sample lists by STREAM_KEYS name of one /activities/{id}/streams?key_by_type=true body (bytes)
+
+    Streams Strava did not record (e.g. heartrate without a monitor) are left out; an
+    activity without GPS has none at all.
+    """
+    streams = orjson.loads(body) if orjson is not None else json.loads(body)
+    return {key: streams[key]['data'] for key in STREAM_KEYS if isinstance(streams.get(key), dict)}
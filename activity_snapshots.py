@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from rollup import normalize_type
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional; without it the frame is built from the stored JSON
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+# Resolution pandas gives ISO-8601 strings ('ns' before pandas 3, 'us' since)
+_PARSED_UNIT = pd.to_datetime(pd.Series(['2024-01-01T00:00:00Z'], dtype='string'), utc=True,
+                              format='ISO8601').dt.unit
+
+
+class ActivitySnapshots:
+    """Columnar on-disk copies of each athlete's activities, for loading analysis frames fast
+
+    One uncompressed Arrow IPC file per athlete and year (<root>/<athlete_id>/<year>.arrow)
+    holds just the analytic columns, sorted by start_date, with the same types
+    charts.prepare_activity_frame produces. Files are memory-mapped and the requested window
+    is sliced out with a binary search on start_date, so a load only touches the years it
+    needs and skips JSON parsing altogether. A snapshot records the store's data version
+    it was written at and is rewritten on the first load after that version changes.
+    """
+
+    def __init__(self, store, root):
+        if pa is None:
+            raise RuntimeError('Activity snapshots need pyarrow (pip install pyarrow)')
+        self.store = store
+        self.root = root
+        self._locks = defaultdict(threading.Lock)
+        os.makedirs(root, exist_ok=True)
+
+    def load_frame(self, athlete_id, start_timestamp, end_timestamp):
+        """Typed activity frame for start_date in [start, end], like prepare_activity_frame"""
+        directory = os.path.join(self.root, str(athlete_id))
+        version = self.store.get_data_version(athlete_id)
+        with self._locks[athlete_id]:
+            if _read_manifest(directory).get('version') != version:
+                self._write(athlete_id, directory, version)
+
+        start = pd.Timestamp(start_timestamp, unit='s', tz='UTC')
+        end = pd.Timestamp(end_timestamp, unit='s', tz='UTC')
+        tables = []
+        for year in range(start.year, end.year + 1):
+            path = os.path.join(directory, f'{year}.arrow')
+            if not os.path.exists(path):
+                continue
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+            # Rows are sorted by start_date, so the window is a zero-copy slice
+            starts = table.column('start_date').to_numpy()
+            first = np.searchsorted(starts, start.to_datetime64(), side='left')
+            last = np.searchsorted(starts, end.to_datetime64(), side='right')
+            tables.append(table.slice(first, last - first))
+        return _to_frame(pa.concat_tables(tables) if tables else _empty_table())
+
+    def _write(self, athlete_id, directory, version):
+        """Rewrite an athlete's yearly files from the store's typed columns"""
+        table = _table(self.store.get_activity_columns(athlete_id))
+        years = pd.DatetimeIndex(table.column('start_date').to_numpy()).year.to_numpy()
+        os.makedirs(directory, exist_ok=True)
+        written = set()
+        for year in np.unique(years):
+            indices = np.flatnonzero(years == year)
+            path = os.path.join(directory, f'{year}.arrow')
+            _write_atomic(path, table.slice(indices[0], len(indices)))
+            written.add(f'{year}.arrow')
+        for name in os.listdir(directory):
+            if name.endswith('.arrow') and name not in written:
+                os.remove(os.path.join(directory, name))
+        # Written last, so a crash mid-write leaves a snapshot that is rebuilt next time
+        _write_atomic(os.path.join(directory, MANIFEST), {'version': version})
+        logger.debug('Wrote activity snapshot for athlete %s (%d activities, version %s)',
+                     athlete_id, table.num_rows, version)
+
+
+def _schema():
+    return pa.schema([
+        ('type', pa.dictionary(pa.int32(), pa.string())),
+        ('start_date', pa.timestamp('ns', tz='UTC')),
+        ('start_date_local', pa.timestamp('ns')),
+        ('distance', pa.float32()),
+        ('moving_time', pa.int32()),
+        ('total_elevation_gain', pa.float32()),
+    ])
+
+
+def _empty_table():
+    return _schema().empty_table()
+
+
+def _table(columns):
+    """Arrow table in snapshot layout from ActivityStore.get_activity_columns output"""
+    local = pd.to_datetime(pd.Series(columns['start_date_local'], dtype='string'), utc=True,
+                           errors='coerce', format='ISO8601').dt.tz_localize(None)
+    return pa.table({
+        'type': pa.array([normalize_type(value) for value in columns['type']], pa.string()).dictionary_encode(),
+        'start_date': pa.array(np.asarray(columns['start_date'], dtype='int64') * 10 ** 9,
+                               pa.int64()).cast(pa.timestamp('ns', tz='UTC')),
+        'start_date_local': pa.Array.from_pandas(local, type=pa.timestamp('ns')),
+        'distance': pa.array(columns['distance'], pa.float32()),
+        'moving_time': pa.array([value or 0 for value in columns['moving_time']], pa.int32()),
+        'total_elevation_gain': pa.array(columns['total_elevation_gain'], pa.float32()),
+    }, schema=_schema())
+
+
+def _to_frame(table):
+    frame = table.to_pandas()
+    # Same datetime resolution as prepare_activity_frame's string parsing (pandas version dependent)
+    for column in ('start_date', 'start_date_local'):
+        frame[column] = frame[column].dt.as_unit(_PARSED_UNIT)
+    # Yearly files carry their own type dictionaries; match prepare_activity_frame's
+    # sorted categories so value_counts() ties break the same way
+    types = frame['type'].cat.remove_unused_categories()
+    frame['type'] = types.cat.reorder_categories(sorted(types.cat.categories))
+    return frame
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, content):
+    """Write a table or JSON document to a temp file and move it into place"""
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    if isinstance(content, dict):
+        with open(temp_path, 'w') as f:
+            json.dump(content, f)
+    else:
+        with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, content.schema) as writer:
+            writer.write_table(content)
+    os.replace(temp_path, path)
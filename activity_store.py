@@ -0,0 +1,505 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from rollup import ACTIVITY_TYPE_ALIASES, activity_day, normalize_type, rollup_rows
+
+# Local start times are never more than 14 hours from UTC, so this margin around a set of
+# local days safely covers every activity that can fall on them
+_DAY_MARGIN_SECONDS = 2 * 24 * 60 * 60
+# Stored activity types counted as runs, the only ones Strava reports best efforts for
+RUN_TYPES = tuple(sorted({'Run', *(t for t in ACTIVITY_TYPE_ALIASES if normalize_type(t) == 'Run')}))
+# Stream effort distances (whole meters) always kept in the stream_efforts cache, and the
+# ones /api/fastest reports when none are asked for
+DEFAULT_EFFORT_DISTANCES = (400, 1000, 1609, 5000, 10000, 21098, 42195)
+
+
+class ActivityStore:
+    """Local on-disk store of Strava activities keyed by athlete id (SQLite)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps the store safe to use from
+        # Flask's threaded dev server without sharing sqlite handles across threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _init_schema(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS activities (
+                    athlete_id INTEGER NOT NULL,
+                    id INTEGER NOT NULL,
+                    start_date INTEGER NOT NULL,
+                    start_date_local TEXT,
+                    type TEXT,
+                    distance REAL,
+                    moving_time INTEGER,
+                    total_elevation_gain REAL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (athlete_id, id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_activities_athlete_start
+                    ON activities (athlete_id, start_date);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    athlete_id INTEGER PRIMARY KEY,
+                    covered_from INTEGER NOT NULL,
+                    last_start_date INTEGER,
+                    synced_until INTEGER NOT NULL,
+                    synced_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    athlete_id INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS daily_rollup (
+                    athlete_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    distance REAL NOT NULL,
+                    moving_time INTEGER NOT NULL,
+                    elevation REAL NOT NULL,
+                    pace_sum REAL NOT NULL,
+                    pace_count INTEGER NOT NULL,
+                    PRIMARY KEY (athlete_id, day, type)
+                );
+                -- One row per activity whose details were fetched (NULLs if Strava had none)
+                CREATE TABLE IF NOT EXISTS activity_details (
+                    athlete_id INTEGER NOT NULL,
+                    id INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    best_efforts TEXT,
+                    splits_standard TEXT,
+                    PRIMARY KEY (athlete_id, id)
+                );
+                CREATE TABLE IF NOT EXISTS best_efforts (
+                    athlete_id INTEGER NOT NULL,
+                    activity_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    distance REAL,
+                    elapsed_time INTEGER NOT NULL,
+                    start_date INTEGER NOT NULL,
+                    start_date_local TEXT,
+                    PRIMARY KEY (athlete_id, activity_id, name)
+                );
+                CREATE INDEX IF NOT EXISTS idx_best_efforts_athlete_start
+                    ON best_efforts (athlete_id, start_date);
+                -- Fastest effort per name, updated as details are stored
+                CREATE TABLE IF NOT EXISTS personal_records (
+                    athlete_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    activity_id INTEGER NOT NULL,
+                    distance REAL,
+                    elapsed_time INTEGER NOT NULL,
+                    start_date_local TEXT,
+                    PRIMARY KEY (athlete_id, name)
+                );
+                -- One row per run whose streams were fetched (0 samples if Strava had none);
+                -- the arrays themselves live in the StreamStore
+                CREATE TABLE IF NOT EXISTS activity_streams (
+                    athlete_id INTEGER NOT NULL,
+                    id INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    samples INTEGER NOT NULL,
+                    PRIMARY KEY (athlete_id, id)
+                );
+                -- Fastest seconds over a distance (whole meters) within one run, computed from
+                -- its streams; NULL if the run is shorter. Only DEFAULT_EFFORT_DISTANCES and
+                -- the distances in stream_effort_distances are kept
+                CREATE TABLE IF NOT EXISTS stream_efforts (
+                    athlete_id INTEGER NOT NULL,
+                    activity_id INTEGER NOT NULL,
+                    distance REAL NOT NULL,
+                    elapsed_time REAL,
+                    PRIMARY KEY (athlete_id, activity_id, distance)
+                );
+                -- Recently used distances other than the defaults that stream_efforts caches
+                CREATE TABLE IF NOT EXISTS stream_effort_distances (
+                    distance REAL PRIMARY KEY,
+                    used_at REAL NOT NULL
+                );
+            ''')
+            # Build the rollup for athletes synced before it existed
+            missing = conn.execute('''
+                SELECT DISTINCT athlete_id FROM activities
+                WHERE athlete_id NOT IN (SELECT DISTINCT athlete_id FROM daily_rollup)
+            ''').fetchall()
+            for row in missing:
+                days = {activity_day(json.loads(r['data'])) for r in conn.execute(
+                    'SELECT data FROM activities WHERE athlete_id = ?', (row['athlete_id'],))}
+                self._refresh_rollup(conn, row['athlete_id'], days)
+
+    def get_sync_state(self, athlete_id):
+        """Return the sync watermark for an athlete, or None if never synced"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM sync_state WHERE athlete_id = ?',
+                               (athlete_id,)).fetchone()
+        return dict(row) if row else None
+
+    def record_sync(self, athlete_id, covered_from, synced_until):
+        """Update the sync watermark after a successful fetch from Strava"""
+        with self._write_lock, self._connect() as conn:
+            last_start_date = conn.execute(
+                'SELECT MAX(start_date) FROM activities WHERE athlete_id = ?',
+                (athlete_id,)).fetchone()[0]
+            conn.execute('''
+                INSERT INTO sync_state (athlete_id, covered_from, last_start_date, synced_until, synced_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (athlete_id) DO UPDATE SET
+                    covered_from = MIN(covered_from, excluded.covered_from),
+                    last_start_date = excluded.last_start_date,
+                    synced_until = MAX(synced_until, excluded.synced_until),
+                    synced_at = excluded.synced_at
+            ''', (athlete_id, covered_from, last_start_date, synced_until, time.time()))
+
+    def upsert_activities(self, athlete_id, activities):
+        """Insert or update activities (raw Strava summary dicts); returns the number of rows changed"""
+        rows = []
+        # Days whose rollup must be recomputed: where the activities land now and,
+        # for updated activities, where they were before
+        affected_days = set()
+        for activity in activities:
+            start_date = activity.get('start_date')
+            if activity.get('id') is None or not start_date:
+                continue
+            affected_days.add(activity_day(activity))
+            rows.append((
+                athlete_id,
+                activity['id'],
+                _parse_timestamp(start_date),
+                activity.get('start_date_local'),
+                activity.get('type'),
+                activity.get('distance'),
+                activity.get('moving_time'),
+                activity.get('total_elevation_gain'),
+                json.dumps(activity),
+            ))
+        if not rows:
+            return 0
+        with self._write_lock, self._connect() as conn:
+            ids = [row[1] for row in rows]
+            for chunk_start in range(0, len(ids), 500):
+                chunk = ids[chunk_start:chunk_start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                affected_days.update(r['start_date_local'][:10] for r in conn.execute(
+                    f'SELECT start_date_local FROM activities WHERE athlete_id = ? AND id IN ({placeholders})',
+                    (athlete_id, *chunk)) if r['start_date_local'])
+
+            changes_before = conn.total_changes
+            # Rows whose payload is unchanged are left alone so re-syncing the same
+            # activity does not bump the data version
+            conn.executemany('''
+                INSERT INTO activities
+                    (athlete_id, id, start_date, start_date_local, type, distance,
+                     moving_time, total_elevation_gain, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (athlete_id, id) DO UPDATE SET
+                    start_date = excluded.start_date,
+                    start_date_local = excluded.start_date_local,
+                    type = excluded.type,
+                    distance = excluded.distance,
+                    moving_time = excluded.moving_time,
+                    total_elevation_gain = excluded.total_elevation_gain,
+                    data = excluded.data
+                WHERE data != excluded.data
+            ''', rows)
+            changed = conn.total_changes - changes_before
+            if changed:
+                self._refresh_rollup(conn, athlete_id, affected_days)
+                conn.execute('''
+                    INSERT INTO data_versions (athlete_id, version) VALUES (?, 1)
+                    ON CONFLICT (athlete_id) DO UPDATE SET version = version + 1
+                ''', (athlete_id,))
+        return changed
+
+    def _refresh_rollup(self, conn, athlete_id, days):
+        """Recompute the daily rollup rows for the given local days from stored activities"""
+        days = sorted(day for day in days if day)
+        if not days:
+            return
+        first = _parse_timestamp(days[0] + 'T00:00:00Z') - _DAY_MARGIN_SECONDS
+        last = _parse_timestamp(days[-1] + 'T00:00:00Z') + _DAY_MARGIN_SECONDS
+        day_set = set(days)
+        activities = [activity for activity in (json.loads(r['data']) for r in conn.execute(
+            'SELECT data FROM activities WHERE athlete_id = ? AND start_date BETWEEN ? AND ?',
+            (athlete_id, first, last))) if activity_day(activity) in day_set]
+
+        conn.executemany('DELETE FROM daily_rollup WHERE athlete_id = ? AND day = ?',
+                         [(athlete_id, day) for day in days])
+        conn.executemany('''
+            INSERT INTO daily_rollup
+                (athlete_id, day, type, count, distance, moving_time, elevation, pace_sum, pace_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(athlete_id, *row) for row in rollup_rows(activities)])
+
+    def get_daily_rollup(self, athlete_id, start_day='0000-01-01', end_day='9999-12-31'):
+        """Daily rollup rows (see rollup.ROLLUP_COLUMNS) for local days in [start_day, end_day], all by default"""
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT day, type, count, distance, moving_time, elevation, pace_sum, pace_count
+                FROM daily_rollup
+                WHERE athlete_id = ? AND day BETWEEN ? AND ?
+                ORDER BY day, type
+            ''', (athlete_id, start_day, end_day)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def get_data_version(self, athlete_id):
+        """Counter that increases whenever an athlete's stored activities change"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT version FROM data_versions WHERE athlete_id = ?',
+                               (athlete_id,)).fetchone()
+        return row['version'] if row else 0
+
+    def get_activities(self, athlete_id, start_timestamp, end_timestamp):
+        """Return stored activities with start_date in [start, end], oldest first"""
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT data FROM activities
+                WHERE athlete_id = ? AND start_date >= ? AND start_date <= ?
+                ORDER BY start_date, id
+            ''', (athlete_id, start_timestamp, end_timestamp)).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def iter_activities(self, athlete_id, start_timestamp, end_timestamp, page_size=200):
+        """get_activities in lists of up to page_size, each page parsed only when it is reached"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT data FROM activities
+                WHERE athlete_id = ? AND start_date >= ? AND start_date <= ?
+                ORDER BY start_date, id
+            ''', (athlete_id, start_timestamp, end_timestamp))
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield [json.loads(row['data']) for row in rows]
+
+    def runs_without_details(self, athlete_id, limit):
+        """Ids of up to limit stored runs with a distance whose details were never fetched, newest first"""
+        placeholders = ','.join('?' * len(RUN_TYPES))
+        with self._connect() as conn:
+            rows = conn.execute(f'''
+                SELECT a.id FROM activities a
+                LEFT JOIN activity_details d ON d.athlete_id = a.athlete_id AND d.id = a.id
+                WHERE a.athlete_id = ? AND a.type IN ({placeholders}) AND a.distance > 0 AND d.id IS NULL
+                ORDER BY a.start_date DESC, a.id DESC LIMIT ?
+            ''', (athlete_id, *RUN_TYPES, limit)).fetchall()
+        return [row['id'] for row in rows]
+
+    def save_activity_details(self, athlete_id, activity_id, details):
+        """Store one activity's best efforts and standard splits and update the PR index
+
+        details is a dict like activity_parser.parse_activity_detail returns, or None to
+        record that Strava has none (e.g. the activity was deleted) so it is not asked again.
+        """
+        efforts = [effort for effort in (details or {}).get('best_efforts', ())
+                   if effort.get('name') and effort.get('elapsed_time') and effort.get('start_date')]
+        rows = [(athlete_id, activity_id, effort['name'], effort.get('distance'), effort['elapsed_time'],
+                 _parse_timestamp(effort['start_date']), effort.get('start_date_local')) for effort in efforts]
+        with self._write_lock, self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO activity_details (athlete_id, id, fetched_at, best_efforts, splits_standard)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (athlete_id, activity_id, time.time(),
+                  json.dumps(details['best_efforts']) if details else None,
+                  json.dumps(details['splits_standard']) if details else None))
+            conn.executemany('''
+                INSERT OR REPLACE INTO best_efforts
+                    (athlete_id, activity_id, name, distance, elapsed_time, start_date, start_date_local)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            # Each effort only replaces the record for its name if it is faster
+            conn.executemany('''
+                INSERT INTO personal_records (athlete_id, name, activity_id, distance, elapsed_time, start_date_local)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (athlete_id, name) DO UPDATE SET
+                    activity_id = excluded.activity_id,
+                    distance = excluded.distance,
+                    elapsed_time = excluded.elapsed_time,
+                    start_date_local = excluded.start_date_local
+                WHERE excluded.elapsed_time < personal_records.elapsed_time
+            ''', [(athlete_id, name, activity_id, distance, elapsed_time, start_date_local)
+                  for _, _, name, distance, elapsed_time, _, start_date_local in rows])
+
+    def get_best_efforts(self, athlete_id, start_timestamp, end_timestamp):
+        """Fastest effort per name (e.g. '5K') among efforts started in [start, end], keyed by name"""
+        with self._connect() as conn:
+            # SQLite takes the bare columns from the row that holds the MIN()
+            rows = conn.execute('''
+                SELECT name, activity_id, distance, MIN(elapsed_time) AS elapsed_time, start_date_local
+                FROM best_efforts
+                WHERE athlete_id = ? AND start_date >= ? AND start_date <= ?
+                GROUP BY name
+            ''', (athlete_id, start_timestamp, end_timestamp)).fetchall()
+        return {row['name']: dict(row) for row in rows}
+
+    def get_personal_records(self, athlete_id):
+        """All-time fastest effort per name from the PR index, keyed by name"""
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT name, activity_id, distance, elapsed_time, start_date_local
+                FROM personal_records WHERE athlete_id = ?
+            ''', (athlete_id,)).fetchall()
+        return {row['name']: dict(row) for row in rows}
+
+    def get_details_coverage(self, athlete_id, start_timestamp=0, end_timestamp=2 ** 62):
+        """(runs with details fetched, runs with a distance) among stored runs in [start, end]"""
+        placeholders = ','.join('?' * len(RUN_TYPES))
+        with self._connect() as conn:
+            row = conn.execute(f'''
+                SELECT COUNT(d.id) AS fetched, COUNT(*) AS runs FROM activities a
+                LEFT JOIN activity_details d ON d.athlete_id = a.athlete_id AND d.id = a.id
+                WHERE a.athlete_id = ? AND a.type IN ({placeholders}) AND a.distance > 0
+                    AND a.start_date >= ? AND a.start_date <= ?
+            ''', (athlete_id, *RUN_TYPES, start_timestamp, end_timestamp)).fetchone()
+        return row['fetched'], row['runs']
+
+    def runs_without_streams(self, athlete_id, limit):
+        """Ids of up to limit stored runs with a distance whose streams were never fetched, newest first"""
+        placeholders = ','.join('?' * len(RUN_TYPES))
+        with self._connect() as conn:
+            rows = conn.execute(f'''
+                SELECT a.id FROM activities a
+                LEFT JOIN activity_streams s ON s.athlete_id = a.athlete_id AND s.id = a.id
+                WHERE a.athlete_id = ? AND a.type IN ({placeholders}) AND a.distance > 0 AND s.id IS NULL
+                ORDER BY a.start_date DESC, a.id DESC LIMIT ?
+            ''', (athlete_id, *RUN_TYPES, limit)).fetchall()
+        return [row['id'] for row in rows]
+
+    def record_streams(self, athlete_id, activity_id, samples):
+        """Record that an activity's streams were fetched (samples=0 if it has none) so it is not asked again"""
+        with self._write_lock, self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO activity_streams (athlete_id, id, fetched_at, samples) VALUES (?, ?, ?, ?)
+            ''', (athlete_id, activity_id, time.time(), samples))
+            conn.execute('DELETE FROM stream_efforts WHERE athlete_id = ? AND activity_id = ?',
+                         (athlete_id, activity_id))
+
+    def streams_missing_efforts(self, athlete_id, distances):
+        """Ids of activities with streams that lack a cached stream effort for any of distances"""
+        placeholders = ','.join('?' * len(distances))
+        with self._connect() as conn:
+            rows = conn.execute(f'''
+                SELECT s.id FROM activity_streams s
+                LEFT JOIN stream_efforts e ON e.athlete_id = s.athlete_id AND e.activity_id = s.id
+                    AND e.distance IN ({placeholders})
+                WHERE s.athlete_id = ? AND s.samples > 0
+                GROUP BY s.id HAVING COUNT(DISTINCT e.distance) < ?
+                ORDER BY s.id
+            ''', (*distances, athlete_id, len(set(distances)))).fetchall()
+        return [row['id'] for row in rows]
+
+    def save_stream_efforts(self, athlete_id, efforts):
+        """Cache (activity_id, distance, elapsed_time or None) stream efforts
+
+        Efforts for a distance the cache does not keep (see touch_effort_distances) are
+        dropped, so one evicted while it was being computed is not written back.
+        """
+        defaults = ','.join(str(distance) for distance in DEFAULT_EFFORT_DISTANCES)
+        with self._write_lock, self._connect() as conn:
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO stream_efforts (athlete_id, activity_id, distance, elapsed_time)
+                SELECT :athlete_id, :activity_id, :distance, :elapsed_time
+                WHERE :distance IN ({defaults}) OR :distance IN (SELECT distance FROM stream_effort_distances)
+            ''', [{'athlete_id': athlete_id, 'activity_id': activity_id, 'distance': distance,
+                   'elapsed_time': elapsed_time} for activity_id, distance, elapsed_time in efforts])
+
+    def touch_effort_distances(self, distances, keep):
+        """Mark distances as just used by the stream_efforts cache; returns the ones it keeps
+
+        The cache holds DEFAULT_EFFORT_DISTANCES plus the keep most recently used other
+        distances (at most keep of them are admitted per call). A distance that falls out
+        has its cached efforts deleted for every athlete.
+        """
+        others = [distance for distance in dict.fromkeys(distances)
+                  if distance not in DEFAULT_EFFORT_DISTANCES][:keep]
+        with self._write_lock, self._connect() as conn:
+            conn.executemany('''
+                INSERT INTO stream_effort_distances (distance, used_at) VALUES (?, ?)
+                ON CONFLICT (distance) DO UPDATE SET used_at = excluded.used_at
+            ''', [(distance, time.time()) for distance in others])
+            evicted = [row['distance'] for row in conn.execute('''
+                SELECT distance FROM stream_effort_distances ORDER BY used_at DESC, distance LIMIT -1 OFFSET ?
+            ''', (keep,))]
+            if evicted:
+                placeholders = ','.join('?' * len(evicted))
+                conn.execute(f'DELETE FROM stream_effort_distances WHERE distance IN ({placeholders})', evicted)
+                conn.execute(f'DELETE FROM stream_efforts WHERE distance IN ({placeholders})', evicted)
+        return [distance for distance in distances
+                if distance in DEFAULT_EFFORT_DISTANCES or (distance in others and distance not in evicted)]
+
+    def stream_runs(self, athlete_id, start_timestamp, end_timestamp):
+        """(id, start_date_local) of stored runs started in [start, end] that have streams"""
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT a.id, a.start_date_local FROM activity_streams s
+                JOIN activities a ON a.athlete_id = s.athlete_id AND a.id = s.id
+                WHERE s.athlete_id = ? AND s.samples > 0 AND a.start_date >= ? AND a.start_date <= ?
+                ORDER BY a.start_date, a.id
+            ''', (athlete_id, start_timestamp, end_timestamp)).fetchall()
+        return [(row['id'], row['start_date_local']) for row in rows]
+
+    def get_stream_efforts(self, athlete_id, distances, start_timestamp, end_timestamp):
+        """Fastest cached stream effort per distance among runs started in [start, end], keyed by distance"""
+        placeholders = ','.join('?' * len(distances))
+        with self._connect() as conn:
+            # SQLite takes the bare columns from the row that holds the MIN()
+            rows = conn.execute(f'''
+                SELECT e.distance, e.activity_id, MIN(e.elapsed_time) AS elapsed_time, a.start_date_local
+                FROM stream_efforts e
+                JOIN activities a ON a.athlete_id = e.athlete_id AND a.id = e.activity_id
+                WHERE e.athlete_id = ? AND e.distance IN ({placeholders}) AND e.elapsed_time IS NOT NULL
+                    AND a.start_date >= ? AND a.start_date <= ?
+                GROUP BY e.distance
+            ''', (athlete_id, *distances, start_timestamp, end_timestamp)).fetchall()
+        return {row['distance']: dict(row) for row in rows}
+
+    def get_streams_coverage(self, athlete_id, start_timestamp=0, end_timestamp=2 ** 62):
+        """(runs with streams fetched, runs with a distance) among stored runs in [start, end]"""
+        placeholders = ','.join('?' * len(RUN_TYPES))
+        with self._connect() as conn:
+            row = conn.execute(f'''
+                SELECT COUNT(s.id) AS fetched, COUNT(*) AS runs FROM activities a
+                LEFT JOIN activity_streams s ON s.athlete_id = a.athlete_id AND s.id = a.id
+                WHERE a.athlete_id = ? AND a.type IN ({placeholders}) AND a.distance > 0
+                    AND a.start_date >= ? AND a.start_date <= ?
+            ''', (athlete_id, *RUN_TYPES, start_timestamp, end_timestamp)).fetchone()
+        return row['fetched'], row['runs']
+
+    def get_activity_columns(self, athlete_id):
+        """Analytic fields of every stored activity as column lists, oldest first
+
+        Read from the typed columns kept next to each activity's JSON, so nothing is parsed.
+        """
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT start_date, start_date_local, type, distance, moving_time, total_elevation_gain
+                FROM activities WHERE athlete_id = ?
+                ORDER BY start_date, id
+            ''', (athlete_id,)).fetchall()
+        names = ('start_date', 'start_date_local', 'type', 'distance', 'moving_time', 'total_elevation_gain')
+        return {name: [row[name] for row in rows] for name in names}
+
+
+def _parse_timestamp(value):
+    """Convert a Strava ISO-8601 timestamp (e.g. 2024-01-01T10:00:00Z) to Unix seconds"""
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
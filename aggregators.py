@@ -0,0 +1,174 @@
+"""Incremental aggregators for the results page summary, fed one page of raw Strava activities at a time
+
+Each aggregator keeps only its running state (totals, counts, bests, daily buckets), so
+summarizing a streamed history needs memory for one page plus that state, however many
+activities the athlete has. ActivityAggregates.summary() returns the same fields, formatted
+the same way, as the frame-based summary in analytics.process_activities.
+"""
+import math
+
+from rollup import METERS_PER_MILE, DailyRollup, normalize_type
+
+FEET_PER_METER = 3.28084
+TEN_K_MILES = 6.2
+# Run distance distribution bins in miles: [lower, upper) with the last one open-ended
+DISTANCE_BIN_LABELS = ['0-1', '1-2', '2-3', '3-4', '4-5', '5-6', '6-7', '7-8', '8-9', '9-10', '10+']
+
+
+def _number(value):
+    """Float value of an optional activity field, NaN when it is missing"""
+    return float('nan') if value is None else float(value)
+
+
+def format_duration(seconds):
+    return f"{int(seconds // 3600)}h {int((seconds % 3600) // 60)}m"
+
+
+def format_pace(seconds_per_mile):
+    return f"{int(seconds_per_mile // 60)}:{int(seconds_per_mile % 60):02d}"
+
+
+class Totals:
+    """Activity count, moving time and elevation gain over every activity"""
+
+    def __init__(self):
+        self.count = 0
+        self.moving_time = 0
+        self.elevation = 0.0
+
+    def add(self, activity):
+        self.count += 1
+        self.moving_time += activity.get('moving_time') or 0
+        self.elevation += activity.get('total_elevation_gain') or 0.0
+
+
+class TypeCounts:
+    """Activity count per (normalized) activity type"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def add(self, activity):
+        activity_type = normalize_type(activity.get('type'))
+        if activity_type is None:
+            return  # left out of the breakdown, as the frame's categorical drops it
+        self.counts[activity_type] = self.counts.get(activity_type, 0) + 1
+
+    def breakdown(self):
+        """Counts by type, most common first and ties by name (as value_counts orders them)"""
+        return dict(sorted(self.counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+class DistanceBins:
+    """Run count, mileage, moving time and distance distribution over runs"""
+
+    def __init__(self):
+        self.runs = 0
+        self.distance = 0.0
+        self.moving_time = 0
+        self.runs_10k_plus = 0
+        self.bins = [0] * len(DISTANCE_BIN_LABELS)
+
+    def add(self, run):
+        self.runs += 1
+        self.moving_time += run.get('moving_time') or 0
+        miles = _number(run.get('distance')) / METERS_PER_MILE
+        if math.isnan(miles) or miles < 0:
+            return
+        self.distance += miles
+        self.bins[min(int(miles), len(DISTANCE_BIN_LABELS) - 1)] += 1
+        if miles >= TEN_K_MILES:
+            self.runs_10k_plus += 1
+
+    def distribution(self):
+        return dict(zip(DISTANCE_BIN_LABELS, self.bins))
+
+
+class PersonalRecords:
+    """Best pace, fastest 10K, longest run and most elevation in a single run"""
+
+    def __init__(self):
+        self.best_pace = None
+        self.fastest_10k = None
+        self.longest_distance = None
+        self.most_elevation = None
+        self.most_elevation_distance = None
+
+    def add(self, run):
+        moving_time = run.get('moving_time') or 0
+        distance = _number(run.get('distance'))
+        elevation = _number(run.get('total_elevation_gain'))
+        if distance > 0 and moving_time > 0:
+            pace = moving_time / (distance / METERS_PER_MILE)
+            if self.best_pace is None or pace < self.best_pace:
+                self.best_pace = pace
+        if distance / METERS_PER_MILE >= TEN_K_MILES and (self.fastest_10k is None or moving_time < self.fastest_10k):
+            self.fastest_10k = moving_time
+        if not math.isnan(distance) and (self.longest_distance is None or distance > self.longest_distance):
+            self.longest_distance = distance
+        # Strictly greater keeps the first run with the most elevation, like idxmax
+        if not math.isnan(elevation) and (self.most_elevation is None or elevation > self.most_elevation):
+            self.most_elevation = elevation
+            self.most_elevation_distance = distance
+
+    def formatted(self):
+        fastest_10k = None
+        if self.fastest_10k is not None:
+            hours, minutes, seconds = (int(self.fastest_10k // 3600), int((self.fastest_10k % 3600) // 60),
+                                       int(self.fastest_10k % 60))
+            fastest_10k = f"{hours}:{minutes:02d}:{seconds:02d}" if hours > 0 else f"{minutes}:{seconds:02d}"
+        return {
+            'best_mile_split': format_pace(self.best_pace) if self.best_pace is not None else None,
+            'fastest_10k': fastest_10k,
+            'longest_run': (f"{self.longest_distance / METERS_PER_MILE:.2f} mi"
+                            if self.longest_distance is not None else None),
+            'most_elevation_run': (f"{self.most_elevation * FEET_PER_METER:.0f} ft "
+                                   f"({self.most_elevation_distance / METERS_PER_MILE:.2f} mi)"
+                                   if self.most_elevation is not None else None),
+        }
+
+
+class ActivityAggregates:
+    """Every aggregator the results page needs, fed together by add_page
+
+    daily collects the daily rollup rows that streaks and trends are built from.
+    """
+
+    def __init__(self):
+        self.totals = Totals()
+        self.types = TypeCounts()
+        self.distances = DistanceBins()
+        self.records = PersonalRecords()
+        self.daily = DailyRollup()
+
+    @property
+    def count(self):
+        return self.totals.count
+
+    def add_page(self, activities):
+        for activity in activities:
+            self.totals.add(activity)
+            self.types.add(activity)
+            if normalize_type(activity.get('type')) == 'Run':
+                self.distances.add(activity)
+                self.records.add(activity)
+        self.daily.add_page(activities)
+
+    def summary(self):
+        """The summary fields of the analysis dict (everything but streaks and trends)"""
+        distances = self.distances
+        avg_pace_formatted = "0:00"
+        if distances.distance > 0:
+            avg_pace_formatted = format_pace(distances.moving_time / distances.distance)
+        return {
+            'total_activities': self.totals.count,
+            'running_miles': round(distances.distance, 2),
+            'total_elevation_feet': round(self.totals.elevation * FEET_PER_METER, 2),
+            'total_duration_formatted': format_duration(self.totals.moving_time),
+            'activity_breakdown': self.types.breakdown(),
+            'run_distance_distribution': distances.distribution() if distances.runs else {},
+            'runs_10k_plus': distances.runs_10k_plus,
+            'total_runs': distances.runs,
+            'avg_pace_formatted': avg_pace_formatted,
+            **self.records.formatted(),
+        }
@@ -0,0 +1,94 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnalysisCache:
+    """In-memory LRU cache of process_activities results with TTL and a size bound in bytes
+
+    Keys are (athlete_id, start_date, end_date, data_version) tuples. The data version comes
+    from the activity store and increases whenever new activities are synced, so a stale
+    result can never be returned; storing a newer version for an athlete also drops that
+    athlete's older entries right away instead of waiting for them to age out.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=3600, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, stored_at = entry
+            if self.ttl is not None and self._clock() - stored_at > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries to stay under max_bytes"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        athlete_id, version = key[0], key[-1]
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            for old_key in [k for k in self._entries if k[0] == athlete_id and k[-1] < version]:
+                self._remove(old_key)
+            self._entries[key] = (value, size, self._clock())
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, athlete_id):
+        """Drop every cached result for an athlete"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == athlete_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+
+
+def estimate_size(obj):
+    """Approximate memory footprint of a nested dict/list structure (or DataFrame) in bytes"""
+    if hasattr(obj, 'memory_usage'):
+        # pandas objects know their own (deep) footprint
+        return int(obj.memory_usage(deep=True).sum())
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(item) for item in obj)
+    return size
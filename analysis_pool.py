@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import record_span, request_spans, span, start_request
+
+logger = logging.getLogger(__name__)
+
+# The only activity fields the analytics read (see charts.prepare_activity_frame and
+# rollup.rollup_rows); everything else in the Strava dicts stays in the parent process
+ANALYTIC_FIELDS = ('type', 'start_date', 'start_date_local', 'distance', 'moving_time', 'total_elevation_gain')
+
+
+class AnalysisTimeout(Exception):
+    """Raised when a pooled analysis does not finish within the pool's timeout"""
+
+
+class AnalysisPool:
+    """Runs analytics.process_activities in worker processes so large histories don't hold the GIL
+
+    Workers receive the typed activity frame when the caller has one (e.g. from an activity
+    snapshot), otherwise one list per analytic field, never the pickled activity dicts, and
+    send back the finished analysis dict. Inputs with fewer than min_activities, or any
+    input when workers is 0, are analyzed inline since IPC would cost more than it saves.
+    Worker processes are spawned rather than forked, as the server process runs threads.
+    A spawned worker re-imports the parent's __main__ module: under gunicorn that is only
+    gunicorn's entry point, but under `python app.py` it is app.py itself (without its
+    __main__ block), so every worker also loads the app's config and stores.
+    """
+
+    def __init__(self, workers=0, timeout=30, min_activities=5000):
+        self.workers = workers
+        self.timeout = timeout
+        self.min_activities = min_activities
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def should_offload(self, count):
+        return self.workers > 0 and count >= self.min_activities
+
+    def run(self, activities, start_date=None, end_date=None, rollup=None, frame=None):
+        """The analysis dict for activities (or frame, see process_activities)
+
+        Raises AnalysisTimeout if a worker takes too long; the pool is then replaced, since
+        a busy worker would otherwise keep running the abandoned analysis.
+        """
+        count = len(frame) if frame is not None else len(activities)
+        if not self.should_offload(count):
+            return _analyze(activities, start_date, end_date, rollup, frame)
+
+        columns = None
+        if frame is None:
+            with span('analysis_payload'):
+                columns = activity_columns(activities)
+        executor = None
+        try:
+            with span('analysis_pool'):
+                executor, future = self._submit(_analyze_payload, start_date, end_date, rollup,
+                                                columns=columns, frame=frame)
+                analysis, spans = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._reset(executor, terminate=True)
+            raise AnalysisTimeout(f'Analysis of {count} activities took over {self.timeout}s') from None
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time and answer inline now
+            logger.exception('Analysis pool broke, analyzing inline')
+            self._reset(executor or self._executor)
+            return _analyze(activities, start_date, end_date, rollup, frame)
+        except CancelledError:
+            # Still queued when another request's timeout replaced the pool
+            logger.warning('Analysis pool was reset, analyzing inline')
+            return _analyze(activities, start_date, end_date, rollup, frame)
+
+        # Report the worker's own sections as if they had run in this request
+        for name, elapsed in spans:
+            record_span(name, elapsed)
+        return analysis
+
+    def shutdown(self):
+        self._reset(self._executor)
+
+    def _submit(self, fn, *args, **kwargs):
+        """(executor, future) for fn submitted to the current pool, started on first use"""
+        # Under the lock so a concurrent _reset can't shut the executor down in between
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor, self._executor.submit(fn, *args, **kwargs)
+
+    def _reset(self, executor, terminate=False):
+        """Shut executor down and start a fresh pool next time, unless it was already replaced
+
+        terminate also kills its worker processes, which shutdown alone leaves running until
+        their current analysis finishes.
+        """
+        with self._lock:
+            if executor is None or executor is not self._executor:
+                return
+            self._executor = None
+        processes = list((executor._processes or {}).values()) if terminate else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+
+def activity_columns(activities):
+    """Column lists of just the analytic fields, the payload sent to worker processes"""
+    return {name: [activity.get(name) for activity in activities] for name in ANALYTIC_FIELDS}
+
+
+def _analyze(activities, start_date, end_date, rollup, frame):
+    # Imported on first use so loading the app doesn't pull in pandas and Plotly
+    from analytics import process_activities
+    return process_activities(activities, None, start_date, end_date, rollup=rollup, frame=frame)
+
+
+def _analyze_payload(start_date, end_date, rollup, columns=None, frame=None):
+    """Worker process entry point: analyze a frame, or slim activity dicts rebuilt from columns"""
+    activities = [dict(zip(columns, values)) for values in zip(*columns.values())] if columns else []
+    start_request()
+    analysis = _analyze(activities, start_date, end_date, rollup, frame)
+    return analysis, request_spans()
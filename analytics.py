@@ -0,0 +1,255 @@
+import logging
+
+import pandas as pd
+
+from charts import (analysis_window, daily_totals, prepare_activity_frame, rollup_frame, running_rollup,
+                    window_days)
+from metrics import span
+from rollup import METERS_PER_MILE, rollup_rows
+from streaks import compute_streaks
+
+logger = logging.getLogger(__name__)
+
+
+def process_activities(activities, access_token, requested_start_date=None, requested_end_date=None, rollup=None,
+                       frame=None):
+    """Process activities data and generate analytics
+
+    Daily series (streaks and trends) are derived from the daily rollup rows; pass rollup
+    to use rows already kept by the activity store instead of aggregating activities here.
+    Pass frame (e.g. from an activity snapshot) together with rollup to skip the raw
+    activity dicts entirely.
+    """
+    if frame is None:
+        if not activities:
+            return None
+        with span('frame'):
+            frame = prepare_activity_frame(activities)
+    elif frame.empty:
+        return None
+    df = frame
+
+    with span('rollup'):
+        daily_rollup = rollup_frame(rollup_rows(activities) if rollup is None else rollup,
+                                    requested_start_date, requested_end_date)
+
+    # Sample values are only formatted when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Activity frame: %d rows, dtypes %s', len(df), df.dtypes.to_dict())
+        logger.debug('Sample start_date_local values: %s', df['start_date_local'].head().tolist())
+        logger.debug('Sample start_date values: %s', df['start_date'].head().tolist())
+        logger.debug('Sample moving_time values: %s', df['moving_time'].head().tolist())
+
+    with span('summary'):
+        # Activity type distribution (the pie charts themselves are served by /api/chart/<name>)
+        activity_counts = df['type'].value_counts()
+
+        # Calculate total duration
+        total_duration_seconds = df['moving_time'].sum() if 'moving_time' in df.columns else 0
+        total_duration_hours = int(total_duration_seconds // 3600)
+        total_duration_minutes = int((total_duration_seconds % 3600) // 60)
+        total_duration_formatted = f"{total_duration_hours}h {total_duration_minutes}m"
+
+        # Calculate total elevation gain
+        total_elevation = df['total_elevation_gain'].astype('float64').sum() if 'total_elevation_gain' in df.columns else 0
+        total_elevation_feet = total_elevation * 3.28084  # Convert meters to feet
+
+    # Calculate running stats and distance distribution
+    running_activities = df[df['type'] == 'Run']
+
+    # Distances/elevations are stored as float32; totals are accumulated in float64
+    running_distance = running_activities['distance'].astype('float64').sum() / 1609.34 if not running_activities.empty else 0
+
+    # Create running distance distribution (group by mile ranges)
+    run_distance_distribution = {}
+    runs_10k_plus = 0
+    total_runs = 0
+    avg_pace_formatted = "0:00"
+    if not running_activities.empty:
+        running_distances_miles = running_activities['distance'] / 1609.34
+        total_runs = len(running_activities)
+
+        # Calculate average pace (minutes per mile)
+        # moving_time is in seconds, distance is in meters
+        avg_pace_formatted = "0:00"
+        if 'moving_time' in running_activities.columns and running_distance > 0:
+            total_time_seconds = running_activities['moving_time'].sum()
+            avg_pace_seconds_per_mile = total_time_seconds / running_distance
+            pace_minutes = int(avg_pace_seconds_per_mile // 60)
+            pace_seconds = int(avg_pace_seconds_per_mile % 60)
+            avg_pace_formatted = f"{pace_minutes}:{pace_seconds:02d}"
+
+        with span('distance_bins'):
+            # Define distance bins (in miles)
+            bins = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, float('inf')]
+            labels = ['0-1', '1-2', '2-3', '3-4', '4-5', '5-6', '6-7', '7-8', '8-9', '9-10', '10+']
+
+            # Categorize runs into bins
+            distance_categories = pd.cut(running_distances_miles, bins=bins, labels=labels, right=False)
+            run_distance_distribution = distance_categories.value_counts().sort_index().to_dict()
+
+            # Count runs 10K or longer (10K = 6.2 miles)
+            runs_10k_plus = len(running_distances_miles[running_distances_miles >= 6.2])
+
+        with span('personal_records'):
+            # Calculate personal records
+            # Best mile split (fastest pace for any run)
+            best_mile_split_formatted = None
+            if 'moving_time' in running_activities.columns:
+                pace_sec_per_mi = running_activities['moving_time'] / (running_activities['distance'] / 1609.34)
+                # Filter out invalid paces (too slow or NaN)
+                valid_paces = pace_sec_per_mi.dropna()
+                valid_paces = valid_paces[valid_paces > 0]
+                if len(valid_paces) > 0:
+                    best_mile_split_seconds = valid_paces.min()
+                    pace_minutes = int(best_mile_split_seconds // 60)
+                    pace_seconds = int(best_mile_split_seconds % 60)
+                    best_mile_split_formatted = f"{pace_minutes}:{pace_seconds:02d}"
+
+            # Fastest 10K
+            fastest_10k_formatted = None
+            runs_10k = running_activities[(running_activities['distance'] / 1609.34) >= 6.2]
+            if not runs_10k.empty and 'moving_time' in runs_10k.columns:
+                fastest_10k_seconds = runs_10k['moving_time'].min()
+
+                # Format fastest 10K
+                hours = int(fastest_10k_seconds // 3600)
+                minutes = int((fastest_10k_seconds % 3600) // 60)
+                seconds = int(fastest_10k_seconds % 60)
+                if hours > 0:
+                    fastest_10k_formatted = f"{hours}:{minutes:02d}:{seconds:02d}"
+                else:
+                    fastest_10k_formatted = f"{minutes}:{seconds:02d}"
+
+            # Longest run (by distance)
+            longest_run_distance = None
+            if not running_activities.empty:
+                longest_run_distance_miles = (running_activities['distance'].max()) / 1609.34
+                longest_run_distance = f"{longest_run_distance_miles:.2f} mi"
+
+            # Most elevation in a single run
+            most_elevation_run = None
+            if not running_activities.empty and 'total_elevation_gain' in running_activities.columns:
+                max_elevation_idx = running_activities['total_elevation_gain'].idxmax()
+                max_elevation_meters = running_activities.loc[max_elevation_idx, 'total_elevation_gain']
+                max_elevation_feet = max_elevation_meters * 3.28084
+                run_distance_miles = running_activities.loc[max_elevation_idx, 'distance'] / 1609.34
+                most_elevation_run = f"{max_elevation_feet:.0f} ft ({run_distance_miles:.2f} mi)"
+
+    return {
+        'total_activities': len(df),
+        'running_miles': round(running_distance, 2),
+        'total_elevation_feet': round(total_elevation_feet, 2),
+        'total_duration_formatted': total_duration_formatted,
+        'activity_breakdown': activity_counts.to_dict(),
+        'run_distance_distribution': run_distance_distribution,
+        'runs_10k_plus': runs_10k_plus,
+        'total_runs': total_runs,
+        'avg_pace_formatted': avg_pace_formatted,
+        'best_mile_split': best_mile_split_formatted if 'best_mile_split_formatted' in locals() else None,
+        'fastest_10k': fastest_10k_formatted if 'fastest_10k_formatted' in locals() else None,
+        'longest_run': longest_run_distance if 'longest_run_distance' in locals() else None,
+        'most_elevation_run': most_elevation_run if 'most_elevation_run' in locals() else None,
+        **_daily_fields(daily_rollup, requested_start_date, requested_end_date),
+    }
+
+
+def process_aggregates(aggregates, requested_start_date=None, requested_end_date=None):
+    """process_activities for activities streamed into an aggregators.ActivityAggregates
+
+    The summary comes from the aggregators' running totals and the daily series from their
+    daily rollup rows, so no activity list or frame is ever built.
+    """
+    if not aggregates.count:
+        return None
+    with span('rollup'):
+        daily_rollup = rollup_frame(aggregates.daily.rows(), requested_start_date, requested_end_date)
+    with span('summary'):
+        summary = aggregates.summary()
+    return {**summary, **_daily_fields(daily_rollup, requested_start_date, requested_end_date)}
+
+
+def _daily_fields(daily_rollup, requested_start_date=None, requested_end_date=None):
+    """Running and workout streak fields of the analysis dict, from the daily rollup frame"""
+    # Determine common date range for all streak calculations
+    # Use requested date range if provided, otherwise fall back to activity dates
+    common_date_range_start, common_date_range_end = analysis_window(daily_rollup, requested_start_date, requested_end_date)
+
+    # Running streak metrics (see streaks.compute_streaks), None if there is no running data
+    running_streaks = None
+    # Mileage/pace trend charts are built on demand by /api/chart/<name>
+    has_running_trends = False
+
+    try:
+        with span('running_streaks'):
+            if running_rollup(daily_rollup) is not None:
+                has_running_trends = True
+                daily_index = window_days(common_date_range_start, common_date_range_end)
+                daily = daily_totals(daily_rollup, 'distance', daily_index, 'Run') / METERS_PER_MILE
+
+                # ==============================
+                # Running streaks and gap days
+                # ==============================
+                # Boolean series for run/no-run per day
+                run_days = daily > 0
+                running_streaks = compute_streaks(run_days.to_numpy(), daily_index[0])
+                # The per-day timeline itself is served by /api/timeline/running
+
+    except Exception as e:
+        # Silently handle errors in trend generation
+        pass
+
+    # ==============================
+    # Workout Streak (all activities)
+    # ==============================
+    workout_streaks = None
+    workout_total_days_in_window = 0
+
+    try:
+        with span('workout_streaks'):
+            if common_date_range_start is not None and common_date_range_end is not None:
+                workout_daily_index = window_days(common_date_range_start, common_date_range_end)
+
+                # Calculate total hours per day (moving_time is in seconds) across all activity types
+                daily_workout_hours = daily_totals(daily_rollup, 'moving_time', workout_daily_index) / 3600
+
+                # Boolean series for workout/no-workout per day
+                workout_days = daily_workout_hours > 0
+                workout_streaks = compute_streaks(workout_days.to_numpy(), workout_daily_index[0])
+                # The per-day timeline itself is served by /api/timeline/workout
+                workout_total_days_in_window = len(workout_daily_index)
+    except Exception:
+        pass
+
+    return {
+        'has_running_trends': has_running_trends,
+        # Running streaks + gap analysis (may be None if no running data)
+        'current_streak_days': running_streaks['current_streak'] if running_streaks else 0,
+        'last_run_date': running_streaks['last_active_date'] if running_streaks else None,
+        'days_since_last_run': running_streaks['days_since_last'] if running_streaks else None,
+        'total_gap_days': running_streaks['total_gap_days'] if running_streaks else 0,
+        'longest_gap_days': running_streaks['longest_gap_days'] if running_streaks else 0,
+        'gap_spans': running_streaks['gap_spans'] if running_streaks else [],
+        # Enhanced streak visualization data
+        'longest_run_streak': running_streaks['longest_streak'] if running_streaks else 0,
+        'next_streak_milestone': running_streaks['next_milestone'] if running_streaks else None,
+        'days_to_next_milestone': running_streaks['days_to_next_milestone'] if running_streaks else None,
+        'eta_next_milestone_date': running_streaks['eta_next_milestone'] if running_streaks else None,
+        'running_active_days': running_streaks['active_days'] if running_streaks else 0,
+        'running_missed_days': running_streaks['missed_days'] if running_streaks else 0,
+        'running_total_days_in_window': running_streaks['total_days'] if running_streaks else 0,
+        # Workout streaks (all activities)
+        'workout_current_streak_days': workout_streaks['current_streak'] if workout_streaks else 0,
+        'workout_longest_streak': workout_streaks['longest_streak'] if workout_streaks else 0,
+        'workout_last_activity_date': workout_streaks['last_active_date'] if workout_streaks else None,
+        'workout_days_since_last': workout_streaks['days_since_last'] if workout_streaks else None,
+        'workout_total_gap_days': workout_streaks['total_gap_days'] if workout_streaks else 0,
+        'workout_longest_gap_days': workout_streaks['longest_gap_days'] if workout_streaks else 0,
+        'workout_gap_spans': workout_streaks['gap_spans'] if workout_streaks else [],
+        'workout_next_milestone': workout_streaks['next_milestone'] if workout_streaks else None,
+        'workout_days_to_next_milestone': workout_streaks['days_to_next_milestone'] if workout_streaks else None,
+        'workout_eta_next_milestone': workout_streaks['eta_next_milestone'] if workout_streaks else None,
+        'workout_active_days': workout_streaks['active_days'] if workout_streaks else 0,
+        'workout_missed_days': workout_streaks['missed_days'] if workout_streaks else 0,
+        'workout_total_days_in_window': workout_total_days_in_window
+    }
@@ -1,12 +1,25 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g
+import hashlib
+import importlib.util
 import requests
+import logging
 import os
-from datetime import datetime, timedelta
-import pandas as pd
-import plotly.graph_objs as go
-import plotly.utils
-import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from dotenv import load_dotenv
+from activity_parser import STREAM_KEYS, parse_activity_detail, parse_activity_page, parse_activity_streams
+from activity_store import DEFAULT_EFFORT_DISTANCES, ActivityStore
+from analysis_cache import AnalysisCache
+from analysis_pool import AnalysisPool, AnalysisTimeout
+from compression import compress_response, strip_encoding
+from metrics import render_metrics, request_duration, request_spans, server_timing_header, span, start_request
+from rate_limiter import RateLimiter
+from rollup import DailyRollup
+from sync_worker import IMPORT, SyncWorker, queue_backend
 
 # Load environment variables
 load_dotenv()
@@ -24,14 +37,179 @@ STRAVA_CLIENT_ID = os.getenv('STRAVA_CLIENT_ID')
 STRAVA_CLIENT_SECRET = os.getenv('STRAVA_CLIENT_SECRET')
 STRAVA_PORT = int(os.getenv('FLASK_PORT', '3000'))
 STRAVA_REDIRECT_URI = f'http://localhost:{STRAVA_PORT}/callback'
+# Point these at a stand-in server (e.g. benchmarks/mock_strava.py) for offline testing
+STRAVA_API_URL = os.getenv('STRAVA_API_URL', 'https://www.strava.com/api/v3')
+STRAVA_OAUTH_URL = os.getenv('STRAVA_OAUTH_URL', 'https://www.strava.com/oauth')
+STRAVA_FETCH_CONCURRENCY = int(os.getenv('STRAVA_FETCH_CONCURRENCY', '4'))  # parallel page requests
+STRAVA_POOL_SIZE = int(os.getenv('STRAVA_POOL_SIZE', '10'))  # keep-alive connections per host
+STRAVA_CONNECT_TIMEOUT = float(os.getenv('STRAVA_CONNECT_TIMEOUT', '5'))  # seconds
+STRAVA_READ_TIMEOUT = float(os.getenv('STRAVA_READ_TIMEOUT', '30'))  # seconds
+STRAVA_MAX_RETRIES = int(os.getenv('STRAVA_MAX_RETRIES', '3'))  # retries on 429/5xx/connection errors
+# Initial quotas until the first X-RateLimit-Limit header arrives, and how long a request
+# may wait for budget before falling back to locally stored data
+STRAVA_RATE_LIMIT_15MIN = int(os.getenv('STRAVA_RATE_LIMIT_15MIN', '100'))
+STRAVA_RATE_LIMIT_DAILY = int(os.getenv('STRAVA_RATE_LIMIT_DAILY', '1000'))
+STRAVA_RATE_LIMIT_MAX_WAIT = float(os.getenv('STRAVA_RATE_LIMIT_MAX_WAIT', '30'))  # seconds
+# Processes calling Strava with these credentials, each with its own rate-limit counters, so
+# each one only uses its share of the quota (gunicorn.conf.py sets this to its worker count)
+STRAVA_RATE_LIMIT_PROCESSES = max(1, int(os.getenv('STRAVA_RATE_LIMIT_PROCESSES', '1')))
+
+# Local activity store configuration
+ACTIVITY_STORE_PATH = os.getenv('ACTIVITY_STORE_PATH', os.path.join('data', 'activities.db'))
+ACTIVITY_SYNC_INTERVAL = int(os.getenv('ACTIVITY_SYNC_INTERVAL', '300'))  # seconds between incremental syncs
+# Columnar (Arrow) snapshots of the stored activities, used when pyarrow is installed
+# (checked without importing it, see activity_snapshots())
+ACTIVITY_SNAPSHOTS_ENABLED = (os.getenv('ACTIVITY_SNAPSHOTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+                              and importlib.util.find_spec('pyarrow') is not None)
+ACTIVITY_SNAPSHOT_PATH = os.getenv('ACTIVITY_SNAPSHOT_PATH', os.path.join('data', 'snapshots'))
+
+# Background sync: page loads only read the store and queue jobs for these workers.
+# Access tokens are kept in the queue database so jobs survive a restart.
+SYNC_WORKER_ENABLED = os.getenv('SYNC_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SYNC_WORKERS = int(os.getenv('SYNC_WORKERS', '2'))  # worker threads
+SYNC_QUEUE_BACKEND = os.getenv('SYNC_QUEUE_BACKEND', 'sqlite')  # 'sqlite' or 'memory'
+SYNC_QUEUE_PATH = os.getenv('SYNC_QUEUE_PATH', os.path.join('data', 'sync_queue.db'))
+# The workers also fetch each run's details once (best efforts and splits, for real PRs)
+# with whatever rate-limit budget page loads and syncs leave over
+ACTIVITY_DETAILS_ENABLED = os.getenv('ACTIVITY_DETAILS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ACTIVITY_DETAILS_BATCH = int(os.getenv('ACTIVITY_DETAILS_BATCH', '50'))  # runs per details job
+ACTIVITY_DETAILS_RESERVE = float(os.getenv('ACTIVITY_DETAILS_RESERVE', '0.5'))  # budget fraction never used for details
+# Optionally, once every run has its details, its streams too (one .npy file per run), for
+# fastest times over any distance; same batch size and budget as details
+ACTIVITY_STREAMS_ENABLED = os.getenv('ACTIVITY_STREAMS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+ACTIVITY_STREAMS_PATH = os.getenv('ACTIVITY_STREAMS_PATH', os.path.join('data', 'streams'))
+
+# Analysis result cache configuration
+ANALYSIS_CACHE_MAX_MB = int(os.getenv('ANALYSIS_CACHE_MAX_MB', '64'))
+ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', '3600'))  # seconds
+
+# Process pool for the analytics of large histories (0 workers analyzes every request inline);
+# smaller inputs are always analyzed inline since shipping them to a worker costs more
+ANALYSIS_POOL_WORKERS = int(os.getenv('ANALYSIS_POOL_WORKERS', '0'))
+ANALYSIS_POOL_TIMEOUT = float(os.getenv('ANALYSIS_POOL_TIMEOUT', '30'))  # seconds
+ANALYSIS_POOL_MIN_ACTIVITIES = int(os.getenv('ANALYSIS_POOL_MIN_ACTIVITIES', '5000'))
+
+# HTTP responses: gzip (or brotli, when installed) compression of text and JSON bodies, and
+# how long a browser may reuse chart/timeline JSON requested for the page's exact data version
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'true').lower() in ('1', 'true', 'yes')
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+# Best-effort names (as Strava reports them) shown as PRs on the Running Stats tab
+RECORD_EFFORTS = ('1 mile', '5K', '10K', 'Half-Marathon', 'Marathon')
+# Most distances one /api/fastest request may ask for, and how many distances besides the
+# defaults have their per-run times cached (most recently used first; others are computed per request)
+MAX_EFFORT_DISTANCES = 20
+CACHED_EFFORT_DISTANCES = 8
+CHART_CACHE_MAX_AGE = int(os.getenv('CHART_CACHE_MAX_AGE', '86400'))  # seconds
+# Pages are per-session and always revalidated (cheaply, see results_etag)
+RESULTS_CACHE_CONTROL = 'private, no-cache'
+
+# Observability: log level (DEBUG enables the fetch/frame debug dumps) and whether
+# responses carry a Server-Timing header with the per-request span breakdown
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+class StravaAPIError(Exception):
+    """Raised when a Strava API request still fails after all retries"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitExceeded(StravaAPIError):
+    """Raised when the shared rate-limit budget has no room for another request"""
+
+
+class ActivityFetchResult(list):
+    """List of activities plus how the fetch went: 'complete', 'partial' or 'failed'"""
+
+    def __init__(self, activities=(), status='complete', error=None):
+        super().__init__(activities)
+        self.status = status
+        self.error = error
+
+    @property
+    def complete(self):
+        return self.status == 'complete'
+
+
+class ActivityPages:
+    """Iterator over pages (lists) of activities plus how the fetch went, like ActivityFetchResult
+
+    Only one page is held at a time. A page that still fails after retries ends the
+    iteration early instead of raising; status, error and fetched are final once the
+    iteration is over. error may be given up front for a failed step (such as a sync)
+    that the pages could be missing data from.
+    """
+
+    def __init__(self, pages, error=None):
+        self._pages = pages
+        self.status = 'complete'
+        self.error = error
+        self.fetched = 0
+
+    def __iter__(self):
+        try:
+            for page in self._pages:
+                self.fetched += len(page)
+                yield page
+        except StravaAPIError as e:
+            self.error = str(e)
+        if self.error is not None:
+            self.status = 'partial' if self.fetched else 'failed'
+
+    @property
+    def complete(self):
+        return self.status == 'complete'
+
 
 class StravaAPI:
-    def __init__(self):
-        self.base_url = 'https://www.strava.com/api/v3'
+    # Responses worth retrying: rate limited or transient server-side failures
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, store=None, min_sync_interval=300, fetch_concurrency=1,
+                 pool_size=10, connect_timeout=5, read_timeout=30,
+                 max_retries=3, backoff_base=0.5, backoff_max=30, rate_limiter=None,
+                 detail_batch_size=50, detail_budget_reserve=0.5, stream_path=None,
+                 base_url='https://www.strava.com/api/v3', oauth_url='https://www.strava.com/oauth'):
+        self.base_url = base_url.rstrip('/')
+        self.oauth_url = oauth_url.rstrip('/')
+        # Number of activity pages requested in parallel after the first page
+        self.fetch_concurrency = max(1, fetch_concurrency)
+        # Optional local activity store; when set, get_activities reads from it and
+        # only pulls activities newer than the last synced start_date from Strava
+        self.store = store
+        self.min_sync_interval = min_sync_interval
+        # Activity details (best efforts, splits) are fetched at most detail_batch_size per call
+        # to fetch_activity_details, and only while more than detail_budget_reserve (a fraction)
+        # of the rate-limit budget is left for page loads and syncs
+        self.detail_batch_size = detail_batch_size
+        self.detail_budget_reserve = detail_budget_reserve
+        # Optional directory of a StreamStore; when set, runs' streams are fetched the same way
+        # (and with the same budget) once every run has its details
+        self.stream_path = stream_path
+        self._stream_store = None
+        self._stream_store_lock = threading.Lock()
+
+        # One pooled keep-alive session for all calls instead of a new TCP+TLS handshake per page
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=max(pool_size, self.fetch_concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Shared budget tracker fed by X-RateLimit-* headers (see rate_limiter.py)
+        self.rate_limiter = rate_limiter
     
     def get_auth_url(self):
         """Generate Strava OAuth authorization URL"""
-        return (f"https://www.strava.com/oauth/authorize?"
+        return (f"{self.oauth_url}/authorize?"
                 f"client_id={STRAVA_CLIENT_ID}&"
                 f"redirect_uri={STRAVA_REDIRECT_URI}&"
                 f"response_type=code&"
@@ -39,63 +217,382 @@ class StravaAPI:
     
     def exchange_code_for_token(self, code):
         """Exchange authorization code for access token"""
-        token_url = 'https://www.strava.com/oauth/token'
-        data = {
+        # Authorization codes are single-use, so never retry the exchange
+        response = self._request('POST', f'{self.oauth_url}/token', retries=0, data=self._token_request(code))
+        return response.json()
+
+    def _token_request(self, code):
+        return {
             'client_id': STRAVA_CLIENT_ID,
             'client_secret': STRAVA_CLIENT_SECRET,
             'code': code,
             'grant_type': 'authorization_code'
         }
-        
-        response = requests.post(token_url, data=data)
-        return response.json()
     
-    def get_activities(self, access_token, start_date, end_date, per_page=200):
-        """Fetch activities from Strava API"""
-        headers = {'Authorization': f'Bearer {access_token}'}
-
+    def get_activities(self, access_token, start_date, end_date, per_page=200, athlete_id=None, sync=True,
+                       stream=False):
+        """Fetch activities from the local store (syncing as needed) or the Strava API
+
+        Returns an ActivityFetchResult whose status is 'partial' when Strava could not
+        be reached for part of the range instead of silently truncating the list. Pass
+        sync=False to read the store as-is when the caller has already synced it, and
+        stream=True for an ActivityPages of up to per_page activities at a time instead,
+        so the whole range is never in memory at once.
+        """
         # Convert dates to Unix timestamps
         start_timestamp = int(start_date.timestamp())
         end_timestamp = int(end_date.timestamp())
 
-        print(f"DEBUG: Fetching activities from {start_date} (timestamp: {start_timestamp}) to {end_date} (timestamp: {end_timestamp})")
-        
-        activities = []
-        page = 1
-        
+        logger.debug('Fetching activities from %s (timestamp: %d) to %s (timestamp: %d)',
+                     start_date, start_timestamp, end_date, end_timestamp)
+
+        if self.store is not None and athlete_id is not None:
+            error = None
+            if sync:
+                error = self.sync_activities(access_token, athlete_id, start_timestamp, end_timestamp, per_page)
+            if stream:
+                return ActivityPages(self.store.iter_activities(athlete_id, start_timestamp, end_timestamp, per_page),
+                                     error=error)
+            with span('store_read'):
+                stored = self.store.get_activities(athlete_id, start_timestamp, end_timestamp)
+            status = 'complete' if error is None else ('partial' if stored else 'failed')
+            activities = ActivityFetchResult(stored, status=status, error=error)
+        elif stream:
+            return self.activity_pages(access_token, start_timestamp, end_timestamp, per_page)
+        else:
+            activities = self._fetch_activities(access_token, start_timestamp, end_timestamp, per_page)
+
+        logger.debug('Fetched %d activities (status: %s)', len(activities), activities.status)
+        if activities and logger.isEnabledFor(logging.DEBUG):
+            logger.debug('First activity date: %s, last activity date: %s',
+                         activities[0].get('start_date_local'), activities[-1].get('start_date_local'))
+
+        return activities
+
+    def sync_activities(self, access_token, athlete_id, start_timestamp, end_timestamp, per_page=200,
+                        progress=None, force=False):
+        """Bring the local store up to date for [start, end] with as few API calls as possible
+
+        Returns None on success, or the error message of the first fetch that failed.
+        progress is called with the number of activities fetched so far after every page;
+        force skips the min_sync_interval throttle on the incremental pull. Each page is
+        written to the store as it arrives, so an import never holds more than a page.
+        """
+        fetched = 0
+        for after, before, covered_from, synced_until in self._sync_steps(athlete_id, start_timestamp,
+                                                                          end_timestamp, force):
+            pages = self.activity_pages(access_token, after, before, per_page)
+            for page in pages:
+                with span('store_write'):
+                    self.store.upsert_activities(athlete_id, page)
+                fetched += len(page)
+                if progress:
+                    progress(fetched)
+            if not pages.complete:
+                return pages.error
+            self.store.record_sync(athlete_id, covered_from, synced_until)
+        return None
+
+    def get_activity_detail(self, access_token, activity_id):
+        """best_efforts and splits_standard of one activity (see activity_parser.parse_activity_detail)"""
+        response = self._request('GET', f'{self.base_url}/activities/{activity_id}',
+                                 headers={'Authorization': f'Bearer {access_token}'})
+        return parse_activity_detail(response.content)
+
+    def fetch_activity_details(self, access_token, athlete_id, progress=None):
+        """Fetch and store the details of the athlete's newest runs that have none yet
+
+        Asks for as many runs as details_budget() allows, fetch_concurrency requests at a
+        time, and stores each one as it arrives so no activity is ever requested twice; one
+        Strava no longer has (404) is stored without details. Returns None on success or the
+        error of the first request that failed, after which nothing more is requested.
+        progress is called with the number of runs stored so far.
+        """
+        activity_ids = self.store.runs_without_details(athlete_id, self.details_budget())
+
+        def save(activity_id, details):
+            self.store.save_activity_details(athlete_id, activity_id, details)
+
+        return self._fetch_each(activity_ids, lambda activity_id: self.get_activity_detail(access_token, activity_id),
+                                save, progress)
+
+    def get_activity_streams(self, access_token, activity_id):
+        """time/distance/heartrate/altitude samples of one activity (see activity_parser.parse_activity_streams)"""
+        response = self._request('GET', f'{self.base_url}/activities/{activity_id}/streams',
+                                 params={'keys': ','.join(STREAM_KEYS), 'key_by_type': 'true'},
+                                 headers={'Authorization': f'Bearer {access_token}'})
+        return parse_activity_streams(response.content)
+
+    def fetch_activity_streams(self, access_token, athlete_id, progress=None):
+        """Fetch the streams of the athlete's newest runs that have none yet into the stream store
+
+        Like fetch_activity_details: budgeted by details_budget(), each run is fetched once
+        and a run Strava has no streams for is recorded with 0 samples. Afterwards the new
+        runs' fastest times over DEFAULT_EFFORT_DISTANCES are computed and cached.
+        """
+        from stream_store import update_stream_efforts
+
+        activity_ids = self.store.runs_without_streams(athlete_id, self.details_budget())
+
+        def save(activity_id, streams):
+            samples = self.stream_store.save(athlete_id, activity_id, streams) if streams else 0
+            self.store.record_streams(athlete_id, activity_id, samples)
+
+        error = self._fetch_each(activity_ids, lambda activity_id: self.get_activity_streams(access_token, activity_id),
+                                 save, progress)
+        # Have the default distances cached before anyone asks for them
+        with span('stream_efforts'):
+            update_stream_efforts(self.stream_store, self.store, athlete_id, DEFAULT_EFFORT_DISTANCES)
+        return error
+
+    def _fetch_each(self, activity_ids, fetch, save, progress=None):
+        """Run fetch for each activity id, fetch_concurrency at a time, and save each result as it arrives
+
+        A 404 is saved as None. The first other error cancels the requests not sent yet and
+        is returned; None on success. progress is called with the number saved so far.
+        """
+        if not activity_ids:
+            return None
+
+        def fetch_one(activity_id):
+            try:
+                return fetch(activity_id)
+            except StravaAPIError as e:
+                if e.status_code == 404:
+                    return None
+                raise
+
+        stored = 0
+        with ThreadPoolExecutor(max_workers=self.fetch_concurrency) as executor:
+            futures = {executor.submit(fetch_one, activity_id): activity_id for activity_id in activity_ids}
+            try:
+                for future in as_completed(futures):
+                    with span('store_write'):
+                        save(futures[future], future.result())
+                    stored += 1
+                    if progress:
+                        progress(stored)
+            except StravaAPIError as e:
+                for future in futures:
+                    future.cancel()
+                return str(e)
+        return None
+
+    def details_budget(self):
+        """How many detail requests fetch_activity_details may send right now"""
+        if self.rate_limiter is None:
+            return self.detail_batch_size
+        return min(self.detail_batch_size, self.rate_limiter.spare(self.detail_budget_reserve))
+
+    def details_pending(self, athlete_id):
+        """True if the athlete has runs without details and there is budget to fetch some"""
+        return self.details_budget() > 0 and bool(self.store.runs_without_details(athlete_id, 1))
+
+    def streams_pending(self, athlete_id):
+        """True if streams are stored, the athlete has runs without them and there is budget to fetch some"""
+        return (self.stream_path is not None and self.details_budget() > 0
+                and bool(self.store.runs_without_streams(athlete_id, 1)))
+
+    @property
+    def stream_store(self):
+        """The StreamStore under stream_path, or None when streams are off
+
+        Created on first use, since loading it imports numpy.
+        """
+        if self.stream_path is None:
+            return None
+        with self._stream_store_lock:
+            if self._stream_store is None:
+                from stream_store import StreamStore
+                self._stream_store = StreamStore(self.stream_path)
+            return self._stream_store
+
+    def _sync_steps(self, athlete_id, start_timestamp, end_timestamp, force=False):
+        """(after, before, covered_from, synced_until) for each fetch a sync needs, in order
+
+        After each fetch completes the store records [covered_from, synced_until] as synced.
+        """
+        now = int(time.time())
+        state = self.store.get_sync_state(athlete_id)
+        if state is None:
+            # First sync: import everything from the requested start up to now
+            return [(start_timestamp, None, start_timestamp, now)]
+
+        steps = []
+        # Backfill history older than anything synced so far
+        if start_timestamp < state['covered_from']:
+            steps.append((start_timestamp, state['covered_from'], start_timestamp, state['synced_until']))
+
+        # Pull only activities newer than the last synced start_date, and only when the
+        # requested window extends past what we have and the last sync is not too recent
+        stale = force or time.time() - state['synced_at'] >= self.min_sync_interval
+        if end_timestamp > state['synced_until'] and stale:
+            after = state['last_start_date'] or state['covered_from']
+            steps.append((after, None, after, now))
+        return steps
+
+    @span('strava_fetch')
+    def _fetch_activities(self, access_token, after, before, per_page=200):
+        """Page through /athlete/activities and return an ActivityFetchResult"""
+        pages = self.activity_pages(access_token, after, before, per_page)
+        activities = [activity for page in pages for activity in page]
+        return ActivityFetchResult(activities, status=pages.status, error=pages.error)
+
+    def activity_pages(self, access_token, after, before, per_page=200):
+        """ActivityPages over /athlete/activities, requested as the iteration reaches them"""
+        headers, params = self._activity_query(access_token, after, before, per_page)
+        return ActivityPages(self._iter_pages(headers, params, per_page))
+
+    def _iter_pages(self, headers, params, per_page):
+        """Pages 1, 2, ... in order, until a short page; raises StravaAPIError on a failed page"""
+        # Always fetch the first page on its own so short date ranges cost a single request
+        page_activities = self._fetch_page(headers, params, 1)
+        yield page_activities
+        if len(page_activities) < per_page:
+            return
+
+        if self.fetch_concurrency > 1:
+            yield from self._fetch_pages_concurrently(headers, params, per_page)
+            return
+
+        page = 2
         while True:
-            params = {
-                'after': start_timestamp,
-                'before': end_timestamp,
-                'per_page': per_page,
-                'page': page
-            }
-            
-            response = requests.get(f'{self.base_url}/athlete/activities', 
-                                  headers=headers, params=params)
-            
-            if response.status_code != 200:
-                break
-                
-            page_activities = response.json()
-            if not page_activities:
-                break
-                
-            activities.extend(page_activities)
+            page_activities = self._fetch_page(headers, params, page)
+            yield page_activities
             page += 1
-            
+
             # Strava API rate limit protection
             if len(page_activities) < per_page:
                 break
 
-        print(f"DEBUG: Fetched {len(activities)} activities")
-        if activities:
-            print(f"DEBUG: First activity date: {activities[0].get('start_date_local')}")
-            print(f"DEBUG: Last activity date: {activities[-1].get('start_date_local')}")
-
-        return activities
-
-strava_api = StravaAPI()
+    def _activity_query(self, access_token, after, before, per_page):
+        """Headers and query parameters for /athlete/activities"""
+        headers = {'Authorization': f'Bearer {access_token}'}
+        params = {'after': after, 'per_page': per_page}
+        if before is not None:
+            params['before'] = before
+        return headers, params
+
+    def _fetch_pages_concurrently(self, headers, params, per_page):
+        """Yield pages 2, 3, ... fetched in parallel windows of fetch_concurrency pages, in page order"""
+        page = 2
+        with ThreadPoolExecutor(max_workers=self.fetch_concurrency) as executor:
+            while True:
+                window = range(page, page + self.fetch_concurrency)
+                results = executor.map(lambda p: self._fetch_page(headers, params, p), window)
+                # map() yields in page order and re-raises a page's error when reached,
+                # so everything before the first failed or short page is kept
+                for page_activities in results:
+                    yield page_activities
+                    if len(page_activities) < per_page:
+                        return
+                page += self.fetch_concurrency
+
+    def _fetch_page(self, headers, params, page):
+        """Fetch a single page of activities, keeping only the fields the app reads"""
+        response = self._request('GET', f'{self.base_url}/athlete/activities',
+                                 headers=headers, params={**params, 'page': page})
+        return parse_activity_page(response.content)
+
+    def _request(self, method, url, retries=None, **kwargs):
+        """Send a request on the pooled session, retrying 429/5xx and connection errors
+
+        Retries use exponential backoff with full jitter (capped at backoff_max) and honor
+        a Retry-After header when Strava sends one. Raises StravaAPIError once retries are
+        exhausted or on any other non-2xx response.
+        """
+        retries = self.max_retries if retries is None else retries
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None and not self.rate_limiter.acquire():
+                raise RateLimitExceeded('Strava rate limit nearly reached, try again in a few minutes',
+                                        status_code=429)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= retries:
+                    raise StravaAPIError(f'{method} {url} failed: {e}') from e
+                response = None
+
+            if response is not None and self._accept_response(method, url, response, attempt, retries):
+                return response
+
+            time.sleep(self._backoff_delay(attempt, response))
+            attempt += 1
+
+    def _accept_response(self, method, url, response, attempt, retries):
+        """Feed the rate limiter; True for a usable response, False to retry, else raise"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.update(response.headers)
+            if response.status_code == 429:
+                self.rate_limiter.mark_exhausted()
+        if 200 <= response.status_code < 300:
+            return True
+        if response.status_code not in self.RETRY_STATUS_CODES or attempt >= retries:
+            raise StravaAPIError(f'{method} {url} returned HTTP {response.status_code}',
+                                 status_code=response.status_code)
+        return False
+
+    def _backoff_delay(self, attempt, response=None):
+        """Seconds to wait before retry number attempt + 1"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+strava_api = StravaAPI(store=ActivityStore(ACTIVITY_STORE_PATH),
+                       min_sync_interval=ACTIVITY_SYNC_INTERVAL,
+                       fetch_concurrency=STRAVA_FETCH_CONCURRENCY,
+                       pool_size=STRAVA_POOL_SIZE,
+                       connect_timeout=STRAVA_CONNECT_TIMEOUT,
+                       read_timeout=STRAVA_READ_TIMEOUT,
+                       max_retries=STRAVA_MAX_RETRIES,
+                       rate_limiter=RateLimiter(short_limit=STRAVA_RATE_LIMIT_15MIN,
+                                                daily_limit=STRAVA_RATE_LIMIT_DAILY,
+                                                max_wait=STRAVA_RATE_LIMIT_MAX_WAIT,
+                                                share=1 / STRAVA_RATE_LIMIT_PROCESSES),
+                       detail_batch_size=ACTIVITY_DETAILS_BATCH,
+                       detail_budget_reserve=ACTIVITY_DETAILS_RESERVE,
+                       stream_path=ACTIVITY_STREAMS_PATH if ACTIVITY_STREAMS_ENABLED else None,
+                       base_url=STRAVA_API_URL,
+                       oauth_url=STRAVA_OAUTH_URL)
+_activity_snapshots = None
+_snapshots_lock = threading.Lock()
+sync_worker = None
+if SYNC_WORKER_ENABLED and strava_api.store is not None:
+    sync_worker = SyncWorker(strava_api, queue_backend(SYNC_QUEUE_BACKEND, SYNC_QUEUE_PATH),
+                             workers=SYNC_WORKERS, interval=ACTIVITY_SYNC_INTERVAL,
+                             fetch_details=ACTIVITY_DETAILS_ENABLED)
+analysis_pool = AnalysisPool(workers=ANALYSIS_POOL_WORKERS, timeout=ANALYSIS_POOL_TIMEOUT,
+                             min_activities=ANALYSIS_POOL_MIN_ACTIVITIES)
+analysis_cache = AnalysisCache(max_bytes=ANALYSIS_CACHE_MAX_MB * 1024 * 1024, ttl=ANALYSIS_CACHE_TTL)
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    start_request()
+    if sync_worker is not None:
+        # Started on first request rather than at import so the reloader's parent process
+        # never runs jobs; start() is a no-op once the threads are running
+        sync_worker.start()
+
+@app.after_request
+def record_request_timing(response):
+    """Record request latency and optionally expose the span breakdown as Server-Timing"""
+    elapsed = time.perf_counter() - g.request_started
+    request_duration.observe(elapsed, endpoint=request.endpoint or 'unmatched')
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing_header(request_spans() + [('total', elapsed)])
+    return response
+
+@app.after_request
+def compress(response):
+    """Compress text and JSON responses; registered last so it runs before the request is timed"""
+    if RESPONSE_COMPRESSION:
+        with span('compress'):
+            compress_response(response, request.accept_encodings, RESPONSE_COMPRESSION_MIN_BYTES)
+    return response
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -103,10 +600,10 @@ def index():
     if 'access_token' not in session:
         return render_template('login.html', auth_url=strava_api.get_auth_url())
 
-    # Get dates from POST form or use defaults (last 7 days)
-    if request.method == 'POST':
-        start_date_str = request.form.get('start_date')
-        end_date_str = request.form.get('end_date')
+    # Get dates from the submitted form (GET or POST) or use defaults (last 7 days)
+    if request.method == 'POST' or 'start_date' in request.args:
+        start_date_str = request.values.get('start_date')
+        end_date_str = request.values.get('end_date')
     else:
         # Default to last 7 days (full calendar days)
         end_date = datetime.now()
@@ -115,37 +612,419 @@ def index():
         end_date_str = end_date.strftime('%Y-%m-%d')
 
     try:
-        from datetime import timezone
-
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
-
-        # Set to full day range: 00:00:00 to 23:59:59 in UTC
-        # This ensures we capture all activities on these calendar days regardless of timezone
-        start_date = start_date.replace(hour=0, minute=0, second=0, tzinfo=timezone.utc)
-        end_date = end_date.replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)
-
-    except ValueError:
+        start_date, end_date = parse_date_range(start_date_str, end_date_str)
+    except (TypeError, ValueError):
         return "Invalid date format", 400
 
-    # Fetch activities
-    activities = strava_api.get_activities(session['access_token'], start_date, end_date)
-
-    if not activities:
+    athlete_id = (session.get('athlete') or {}).get('id')
+    use_store = strava_api.store is not None and athlete_id is not None
+
+    # Sync the local store first so the cache key reflects the latest data version; with the
+    # background worker the sync is only queued and the page renders what is stored so far
+    cache_key = None
+    etag = None
+    sync_error = None
+    sync_status = None
+    if use_store:
+        if sync_worker is not None:
+            sync_status = _queue_sync(athlete_id, int(start_date.timestamp()))
+            if sync_status['state'] == 'failed':
+                sync_error = sync_status['error']
+        else:
+            sync_error = strava_api.sync_activities(session['access_token'], athlete_id,
+                                                    int(start_date.timestamp()), int(end_date.timestamp()))
+        data_version = strava_api.store.get_data_version(athlete_id)
+        if not sync_error and not (sync_status and sync_status['state'] in ('queued', 'running')):
+            # Nothing on the page can change until the data version does, so a repeat view
+            # is answered without reading or analyzing anything
+            etag = results_etag(athlete_id, start_date_str, end_date_str, data_version)
+            not_modified = _not_modified(etag, RESULTS_CACHE_CONTROL)
+            if not_modified is not None:
+                return not_modified
+
+        cache_key = (athlete_id, start_date_str, end_date_str, data_version)
+        analysis = analysis_cache.get(cache_key)
+        if analysis is not None:
+            with span('render'):
+                return _with_validators(render_template(
+                    'results.html', analysis=analysis,
+                    fetch_warning=_fetch_warning('partial', sync_error) if sync_error else None,
+                    sync_status=sync_status, start_date=start_date_str, end_date=end_date_str,
+                    results_version=etag), etag, RESULTS_CACHE_CONTROL)
+
+    # Fetch activities; with snapshots the analysis frame is memory-mapped from their
+    # columnar files instead of parsing every stored activity's JSON. Without a store,
+    # Strava's pages are folded into aggregators as they arrive and then dropped
+    frame = None
+    aggregates = None
+    snapshots = activity_snapshots() if use_store else None
+    if snapshots is not None:
+        with span('snapshot_read'):
+            frame = snapshots.load_frame(athlete_id, int(start_date.timestamp()), int(end_date.timestamp()))
+        activities = ActivityFetchResult()
+    elif use_store:
+        activities = strava_api.get_activities(session['access_token'], start_date, end_date,
+                                               athlete_id=athlete_id, sync=False)
+    else:
+        from aggregators import ActivityAggregates
+        aggregates = ActivityAggregates()
+        activities = strava_api.get_activities(session['access_token'], start_date, end_date, stream=True)
+        with span('strava_fetch'):
+            for page in activities:
+                aggregates.add_page(page)
+    if frame is not None:
+        found = len(frame)
+    else:
+        found = aggregates.count if aggregates is not None else len(activities)
+    if sync_error:
+        activities.status = 'partial' if found else 'failed'
+        activities.error = sync_error
+
+    # Surface incomplete fetches instead of presenting truncated data as the full picture
+    fetch_warning = None if activities.complete else _fetch_warning(activities.status, activities.error)
+
+    if not found:
+        message = "No activities found in the specified date range."
+        if sync_status and sync_status['state'] in ('queued', 'running'):
+            message = "Your Strava history is still being imported. This page will refresh when it is ready."
+        return _with_validators(render_template('results.html',
+                                                message=message,
+                                                fetch_warning=fetch_warning,
+                                                sync_status=sync_status,
+                                                start_date=start_date_str,
+                                                end_date=end_date_str), etag, RESULTS_CACHE_CONTROL)
+
+    # Process activities data; streaks come from the daily rollup the store keeps up to date
+    with span('store_read'):
+        rollup = strava_api.store.get_daily_rollup(athlete_id, start_date_str, end_date_str) if use_store else None
+    try:
+        if aggregates is not None:
+            from analytics import process_aggregates
+            analysis = process_aggregates(aggregates, start_date, end_date)
+        else:
+            analysis = analysis_pool.run(activities, start_date, end_date, rollup=rollup, frame=frame)
+    except AnalysisTimeout as e:
+        logger.warning('%s', e)
         return render_template('results.html',
-                             message="No activities found in the specified date range.",
-                             start_date=start_date_str,
-                             end_date=end_date_str)
-
-    # Process activities data
-    analysis = process_activities(activities, session['access_token'], start_date, end_date)
+                               message="Analyzing this date range is taking too long. Please try a shorter range.",
+                               fetch_warning=fetch_warning,
+                               sync_status=sync_status,
+                               start_date=start_date_str,
+                               end_date=end_date_str), 503
 
     # Add date range to analysis results
     analysis['start_date'] = start_date_str
     analysis['end_date'] = end_date_str
     analysis['date_range_formatted'] = f"{start_date.strftime('%B %d, %Y')} - {end_date.strftime('%B %d, %Y')}"
 
-    return render_template('results.html', analysis=analysis, start_date=start_date_str, end_date=end_date_str)
+    if cache_key is not None:
+        analysis_cache.put(cache_key, analysis)
+
+    with span('render'):
+        return _with_validators(render_template('results.html', analysis=analysis, fetch_warning=fetch_warning,
+                                                sync_status=sync_status, start_date=start_date_str,
+                                                end_date=end_date_str, results_version=etag),
+                                etag, RESULTS_CACHE_CONTROL)
+
+def activity_snapshots():
+    """The shared ActivitySnapshots, or None when snapshots are off or pyarrow is missing
+
+    Created on first use, since loading it imports pandas and pyarrow.
+    """
+    global _activity_snapshots
+    if not ACTIVITY_SNAPSHOTS_ENABLED or strava_api.store is None:
+        return None
+    with _snapshots_lock:
+        if _activity_snapshots is None:
+            from activity_snapshots import ActivitySnapshots
+            _activity_snapshots = ActivitySnapshots(strava_api.store, ACTIVITY_SNAPSHOT_PATH)
+        return _activity_snapshots
+
+def prewarm_analytics():
+    """Import the analytics stack (pandas, Plotly, pyarrow) ahead of the first request needing it"""
+    with span('prewarm'):
+        import analytics  # noqa: F401
+        from charts import plotly_template
+        plotly_template()
+        activity_snapshots()
+
+def _queue_sync(athlete_id, start_timestamp):
+    """Queue whatever sync the requested range needs and return the athlete's sync status"""
+    sync_worker.remember_token(athlete_id, session['access_token'], session.get('token_expires_at'))
+    state = strava_api.store.get_sync_state(athlete_id)
+    if state is None:
+        sync_worker.enqueue(athlete_id, IMPORT, since=0)
+    elif start_timestamp < state['covered_from']:
+        sync_worker.enqueue(athlete_id, IMPORT, since=start_timestamp)
+    else:
+        sync_worker.enqueue_if_stale(athlete_id)
+    return sync_worker.status(athlete_id)
+
+@app.route('/api/chart/<name>')
+def chart(name):
+    """Plotly JSON for a single chart, computed on demand when its tab is shown"""
+    from charts import CHARTS, build_chart
+    return _rollup_json('chart', name, CHARTS, build_chart)
+
+@app.route('/api/timeline/<name>')
+def timeline(name):
+    """Daily dates and values of a streak timeline, fetched by the results page"""
+    from charts import TIMELINES, build_timeline
+    return _rollup_json('timeline', name, TIMELINES, build_timeline)
+
+def _rollup_json(kind, name, builders, build):
+    """JSON response for a view built from the daily rollup, cached and conditional on the data version"""
+    if 'access_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if name not in builders:
+        return jsonify({'error': f'Unknown {kind}: {name}'}), 404
+
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    try:
+        start_date, end_date = parse_date_range(start_date_str, end_date_str)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    athlete_id = (session.get('athlete') or {}).get('id')
+    use_store = strava_api.store is not None and athlete_id is not None
+    data_version = strava_api.store.get_data_version(athlete_id) if use_store else None
+
+    etag = None
+    cache_control = 'private, no-cache'
+    if use_store:
+        etag = results_etag(athlete_id, start_date_str, end_date_str, data_version)
+        # Results pages ask with v= their own ETag; while that is current the JSON can't change,
+        # and a newer data version gives the page a new v, i.e. a new URL
+        if request.args.get('v') == etag:
+            cache_control = f'private, max-age={CHART_CACHE_MAX_AGE}'
+        not_modified = _not_modified(etag, cache_control)
+        if not_modified is not None:
+            return not_modified
+
+    json_key = (athlete_id, start_date_str, end_date_str, f'{kind}:{name}', data_version)
+    body = analysis_cache.get(json_key) if use_store else None
+    if body is None:
+        rollup = _daily_rollup(athlete_id, start_date, end_date, start_date_str, end_date_str, use_store)
+        body = (build(name, rollup, start_date, end_date) if not rollup.empty else None) or 'null'
+        if use_store:
+            analysis_cache.put(json_key, body)
+
+    return _with_validators(app.response_class(body, mimetype='application/json'), etag, cache_control)
+
+@app.route('/api/summary')
+def summary():
+    """Summary card values for a date range, from the athlete's prefix-sum range index
+
+    Answered in constant time whatever the range, so the date picker can preview a range's
+    totals before the full analysis is requested.
+    """
+    if 'access_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    try:
+        parse_date_range(start_date_str, end_date_str)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    athlete_id = (session.get('athlete') or {}).get('id')
+    if strava_api.store is None or athlete_id is None:
+        return jsonify({'error': 'Summaries need the local activity store'}), 404
+
+    data_version = strava_api.store.get_data_version(athlete_id)
+    etag = results_etag(athlete_id, start_date_str, end_date_str, data_version)
+    not_modified = _not_modified(etag, RESULTS_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    with span('range_summary'):
+        body = athlete_range_index(athlete_id, data_version).summary(start_date_str, end_date_str)
+    return _with_validators(jsonify(body), etag, RESULTS_CACHE_CONTROL)
+
+@app.route('/api/records')
+def records():
+    """Best efforts over a date range next to the all-time PRs, for the Running Stats tab
+
+    Read from the best-efforts store that background details jobs fill in, so this never
+    calls Strava; runs_with_details says how many of the range's runs it covers so far.
+    """
+    if 'access_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    try:
+        start_date, end_date = parse_date_range(start_date_str, end_date_str)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid date format'}), 400
+
+    athlete_id = (session.get('athlete') or {}).get('id')
+    store = strava_api.store
+    if store is None or athlete_id is None:
+        return jsonify({'error': 'Records need the local activity store'}), 404
+
+    start_timestamp, end_timestamp = int(start_date.timestamp()), int(end_date.timestamp())
+    with span('store_read'):
+        # Details are only ever added, so their count versions the records like data_version
+        details_version = store.get_details_coverage(athlete_id)[0]
+        etag = results_etag(athlete_id, start_date_str, end_date_str,
+                            f'{store.get_data_version(athlete_id)}.{details_version}')
+        not_modified = _not_modified(etag, RESULTS_CACHE_CONTROL)
+        if not_modified is not None:
+            return not_modified
+        best = store.get_best_efforts(athlete_id, start_timestamp, end_timestamp)
+        all_time = store.get_personal_records(athlete_id)
+        runs_with_details, runs = store.get_details_coverage(athlete_id, start_timestamp, end_timestamp)
+
+    efforts = [{'name': name, 'best': _effort_json(best.get(name)), 'record': _effort_json(all_time[name]),
+                'is_record': name in best and best[name]['elapsed_time'] <= all_time[name]['elapsed_time']}
+               for name in RECORD_EFFORTS if name in all_time]
+    return _with_validators(jsonify({'efforts': efforts, 'runs_with_details': runs_with_details, 'runs': runs}),
+                            etag, RESULTS_CACHE_CONTROL)
+
+@app.route('/api/fastest')
+def fastest():
+    """Fastest time over each of any distances (meters) in a date range, from stored activity streams
+
+    distances is a comma-separated list, rounded to whole meters (DEFAULT_EFFORT_DISTANCES
+    if omitted). Each run's time for the defaults and the CACHED_EFFORT_DISTANCES most
+    recently used other distances is computed once from its streams and cached in the store,
+    so for those a request only runs the kernel for streams it has not seen before; any
+    other distance is computed over the range's streams and not kept.
+    """
+    if 'access_token' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    try:
+        start_date, end_date = parse_date_range(start_date_str, end_date_str)
+        distances = (tuple(sorted({round(float(value)) for value in request.args['distances'].split(',')}))
+                     if request.args.get('distances') else DEFAULT_EFFORT_DISTANCES)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'Invalid date or distance format'}), 400
+    if not 0 < len(distances) <= MAX_EFFORT_DISTANCES or not all(0 < distance < 10 ** 6 for distance in distances):
+        return jsonify({'error': f'Give 1 to {MAX_EFFORT_DISTANCES} distances in meters'}), 400
+
+    athlete_id = (session.get('athlete') or {}).get('id')
+    store = strava_api.store
+    if store is None or strava_api.stream_path is None or athlete_id is None:
+        return jsonify({'error': 'Fastest times need stored activity streams (ACTIVITY_STREAMS_ENABLED)'}), 404
+
+    start_timestamp, end_timestamp = int(start_date.timestamp()), int(end_date.timestamp())
+    with span('store_read'):
+        # Streams are only ever added, so their count versions the times like data_version
+        streams_version = store.get_streams_coverage(athlete_id)[0]
+        etag = results_etag(athlete_id, start_date_str, end_date_str,
+                            f'{store.get_data_version(athlete_id)}.{streams_version}.{distances}')
+        not_modified = _not_modified(etag, RESULTS_CACHE_CONTROL)
+        if not_modified is not None:
+            return not_modified
+    from stream_store import fastest_efforts, update_stream_efforts
+    with span('stream_efforts'):
+        cached = store.touch_effort_distances(distances, CACHED_EFFORT_DISTANCES)
+        uncached = [distance for distance in distances if distance not in cached]
+        if cached:
+            update_stream_efforts(strava_api.stream_store, store, athlete_id, cached)
+        best = fastest_efforts(strava_api.stream_store, athlete_id,
+                               store.stream_runs(athlete_id, start_timestamp, end_timestamp),
+                               uncached) if uncached else {}
+    with span('store_read'):
+        best.update(store.get_stream_efforts(athlete_id, cached, start_timestamp, end_timestamp) if cached else {})
+        runs_with_streams, runs = store.get_streams_coverage(athlete_id, start_timestamp, end_timestamp)
+
+    efforts = [{'distance': distance, 'best': _effort_json(best.get(distance))} for distance in distances]
+    return _with_validators(jsonify({'efforts': efforts, 'runs_with_streams': runs_with_streams, 'runs': runs}),
+                            etag, RESULTS_CACHE_CONTROL)
+
+def _effort_json(effort):
+    """A stored best effort as the time and local date the Running Stats tab shows"""
+    if effort is None:
+        return None
+    hours, remainder = divmod(round(effort['elapsed_time']), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return {'time': f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes}:{seconds:02d}',
+            'date': (effort['start_date_local'] or '')[:10], 'activity_id': effort['activity_id']}
+
+def athlete_range_index(athlete_id, data_version):
+    """The athlete's RangeIndex at data_version, built once from the store and kept in the analysis cache"""
+    from range_index import RangeIndex
+
+    key = (athlete_id, 'range_index', data_version)
+    index = analysis_cache.get(key)
+    if index is None:
+        with span('store_read'):
+            rows = strava_api.store.get_daily_rollup(athlete_id)
+        with span('range_index'):
+            index = RangeIndex(rows)
+        analysis_cache.put(key, index)
+    return index
+
+def _daily_rollup(athlete_id, start_date, end_date, start_date_str, end_date_str, use_store):
+    """Daily rollup frame for a date range, read straight from the store when there is one"""
+    from charts import rollup_frame
+
+    if use_store:
+        # The results page already synced (or queued a sync of) the store, so only read it
+        with span('store_read'):
+            rows = strava_api.store.get_daily_rollup(athlete_id, start_date_str, end_date_str)
+    else:
+        daily = DailyRollup()
+        for page in strava_api.get_activities(session['access_token'], start_date, end_date, stream=True):
+            daily.add_page(page)
+        rows = daily.rows()
+    return rollup_frame(rows, start_date, end_date)
+
+@lru_cache(maxsize=None)
+def _build_version():
+    """Short hash of the app's modules and templates, so no validator outlives a deploy"""
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for directory in (root, os.path.join(root, 'templates')):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(('.py', '.html')):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(name.encode() + f.read())
+    return digest.hexdigest()[:12]
+
+def results_etag(athlete_id, start_date_str, end_date_str, data_version):
+    """Strong ETag for every response built from an athlete's stored data over a date range"""
+    key = f'{_build_version()}:{athlete_id}:{start_date_str}:{end_date_str}:{data_version}'
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def _not_modified(etag, cache_control):
+    """A 304 response if the request's If-None-Match has etag (in any encoding), otherwise None"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    for tag in request.if_none_match.as_set(include_weak=True):
+        if strip_encoding(tag) == etag:
+            response = app.response_class(status=304)
+            response.set_etag(tag)  # the client's cached copy, compressed or not, is still current
+            response.headers['Cache-Control'] = cache_control
+            return response
+    return None
+
+def _with_validators(response, etag, cache_control):
+    response = app.make_response(response)
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def parse_date_range(start_date_str, end_date_str):
+    """Parse YYYY-MM-DD strings into a full-day UTC range; raises ValueError if invalid"""
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+
+    # Set to full day range: 00:00:00 to 23:59:59 in UTC
+    # This ensures we capture all activities on these calendar days regardless of timezone
+    start_date = start_date.replace(hour=0, minute=0, second=0, tzinfo=timezone.utc)
+    end_date = end_date.replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)
+    return start_date, end_date
+
+def _fetch_warning(status, error):
+    """User-facing message for a fetch that did not complete"""
+    if status == 'failed':
+        return f"Could not fetch activities from Strava ({error}). Please try again shortly."
+    return f"Some activities could not be fetched from Strava ({error}). Results may be incomplete."
 
 @app.route('/callback')
 def callback():
@@ -159,786 +1038,53 @@ def callback():
     if not code:
         return redirect(url_for('index'))
 
-    token_data = strava_api.exchange_code_for_token(code)
+    try:
+        token_data = strava_api.exchange_code_for_token(code)
+    except StravaAPIError as e:
+        return f"Authentication failed: {e}", 400
 
     if 'access_token' in token_data:
         session['access_token'] = token_data['access_token']
         session['athlete'] = token_data['athlete']
+        session['token_expires_at'] = token_data.get('expires_at')
+        athlete_id = token_data['athlete'].get('id')
+        if sync_worker is not None and athlete_id is not None:
+            # Start importing the full history right away; the first page load won't wait for it
+            sync_worker.remember_token(athlete_id, token_data['access_token'], token_data.get('expires_at'))
+            state = strava_api.store.get_sync_state(athlete_id)
+            if state is None or state['covered_from'] > 0:
+                sync_worker.enqueue(athlete_id, IMPORT, since=0)
+            else:
+                sync_worker.enqueue_if_stale(athlete_id)
         return redirect(url_for('index'))
 
     return f"Authentication failed: {token_data}", 400
 
+@app.route('/metrics')
+def metrics():
+    """Span and request latency histograms in the Prometheus text format"""
+    return app.response_class(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/sync-status')
+def sync_progress():
+    """Background sync progress for the logged-in athlete"""
+    athlete_id = (session.get('athlete') or {}).get('id')
+    if 'access_token' not in session or athlete_id is None:
+        return jsonify({'error': 'Not authenticated'}), 401
+    if sync_worker is None:
+        return jsonify({'state': 'disabled'})
+    return jsonify(sync_worker.status(athlete_id))
+
+@app.route('/api/rate-limit')
+def rate_limit_status():
+    """Current Strava API budget shared by all sessions"""
+    return jsonify(strava_api.rate_limiter.snapshot())
+
 @app.route('/logout')
 def logout():
     """Logout and clear session"""
     session.clear()
     return redirect(url_for('index'))
 
-def process_activities(activities, access_token, requested_start_date=None, requested_end_date=None):
-    """Process activities data and generate analytics"""
-    if not activities:
-        return None
-
-    df = pd.DataFrame(activities)
-
-    # Debug: Print available columns
-    print("DEBUG: Available columns:", df.columns.tolist() if not df.empty else "DataFrame is empty")
-    if not df.empty and 'start_date_local' in df.columns:
-        print("DEBUG: Sample start_date_local values:", df['start_date_local'].head().tolist())
-    if not df.empty and 'start_date' in df.columns:
-        print("DEBUG: Sample start_date values:", df['start_date'].head().tolist())
-    if not df.empty and 'moving_time' in df.columns:
-        print("DEBUG: Sample moving_time values:", df['moving_time'].head().tolist())
-
-    # Normalize activity types - combine similar activities
-    df['type'] = df['type'].replace({
-        'Workout': 'WeightTraining',  # Combine Workout with WeightTraining
-        'VirtualRun': 'Run',  # Combine VirtualRun with Run
-        'VirtualRide': 'Ride'  # Combine VirtualRide with Ride
-    })
-
-    # Determine common date range for all streak calculations
-    # Use requested date range if provided, otherwise fall back to activity dates
-    common_date_range_start = None
-    common_date_range_end = None
-    if requested_start_date and requested_end_date:
-        common_date_range_start = pd.to_datetime(requested_start_date).normalize()
-        common_date_range_end = pd.to_datetime(requested_end_date).normalize()
-    elif 'start_date' in df.columns:
-        df['start_date_temp'] = pd.to_datetime(df['start_date'])
-        common_date_range_start = df['start_date_temp'].min().normalize()
-        common_date_range_end = df['start_date_temp'].max().normalize()
-        df.drop('start_date_temp', axis=1, inplace=True)
-
-    # Activity type distribution
-    activity_counts = df['type'].value_counts()
-
-    # Create pie chart for activity types
-    pie_chart = go.Figure(data=[go.Pie(
-        labels=list(activity_counts.index),
-        values=list(activity_counts.values),
-        hole=0.3,
-        texttemplate='%{label}<br>%{value} (%{percent:.1f})',
-        textposition='inside',
-        insidetextorientation='horizontal',
-        hovertemplate='%{label}<br>%{value} activities<br>%{percent:.1f}<extra></extra>'
-    )])
-    pie_chart.update_layout(title="Activity Types Distribution")
-    pie_chart_json = json.dumps(pie_chart, cls=plotly.utils.PlotlyJSONEncoder)
-
-    # Calculate total duration
-    total_duration_seconds = df['moving_time'].sum() if 'moving_time' in df.columns else 0
-    total_duration_hours = int(total_duration_seconds // 3600)
-    total_duration_minutes = int((total_duration_seconds % 3600) // 60)
-    total_duration_formatted = f"{total_duration_hours}h {total_duration_minutes}m"
-
-    # Calculate duration by activity type for pie chart
-    duration_by_type = df.groupby('type')['moving_time'].sum() if 'moving_time' in df.columns else pd.Series()
-
-    # Create duration pie chart with formatted time labels
-    duration_labels = []
-    duration_values = []
-    duration_text = []
-
-    for activity_type, seconds in duration_by_type.items():
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        time_str = f"{hours}h {minutes}m"
-
-        duration_labels.append(activity_type)
-        duration_values.append(seconds / 3600)  # Keep as hours for proper percentage calculation
-        duration_text.append(time_str)
-
-    duration_pie_chart = go.Figure(data=[go.Pie(
-        labels=duration_labels,
-        values=duration_values,
-        hole=0.3,
-        text=duration_text,
-        texttemplate='%{label}<br>%{text} (%{percent:.1f})',
-        textposition='inside',
-        insidetextorientation='horizontal',
-        hovertemplate='%{label}<br>%{text}<br>%{percent:.1f}<extra></extra>'
-    )])
-    duration_pie_chart.update_layout(title="Time Distribution by Activity Type")
-    duration_pie_chart_json = json.dumps(duration_pie_chart, cls=plotly.utils.PlotlyJSONEncoder)
-
-    # Calculate running stats and distance distribution
-    running_activities = df[df['type'] == 'Run']
-
-    running_distance = running_activities['distance'].sum() / 1609.34 if not running_activities.empty else 0
-
-    # Create running distance distribution (group by mile ranges)
-    run_distance_distribution = {}
-    runs_10k_plus = 0
-    total_runs = 0
-    avg_pace_formatted = "0:00"
-    if not running_activities.empty:
-        running_distances_miles = running_activities['distance'] / 1609.34
-        total_runs = len(running_activities)
-
-        # Calculate average pace (minutes per mile)
-        # moving_time is in seconds, distance is in meters
-        avg_pace_formatted = "0:00"
-        if 'moving_time' in running_activities.columns and running_distance > 0:
-            total_time_seconds = running_activities['moving_time'].sum()
-            avg_pace_seconds_per_mile = total_time_seconds / running_distance
-            pace_minutes = int(avg_pace_seconds_per_mile // 60)
-            pace_seconds = int(avg_pace_seconds_per_mile % 60)
-            avg_pace_formatted = f"{pace_minutes}:{pace_seconds:02d}"
-
-        # Define distance bins (in miles)
-        bins = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, float('inf')]
-        labels = ['0-1', '1-2', '2-3', '3-4', '4-5', '5-6', '6-7', '7-8', '8-9', '9-10', '10+']
-
-        # Categorize runs into bins
-        distance_categories = pd.cut(running_distances_miles, bins=bins, labels=labels, right=False)
-        run_distance_distribution = distance_categories.value_counts().sort_index().to_dict()
-
-        # Count runs 10K or longer (10K = 6.2 miles)
-        runs_10k_plus = len(running_distances_miles[running_distances_miles >= 6.2])
-
-        # Calculate personal records
-        # Best mile split (fastest pace for any run)
-        best_mile_split_formatted = None
-        if 'moving_time' in running_activities.columns:
-            running_activities_copy = running_activities.copy()
-            running_activities_copy['pace_sec_per_mi'] = running_activities_copy['moving_time'] / (running_activities_copy['distance'] / 1609.34)
-            # Filter out invalid paces (too slow or NaN)
-            valid_paces = running_activities_copy['pace_sec_per_mi'].dropna()
-            valid_paces = valid_paces[valid_paces > 0]
-            if len(valid_paces) > 0:
-                best_mile_split_seconds = valid_paces.min()
-                pace_minutes = int(best_mile_split_seconds // 60)
-                pace_seconds = int(best_mile_split_seconds % 60)
-                best_mile_split_formatted = f"{pace_minutes}:{pace_seconds:02d}"
-
-        # Fastest 10K
-        fastest_10k_formatted = None
-        runs_10k = running_activities[(running_activities['distance'] / 1609.34) >= 6.2]
-        if not runs_10k.empty and 'moving_time' in runs_10k.columns:
-            fastest_10k_seconds = runs_10k['moving_time'].min()
-
-            # Format fastest 10K
-            hours = int(fastest_10k_seconds // 3600)
-            minutes = int((fastest_10k_seconds % 3600) // 60)
-            seconds = int(fastest_10k_seconds % 60)
-            if hours > 0:
-                fastest_10k_formatted = f"{hours}:{minutes:02d}:{seconds:02d}"
-            else:
-                fastest_10k_formatted = f"{minutes}:{seconds:02d}"
-
-        # Longest run (by distance)
-        longest_run_distance = None
-        if not running_activities.empty:
-            longest_run_distance_miles = (running_activities['distance'].max()) / 1609.34
-            longest_run_distance = f"{longest_run_distance_miles:.2f} mi"
-
-        # Most elevation in a single run
-        most_elevation_run = None
-        if not running_activities.empty and 'total_elevation_gain' in running_activities.columns:
-            max_elevation_idx = running_activities['total_elevation_gain'].idxmax()
-            max_elevation_meters = running_activities.loc[max_elevation_idx, 'total_elevation_gain']
-            max_elevation_feet = max_elevation_meters * 3.28084
-            run_distance_miles = running_activities.loc[max_elevation_idx, 'distance'] / 1609.34
-            most_elevation_run = f"{max_elevation_feet:.0f} ft ({run_distance_miles:.2f} mi)"
-
-    # Calculate total elevation gain
-    total_elevation = df['total_elevation_gain'].sum() if 'total_elevation_gain' in df.columns else 0
-    total_elevation_feet = total_elevation * 3.28084  # Convert meters to feet
-
-    # ==============================
-    # Mileage trend (daily/weekly/monthly)
-    # ==============================
-    mileage_trend_daily_json = None
-    mileage_trend_weekly_json = None
-    mileage_trend_monthly_json = None
-
-    # ==============================
-    # Pace trend (daily/weekly/monthly)
-    # ==============================
-    pace_trend_daily_json = None
-    pace_trend_weekly_json = None
-    pace_trend_monthly_json = None
-
-    try:
-        if not running_activities.empty:
-            # Ensure start_date is datetime
-            if 'start_date' in running_activities.columns:
-                ra = running_activities.copy()
-                ra['start_date'] = pd.to_datetime(ra['start_date'])
-                # Distance in miles
-                ra['distance_mi'] = ra.get('distance', 0) / 1609.34
-                ra = ra.set_index('start_date').sort_index()
-
-                # Daily aggregate (non-cumulative) as line graph
-                # Build an explicit daily date index and reindex to avoid any implicit behavior
-                # Use common date range if available, otherwise fall back to running activities range
-                if common_date_range_start and common_date_range_end:
-                    daily_index = pd.date_range(common_date_range_start, common_date_range_end, freq='D')
-                else:
-                    daily_index = pd.date_range(ra.index.min().normalize(), ra.index.max().normalize(), freq='D')
-                daily = (ra['distance_mi']
-                         .groupby(pd.Grouper(freq='D'))
-                         .sum()
-                         .reindex(daily_index, fill_value=0))
-                # Use ISO strings for dates to avoid any serialization quirks
-                x_daily = [d.strftime('%Y-%m-%d') for d in daily.index]
-                y_daily = [float(v) for v in daily.values]
-
-                # ==============================
-                # Running streaks and gap days
-                # ==============================
-                # Boolean series for run/no-run per day
-                run_days = daily > 0
-
-                # Current streak: consecutive run days ending on the last day in range
-                current_streak_days = 0
-                for ran in reversed(run_days.tolist()):
-                    if ran:
-                        current_streak_days += 1
-                    else:
-                        break
-
-                # Days since last run and last run date
-                last_run_date = None
-                days_since_last_run = None
-                if run_days.any():
-                    last_true_idx = None
-                    # find last index where run_days is True
-                    for i in range(len(run_days) - 1, -1, -1):
-                        if run_days.iloc[i]:
-                            last_true_idx = i
-                            break
-                    if last_true_idx is not None:
-                        last_run_date = daily.index[last_true_idx]
-                        days_since_last_run = (daily.index[-1] - last_run_date).days
-
-                # Collect gap day spans (consecutive zero-mile stretches)
-                gap_spans = []
-                in_gap = False
-                gap_start = None
-                for i, (date, ran) in enumerate(zip(daily.index, run_days.tolist())):
-                    if not ran and not in_gap:
-                        in_gap = True
-                        gap_start = date
-                    elif ran and in_gap:
-                        # gap ended at previous day
-                        gap_end = daily.index[i - 1]
-                        length = (gap_end - gap_start).days + 1
-                        gap_spans.append({
-                            'start': gap_start.strftime('%Y-%m-%d'),
-                            'end': gap_end.strftime('%Y-%m-%d'),
-                            'length': int(length)
-                        })
-                        in_gap = False
-                        gap_start = None
-                # If range ends in a gap, close it
-                if in_gap and gap_start is not None:
-                    gap_end = daily.index[-1]
-                    length = (gap_end - gap_start).days + 1
-                    gap_spans.append({
-                        'start': gap_start.strftime('%Y-%m-%d'),
-                        'end': gap_end.strftime('%Y-%m-%d'),
-                        'length': int(length)
-                    })
-
-                total_gap_days = int(sum(span['length'] for span in gap_spans))
-                longest_gap_days = int(max((span['length'] for span in gap_spans), default=0))
-
-                # Longest run streak (consecutive run days anywhere in the range)
-                longest_run_streak = 0
-                current_seq = 0
-                for ran in run_days.tolist():
-                    if ran:
-                        current_seq += 1
-                        if current_seq > longest_run_streak:
-                            longest_run_streak = current_seq
-                    else:
-                        current_seq = 0
-
-                # Build arrays for frontend timeline/heat visualization
-                streak_daily_dates = x_daily
-                streak_daily_miles = y_daily
-                streak_daily_run_flags = [1 if m > 0 else 0 for m in y_daily]
-
-                # Calculate total running days and missed days in window
-                running_total_days_in_window = len(daily_index)
-                running_active_days = int(run_days.sum())
-                running_missed_days = running_total_days_in_window - running_active_days
-
-                # Milestones and next target based on current streak
-                milestones = [7, 14, 30, 60, 100]
-                next_milestone = None
-                days_to_next_milestone = None
-                estimated_next_milestone_date = None
-                if milestones:
-                    for m in milestones:
-                        if current_streak_days < m:
-                            next_milestone = int(m)
-                            days_to_next_milestone = int(m - current_streak_days)
-                            try:
-                                estimated_next_milestone_date = (daily.index[-1] + timedelta(days=days_to_next_milestone)).strftime('%Y-%m-%d')
-                            except Exception:
-                                estimated_next_milestone_date = None
-                            break
-                daily_fig = go.Figure([
-                    go.Scatter(
-                        x=x_daily,
-                        y=y_daily,
-                        mode='lines+markers',
-                        line=dict(color="#4e79a7", shape='spline', smoothing=0.3),
-                        marker=dict(size=6),
-                        hovertemplate='%{x|%Y-%m-%d}<br>%{y:.2f} mi<extra></extra>'
-                    )
-                ])
-                # Calculate appropriate tick interval for mileage chart
-                num_days_mileage = len(daily_index)
-                if num_days_mileage <= 30:
-                    mileage_dtick = 86400000  # Show every day for <= 30 days
-                elif num_days_mileage <= 90:
-                    mileage_dtick = 86400000 * 7  # Show every week for <= 90 days
-                else:
-                    mileage_dtick = 86400000 * 14  # Show every 2 weeks for > 90 days
-
-                daily_fig.update_layout(
-                    title="Daily Running Mileage",
-                    xaxis_title="Day",
-                    yaxis_title="Miles",
-                    yaxis=dict(rangemode='tozero'),
-                    xaxis=dict(
-                        type='date',
-                        tickformat='%b %d',
-                        tickangle=-45,
-                        dtick=mileage_dtick
-                    )
-                )
-                mileage_trend_daily_json = json.dumps(daily_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-                # Weekly aggregate (Mon-Sun by default with 'W-MON') as line graph
-                weekly = (ra['distance_mi']
-                          .groupby(pd.Grouper(freq='W-MON'))
-                          .sum())
-                # Filter out zero values and create labels
-                weekly = weekly[weekly > 0] if len(weekly) > 0 else weekly
-                # Create week labels with start date (e.g., "Nov 4")
-                x_weekly = [d.strftime('%b %d') for d in weekly.index]
-                y_weekly = [float(v) for v in weekly.values]
-                # Create hover data with week number and full date range
-                week_numbers = [d.isocalendar()[1] for d in weekly.index]  # ISO week number
-                week_end_dates = [(d + timedelta(days=6)).strftime('%b %d, %Y') for d in weekly.index]
-                hover_text = [f"Week {wk} of {d.year}<br>{d.strftime('%b %d')} - {end}<br>{miles:.2f} mi"
-                             for wk, d, end, miles in zip(week_numbers, weekly.index, week_end_dates, y_weekly)]
-                weekly_fig = go.Figure([
-                    go.Scatter(
-                        x=x_weekly,
-                        y=y_weekly,
-                        mode='lines+markers',
-                        line=dict(color="#59a14f", shape='spline', smoothing=0.3),
-                        marker=dict(size=8),
-                        text=hover_text,
-                        hovertemplate='%{text}<extra></extra>'
-                    )
-                ])
-                weekly_fig.update_layout(
-                    title="Weekly Running Mileage",
-                    xaxis_title="Week Start Date",
-                    yaxis_title="Miles",
-                    yaxis=dict(rangemode='tozero'),
-                    xaxis=dict(type='category')
-                )
-                mileage_trend_weekly_json = json.dumps(weekly_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-                # Monthly aggregate as line graph
-                monthly = (ra['distance_mi']
-                           .groupby(pd.Grouper(freq='MS'))
-                           .sum())
-                # Filter out zero values
-                monthly = monthly[monthly > 0] if len(monthly) > 0 else monthly
-                # Create month labels like "Jan 2024", "Feb 2024", etc.
-                x_monthly = [d.strftime('%b %Y') for d in monthly.index]
-                y_monthly = [float(v) for v in monthly.values]
-                monthly_fig = go.Figure([
-                    go.Scatter(
-                        x=x_monthly,
-                        y=y_monthly,
-                        mode='lines+markers',
-                        line=dict(color="#f28e2c", shape='spline', smoothing=0.3),
-                        marker=dict(size=8),
-                        hovertemplate='%{x}<br>%{y:.2f} mi<extra></extra>'
-                    )
-                ])
-                monthly_fig.update_layout(
-                    title="Monthly Running Mileage",
-                    xaxis_title="Month",
-                    yaxis_title="Miles",
-                    yaxis=dict(rangemode='tozero'),
-                    xaxis=dict(type='category')
-                )
-                mileage_trend_monthly_json = json.dumps(monthly_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-                # ==============================
-                # Pace trend calculations
-                # ==============================
-                # Calculate pace for each run (seconds per mile)
-                # Avoid division by zero by replacing zero distances with NaN
-                ra['pace_sec_per_mi'] = ra['moving_time'] / (ra['distance_mi'].replace(0, float('nan')))
-                ra['pace_sec_per_mi'] = ra['pace_sec_per_mi'].fillna(0)
-
-                # Convert pace to MM:SS format for display
-                def pace_to_mmss(pace_seconds):
-                    mins = int(pace_seconds // 60)
-                    secs = int(pace_seconds % 60)
-                    return f"{mins}:{secs:02d}"
-
-                # Daily average pace - create complete dataset with all days
-                # Group by date and calculate mean pace, normalizing the index
-                daily_pace_with_runs = ra['pace_sec_per_mi'].groupby(ra.index.normalize()).mean()
-
-                # Now create complete lists for ALL days in the range
-                x_daily_pace = []
-                y_daily_pace = []
-                hover_text_daily_pace = []
-
-                for date in daily_index:
-                    x_daily_pace.append(date)
-
-                    if date in daily_pace_with_runs.index:
-                        pace = daily_pace_with_runs[date]
-                        y_daily_pace.append(float(pace))
-                        hover_text_daily_pace.append(f"{date.strftime('%b %d')}<br>Pace: {pace_to_mmss(pace)}")
-                    else:
-                        y_daily_pace.append(0.0)  # Explicitly 0.0 for non-running days
-                        hover_text_daily_pace.append(f"{date.strftime('%b %d')}<br>No run")
-
-                daily_pace_fig = go.Figure([
-                    go.Scatter(
-                        x=x_daily_pace,
-                        y=y_daily_pace,
-                        mode='lines+markers',
-                        line=dict(color="#e15759", width=2, shape='spline', smoothing=0.3),
-                        marker=dict(size=5, symbol='circle'),
-                        text=hover_text_daily_pace,
-                        hovertemplate='%{text}<extra></extra>'
-                    )
-                ])
-
-                # Calculate appropriate tick interval based on date range
-                num_days = len(daily_index)
-                if num_days <= 30:
-                    dtick = 86400000  # Show every day for <= 30 days
-                elif num_days <= 90:
-                    dtick = 86400000 * 7  # Show every week for <= 90 days
-                else:
-                    dtick = 86400000 * 14  # Show every 2 weeks for > 90 days
-
-                daily_pace_fig.update_layout(
-                    title="Daily Average Pace",
-                    xaxis_title="Day",
-                    yaxis_title="Pace (min/mile)",
-                    yaxis=dict(
-                        rangemode='tozero',
-                        tickmode='array',
-                        tickvals=[0] + [i * 60 for i in range(6, 15)],
-                        ticktext=['0:00'] + [f"{i}:00" for i in range(6, 15)]
-                    ),
-                    xaxis=dict(
-                        type='date',
-                        tickformat='%b %d',
-                        tickangle=-45,
-                        dtick=dtick,
-                        range=[daily_index[0], daily_index[-1]]  # Ensure full range is shown
-                    ),
-                    hovermode='x unified'
-                )
-                pace_trend_daily_json = json.dumps(daily_pace_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-                # Weekly average pace
-                weekly_pace = (ra['pace_sec_per_mi']
-                              .groupby(pd.Grouper(freq='W-MON'))
-                              .mean())
-                weekly_pace = weekly_pace[weekly_pace > 0] if len(weekly_pace) > 0 else weekly_pace
-
-                x_weekly_pace = [d.strftime('%b %d') for d in weekly_pace.index]
-                y_weekly_pace = [float(v) for v in weekly_pace.values]
-                week_numbers_pace = [d.isocalendar()[1] for d in weekly_pace.index]
-                week_end_dates_pace = [(d + timedelta(days=6)).strftime('%b %d, %Y') for d in weekly_pace.index]
-                hover_text_pace = [f"Week {wk} of {d.year}<br>{d.strftime('%b %d')} - {end}<br>Pace: {pace_to_mmss(pace)}"
-                                  for wk, d, end, pace in zip(week_numbers_pace, weekly_pace.index, week_end_dates_pace, y_weekly_pace)]
-
-                weekly_pace_fig = go.Figure([
-                    go.Scatter(
-                        x=x_weekly_pace,
-                        y=y_weekly_pace,
-                        mode='lines+markers',
-                        line=dict(color="#e15759", shape='spline', smoothing=0.3),
-                        marker=dict(size=8),
-                        text=hover_text_pace,
-                        hovertemplate='%{text}<extra></extra>'
-                    )
-                ])
-                weekly_pace_fig.update_layout(
-                    title="Weekly Average Pace",
-                    xaxis_title="Week Start Date",
-                    yaxis_title="Pace (min/mile)",
-                    yaxis=dict(
-                        autorange='reversed',  # Lower pace (faster) at top
-                        tickmode='array',
-                        tickvals=[i * 60 for i in range(6, 15)],  # 6:00 to 14:00 min/mile
-                        ticktext=[f"{i}:00" for i in range(6, 15)]
-                    ),
-                    xaxis=dict(type='category')
-                )
-                pace_trend_weekly_json = json.dumps(weekly_pace_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-                # Monthly average pace
-                monthly_pace = (ra['pace_sec_per_mi']
-                               .groupby(pd.Grouper(freq='MS'))
-                               .mean())
-                monthly_pace = monthly_pace[monthly_pace > 0] if len(monthly_pace) > 0 else monthly_pace
-
-                x_monthly_pace = [d.strftime('%b %Y') for d in monthly_pace.index]
-                y_monthly_pace = [float(v) for v in monthly_pace.values]
-                hover_text_monthly_pace = [f"{month}<br>Pace: {pace_to_mmss(pace)}"
-                                          for month, pace in zip(x_monthly_pace, y_monthly_pace)]
-
-                monthly_pace_fig = go.Figure([
-                    go.Scatter(
-                        x=x_monthly_pace,
-                        y=y_monthly_pace,
-                        mode='lines+markers',
-                        line=dict(color="#e15759", shape='spline', smoothing=0.3),
-                        marker=dict(size=8),
-                        text=hover_text_monthly_pace,
-                        hovertemplate='%{text}<extra></extra>'
-                    )
-                ])
-                monthly_pace_fig.update_layout(
-                    title="Monthly Average Pace",
-                    xaxis_title="Month",
-                    yaxis_title="Pace (min/mile)",
-                    yaxis=dict(
-                        autorange='reversed',  # Lower pace (faster) at top
-                        tickmode='array',
-                        tickvals=[i * 60 for i in range(6, 15)],
-                        ticktext=[f"{i}:00" for i in range(6, 15)]
-                    ),
-                    xaxis=dict(type='category')
-                )
-                pace_trend_monthly_json = json.dumps(monthly_pace_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-    except Exception as e:
-        # Silently handle errors in trend generation
-        pass
-
-    # ==============================
-    # Workout Streak (all activities)
-    # ==============================
-    workout_current_streak_days = 0
-    workout_longest_streak = 0
-    workout_days_since_last = None
-    workout_last_activity_date = None
-    workout_total_gap_days = 0
-    workout_longest_gap_days = 0
-    workout_gap_spans = []
-    workout_daily_dates = []
-    workout_daily_activity_counts = []
-    workout_daily_flags = []
-    workout_active_days = 0
-    workout_missed_days = 0
-    workout_total_days_in_window = 0
-
-    try:
-        # Determine the date range to use
-        if common_date_range_start and common_date_range_end:
-            workout_daily_index = pd.date_range(common_date_range_start, common_date_range_end, freq='D')
-            workout_total_days_in_window = len(workout_daily_index)
-
-        # Use start_date_local if available, otherwise start_date
-        date_column = 'start_date_local' if 'start_date_local' in df.columns else 'start_date'
-        print(f"DEBUG: Using date column: {date_column}")
-
-        if not df.empty and date_column in df.columns:
-            # Work with all activities
-            all_activities = df.copy()
-            all_activities['start_date'] = pd.to_datetime(all_activities[date_column])
-            all_activities = all_activities.set_index('start_date').sort_index()
-            print(f"DEBUG: all_activities shape: {all_activities.shape}")
-            print(f"DEBUG: all_activities index range: {all_activities.index.min()} to {all_activities.index.max()}")
-            print(f"DEBUG: 'moving_time' in columns: {'moving_time' in all_activities.columns}")
-
-            # If we didn't set the date range above, use activities' date range
-            if not common_date_range_start or not common_date_range_end:
-                workout_daily_index = pd.date_range(
-                    all_activities.index.min().normalize(),
-                    all_activities.index.max().normalize(),
-                    freq='D'
-                )
-                workout_total_days_in_window = len(workout_daily_index)
-
-            # Calculate total hours per day (moving_time is in seconds)
-            if 'moving_time' in all_activities.columns:
-                daily_workout_hours = all_activities.groupby(all_activities.index.normalize())['moving_time'].sum() / 3600
-                print(f"DEBUG: daily_workout_hours before reindex: {daily_workout_hours}")
-
-                # Convert workout_daily_index to timezone-aware to match daily_workout_hours
-                if daily_workout_hours.index.tz is not None and workout_daily_index.tz is None:
-                    workout_daily_index = workout_daily_index.tz_localize('UTC')
-
-                daily_workout_hours = daily_workout_hours.reindex(workout_daily_index, fill_value=0)
-                print(f"DEBUG: daily_workout_hours after reindex: {daily_workout_hours}")
-            else:
-                # If moving_time column doesn't exist, create empty series
-                daily_workout_hours = pd.Series(0, index=workout_daily_index)
-                print("DEBUG: moving_time column not found, created empty series")
-
-            # Boolean series for workout/no-workout per day
-            workout_days = daily_workout_hours > 0
-            print(f"DEBUG: workout_days sum: {workout_days.sum()}")
-
-            # Current streak: consecutive workout days ending on the last day
-            for had_workout in reversed(workout_days.tolist()):
-                if had_workout:
-                    workout_current_streak_days += 1
-                else:
-                    break
-
-            # Last activity date and days since
-            if workout_days.any():
-                last_workout_idx = None
-                for i in range(len(workout_days) - 1, -1, -1):
-                    if workout_days.iloc[i]:
-                        last_workout_idx = i
-                        break
-                if last_workout_idx is not None:
-                    workout_last_activity_date = workout_daily_index[last_workout_idx]
-                    workout_days_since_last = (workout_daily_index[-1] - workout_last_activity_date).days
-
-            # Collect gap spans (consecutive no-workout days)
-            in_gap = False
-            gap_start = None
-            for i, (date, had_workout) in enumerate(zip(workout_daily_index, workout_days.tolist())):
-                if not had_workout and not in_gap:
-                    in_gap = True
-                    gap_start = date
-                elif had_workout and in_gap:
-                    gap_end = workout_daily_index[i - 1]
-                    length = (gap_end - gap_start).days + 1
-                    workout_gap_spans.append({
-                        'start': gap_start.strftime('%Y-%m-%d'),
-                        'end': gap_end.strftime('%Y-%m-%d'),
-                        'length': int(length)
-                    })
-                    in_gap = False
-                    gap_start = None
-
-            # Close gap if range ends in one
-            if in_gap and gap_start is not None:
-                gap_end = workout_daily_index[-1]
-                length = (gap_end - gap_start).days + 1
-                workout_gap_spans.append({
-                    'start': gap_start.strftime('%Y-%m-%d'),
-                    'end': gap_end.strftime('%Y-%m-%d'),
-                    'length': int(length)
-                })
-
-            workout_total_gap_days = int(sum(span['length'] for span in workout_gap_spans))
-            workout_longest_gap_days = int(max((span['length'] for span in workout_gap_spans), default=0))
-
-            # Longest workout streak (consecutive workout days anywhere in range)
-            current_seq = 0
-            for had_workout in workout_days.tolist():
-                if had_workout:
-                    current_seq += 1
-                    if current_seq > workout_longest_streak:
-                        workout_longest_streak = current_seq
-                else:
-                    current_seq = 0
-
-            # Build arrays for frontend visualization
-            workout_daily_dates = [d.strftime('%Y-%m-%d') for d in workout_daily_index]
-            workout_daily_hours = [float(h) for h in daily_workout_hours.values]
-            workout_daily_flags = [1 if h > 0 else 0 for h in daily_workout_hours.values]
-
-            # Calculate total workout days and missed days in window
-            workout_total_days_in_window = len(workout_daily_index)
-            workout_active_days = int(workout_days.sum())
-            workout_missed_days = workout_total_days_in_window - workout_active_days
-
-            # Milestones for workout streaks
-            workout_milestones = [7, 14, 30, 60, 100]
-            workout_next_milestone = None
-            workout_days_to_next_milestone = None
-            workout_eta_next_milestone = None
-            for m in workout_milestones:
-                if workout_current_streak_days < m:
-                    workout_next_milestone = int(m)
-                    workout_days_to_next_milestone = int(m - workout_current_streak_days)
-                    try:
-                        workout_eta_next_milestone = (workout_daily_index[-1] + timedelta(days=workout_days_to_next_milestone)).strftime('%Y-%m-%d')
-                    except Exception:
-                        workout_eta_next_milestone = None
-                    break
-    except Exception:
-        pass
-
-    return {
-        'pie_chart': pie_chart_json,
-        'duration_pie_chart': duration_pie_chart_json,
-        'total_activities': len(activities),
-        'running_miles': round(running_distance, 2),
-        'total_elevation_feet': round(total_elevation_feet, 2),
-        'total_duration_formatted': total_duration_formatted,
-        'activity_breakdown': activity_counts.to_dict(),
-        'run_distance_distribution': run_distance_distribution,
-        'runs_10k_plus': runs_10k_plus,
-        'total_runs': total_runs,
-        'avg_pace_formatted': avg_pace_formatted,
-        'best_mile_split': best_mile_split_formatted if 'best_mile_split_formatted' in locals() else None,
-        'fastest_10k': fastest_10k_formatted if 'fastest_10k_formatted' in locals() else None,
-        'longest_run': longest_run_distance if 'longest_run_distance' in locals() else None,
-        'most_elevation_run': most_elevation_run if 'most_elevation_run' in locals() else None,
-        'mileage_trend_daily': mileage_trend_daily_json,
-        'mileage_trend_weekly': mileage_trend_weekly_json,
-        'mileage_trend_monthly': mileage_trend_monthly_json,
-        'pace_trend_daily': pace_trend_daily_json,
-        'pace_trend_weekly': pace_trend_weekly_json,
-        'pace_trend_monthly': pace_trend_monthly_json,
-        # Running streaks + gap analysis (may be None if no running data)
-        'current_streak_days': int(current_streak_days) if 'current_streak_days' in locals() else 0,
-        'last_run_date': last_run_date.strftime('%Y-%m-%d') if 'last_run_date' in locals() and last_run_date is not None else None,
-        'days_since_last_run': int(days_since_last_run) if 'days_since_last_run' in locals() and days_since_last_run is not None else None,
-        'total_gap_days': int(total_gap_days) if 'total_gap_days' in locals() else 0,
-        'longest_gap_days': int(longest_gap_days) if 'longest_gap_days' in locals() else 0,
-        'gap_spans': gap_spans if 'gap_spans' in locals() else [],
-        # Enhanced streak visualization data
-        'longest_run_streak': int(longest_run_streak) if 'longest_run_streak' in locals() else 0,
-        'streak_daily_dates': streak_daily_dates if 'streak_daily_dates' in locals() else [],
-        'streak_daily_miles': streak_daily_miles if 'streak_daily_miles' in locals() else [],
-        'streak_daily_run_flags': streak_daily_run_flags if 'streak_daily_run_flags' in locals() else [],
-        'next_streak_milestone': next_milestone if 'next_milestone' in locals() else None,
-        'days_to_next_milestone': days_to_next_milestone if 'days_to_next_milestone' in locals() else None,
-        'eta_next_milestone_date': estimated_next_milestone_date if 'estimated_next_milestone_date' in locals() else None,
-        'running_active_days': running_active_days if 'running_active_days' in locals() else 0,
-        'running_missed_days': running_missed_days if 'running_missed_days' in locals() else 0,
-        'running_total_days_in_window': running_total_days_in_window if 'running_total_days_in_window' in locals() else 0,
-        # Workout streaks (all activities)
-        'workout_current_streak_days': workout_current_streak_days,
-        'workout_longest_streak': workout_longest_streak,
-        'workout_last_activity_date': workout_last_activity_date.strftime('%Y-%m-%d') if workout_last_activity_date is not None else None,
-        'workout_days_since_last': workout_days_since_last,
-        'workout_total_gap_days': workout_total_gap_days,
-        'workout_longest_gap_days': workout_longest_gap_days,
-        'workout_gap_spans': workout_gap_spans,
-        'workout_daily_dates': workout_daily_dates,
-        'workout_daily_hours': workout_daily_hours if 'workout_daily_hours' in locals() else [],
-        'workout_daily_flags': workout_daily_flags,
-        'workout_next_milestone': workout_next_milestone if 'workout_next_milestone' in locals() else None,
-        'workout_days_to_next_milestone': workout_days_to_next_milestone if 'workout_days_to_next_milestone' in locals() else None,
-        'workout_eta_next_milestone': workout_eta_next_milestone if 'workout_eta_next_milestone' in locals() else None,
-        'workout_active_days': workout_active_days,
-        'workout_missed_days': workout_missed_days,
-        'workout_total_days_in_window': workout_total_days_in_window
-    }
-
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=STRAVA_PORT)
@@ -0,0 +1,181 @@
+"""Benchmark process_activities and its stages on synthetic activities
+
+Run from the repository root:
+
+    python -m benchmarks.bench_analytics --output results.json
+    python -m benchmarks.bench_analytics --compare results.json
+
+Every (activity count, window) combination is timed end-to-end and per section, and
+the results can be written as JSON and compared against a previous run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from analytics import process_activities
+from benchmarks.synthetic import generate_activities
+from charts import CHARTS, build_chart, daily_totals, prepare_activity_frame, rollup_frame, window_days
+from metrics import request_spans, start_request
+from rollup import rollup_rows
+from streaks import compute_streaks
+
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000]
+DEFAULT_WINDOWS = [7, 90, 365, 3650]  # days
+PIE_CHARTS = ['activity_types', 'duration_by_type']
+TREND_CHARTS = [name for name in CHARTS if name not in PIE_CHARTS]
+# Sections timed by process_activities' own spans rather than called separately
+INLINE_SPANS = ('summary', 'distance_bins', 'personal_records')
+# Slowdown (relative to the baseline) reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+# Result fields that are measured rather than part of a row's identity
+MEASUREMENTS = {'seconds', 'mean_seconds', 'requests', 'status'}
+
+
+def _timed(fn, repeat):
+    """Best and mean wall time of fn over repeat runs, with its stdout discarded"""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Warm-up run so one-off import and template setup costs aren't measured
+        fn()
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+
+def bench_case(count, window_days_count, repeat, end=datetime(2025, 1, 1, tzinfo=timezone.utc)):
+    """Timings (seconds) per section for one activity count and window length"""
+    start = end - timedelta(days=window_days_count)
+    window_end = end - timedelta(seconds=1)
+    activities = generate_activities(count, start, end, seed=count)
+    rollup = rollup_frame(rollup_rows(activities), start, window_end)
+    days = window_days(pd.Timestamp(start.date()), pd.Timestamp(window_end.date()))
+
+    def streaks():
+        runs = daily_totals(rollup, 'distance', days, 'Run') > 0
+        workouts = daily_totals(rollup, 'moving_time', days) > 0
+        compute_streaks(runs.to_numpy(), days[0])
+        compute_streaks(workouts.to_numpy(), days[0])
+
+    def total():
+        # Collect process_activities' own spans so its inline sections can be reported
+        start_request()
+        process_activities(activities, None, start, window_end)
+
+    sections = {
+        'total': total,
+        'ingest': lambda: prepare_activity_frame(activities),
+        'rollup': lambda: rollup_frame(rollup_rows(activities), start, window_end),
+        'streaks': streaks,
+        'pies': lambda: [build_chart(name, rollup, start, window_end) for name in PIE_CHARTS],
+        'trends': lambda: [build_chart(name, rollup, start, window_end) for name in TREND_CHARTS],
+    }
+    results = {}
+    for name, fn in sections.items():
+        results[name] = _timed(fn, repeat)
+        if name == 'total':
+            # Spans of the last run (summary, distance bins, personal records, ...)
+            for span_name, seconds in request_spans():
+                if span_name in INLINE_SPANS:
+                    results[span_name] = (seconds, None)
+    return results
+
+
+def run(sizes, windows, repeat):
+    results = []
+    for count in sizes:
+        for window in windows:
+            for section, (best, mean) in bench_case(count, window, repeat).items():
+                results.append({'activities': count, 'window_days': window, 'section': section,
+                                'seconds': best, 'mean_seconds': mean})
+            total = next(r for r in results[::-1] if r['section'] == 'total')
+            print(f'{count:>7} activities {window:>5} days  total {total["seconds"] * 1000:9.1f} ms',
+                  file=sys.stderr)
+    return {'meta': run_metadata(repeat), 'results': results}
+
+
+def run_metadata(repeat):
+    """Environment details stored with every result file"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+    }
+
+
+def compare(current, baseline):
+    """Print per-row ratios against a baseline run; returns the number of regressions
+
+    Rows are matched on every field except the measurements, so any benchmark whose
+    results carry a 'seconds' column can be compared.
+    """
+    def key(row):
+        return tuple((name, value) for name, value in row.items() if name not in MEASUREMENTS)
+
+    previous = {key(row): row['seconds'] for row in baseline['results']}
+    regressions = 0
+    print(f'baseline {baseline["meta"].get("commit")} -> current {current["meta"].get("commit")}')
+    for row in current['results']:
+        before = previous.get(key(row))
+        if not before:
+            continue
+        ratio = row['seconds'] / before
+        flag = ''
+        if ratio > 1 + REGRESSION_THRESHOLD:
+            flag = '  REGRESSION'
+            regressions += 1
+        label = ' '.join(str(value) for _, value in key(row))
+        print(f'{label:<32} {before * 1000:9.2f} -> {row["seconds"] * 1000:9.2f} ms  x{ratio:.2f}{flag}')
+    return regressions
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=_int_list, default=DEFAULT_SIZES,
+                        help='comma separated activity counts (default: %(default)s)')
+    parser.add_argument('--windows', type=_int_list, default=DEFAULT_WINDOWS,
+                        help='comma separated window lengths in days (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is kept')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.windows, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(current, baseline) else 0
+    if not args.output:
+        json.dump(current, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Benchmark StravaAPI.get_activities against the local mock Strava server
+
+Run from the repository root:
+
+    python -m benchmarks.bench_fetch --output fetch.json
+    python -m benchmarks.bench_fetch --compare fetch.json
+
+Measures paging throughput at different fetch concurrencies and per-request latencies,
+and how retries cope with injected server errors, without touching the real API.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+# Keep the benchmark from touching the real data files when app is imported
+os.environ.setdefault('ACTIVITY_STORE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+os.environ.setdefault('ACTIVITY_SNAPSHOT_PATH', os.path.join(tempfile.mkdtemp(), 'snapshots'))
+os.environ.setdefault('SYNC_QUEUE_PATH', os.path.join(tempfile.mkdtemp(), 'sync_queue.db'))
+
+from app import StravaAPI
+from benchmarks.bench_analytics import compare, run_metadata
+from benchmarks.mock_strava import MockStrava
+from benchmarks.synthetic import generate_activities
+
+DEFAULT_SIZES = [1_000, 10_000]
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+DEFAULT_LATENCIES = [0.0, 0.05]  # seconds per request
+DEFAULT_ERROR_RATES = [0.0, 0.1]
+END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+START = END - timedelta(days=5 * 365)
+
+
+def bench_case(activities, concurrency, latency, error_rate, repeat):
+    """Best and mean seconds to page through every activity, plus what it took"""
+    timings = []
+    with MockStrava(activities, latency=latency, error_rate=error_rate, seed=concurrency,
+                    rate_limit=(10 ** 9, 10 ** 9)) as strava:
+        # Retries back off for real, but briefly, so error runs measure retry overhead
+        api = StravaAPI(fetch_concurrency=concurrency, pool_size=max(concurrency, 1),
+                        max_retries=5, backoff_base=0.01, backoff_max=0.1, base_url=strava.api_url)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = api.get_activities('bench', START, END)
+            timings.append(time.perf_counter() - started)
+        requests = sum(strava.requests.values()) // repeat
+    return {'seconds': min(timings), 'mean_seconds': sum(timings) / len(timings),
+            'requests': requests, 'status': f'{result.status} ({len(result)})'}
+
+
+def run(sizes, concurrencies, latencies, error_rates, repeat):
+    results = []
+    for count in sizes:
+        activities = generate_activities(count, START, END, seed=count)
+        for latency in latencies:
+            for error_rate in error_rates:
+                for concurrency in concurrencies:
+                    row = {'activities': count, 'latency': latency, 'error_rate': error_rate,
+                           'concurrency': concurrency}
+                    row.update(bench_case(activities, concurrency, latency, error_rate, repeat))
+                    results.append(row)
+                    print(f'{count:>7} activities latency {latency:.3f}s errors {error_rate:.0%} '
+                          f'concurrency {concurrency}: {row["seconds"] * 1000:9.1f} ms, '
+                          f'{row["requests"]} requests, {row["status"]}', file=sys.stderr)
+    return {'meta': run_metadata(repeat), 'results': results}
+
+
+def _list(cast):
+    return lambda value: [cast(part) for part in value.split(',') if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=_list(int), default=DEFAULT_SIZES,
+                        help='comma separated activity counts (default: %(default)s)')
+    parser.add_argument('--concurrency', type=_list(int), default=DEFAULT_CONCURRENCY,
+                        help='comma separated fetch concurrencies (default: %(default)s)')
+    parser.add_argument('--latencies', type=_list(float), default=DEFAULT_LATENCIES,
+                        help='comma separated per-request latencies in seconds (default: %(default)s)')
+    parser.add_argument('--error-rates', type=_list(float), default=DEFAULT_ERROR_RATES,
+                        help='comma separated fractions of failing requests (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is kept')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.concurrency, args.latencies, args.error_rates, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(current, baseline) else 0
+    if not args.output:
+        json.dump(current, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Benchmark loading analysis frames from activity snapshots against the stored JSON
+
+Run from the repository root (needs pyarrow):
+
+    python -m benchmarks.bench_snapshots --output snapshots.json
+    python -m benchmarks.bench_snapshots --compare snapshots.json
+
+Each athlete has a ten-year synthetic history in a temporary activity store; every window
+is loaded both by parsing the stored JSON into a frame and from the Arrow snapshot.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from activity_snapshots import ActivitySnapshots
+from activity_store import ActivityStore
+from benchmarks.bench_analytics import compare, run_metadata
+from benchmarks.synthetic import generate_activities
+from charts import prepare_activity_frame
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+DEFAULT_WINDOWS = [7, 90, 365, 3650]  # days
+END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HISTORY_DAYS = 3650
+
+
+def _best(fn, repeat):
+    fn()  # warm-up (and, for snapshots, the one-off write after the store changed)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+
+def run(sizes, windows, repeat):
+    results = []
+    directory = tempfile.mkdtemp()
+    for count in sizes:
+        store = ActivityStore(os.path.join(directory, f'{count}.db'))
+        store.upsert_activities(1, generate_activities(count, END - timedelta(days=HISTORY_DAYS), END, seed=count))
+        snapshots = ActivitySnapshots(store, os.path.join(directory, f'{count}-snapshots'))
+        for window in windows:
+            start, end = int((END - timedelta(days=window)).timestamp()), int(END.timestamp()) - 1
+            sources = {
+                'json': lambda: prepare_activity_frame(store.get_activities(1, start, end)),
+                'snapshot': lambda: snapshots.load_frame(1, start, end),
+            }
+            for source, fn in sources.items():
+                best, mean = _best(fn, repeat)
+                results.append({'activities': count, 'window_days': window, 'source': source,
+                                'seconds': best, 'mean_seconds': mean})
+                print(f'{count:>7} activities {window:>5} days {source:>8}: {best * 1000:9.2f} ms', file=sys.stderr)
+    return {'meta': run_metadata(repeat), 'results': results}
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=_int_list, default=DEFAULT_SIZES,
+                        help='comma separated activity counts over ten years (default: %(default)s)')
+    parser.add_argument('--windows', type=_int_list, default=DEFAULT_WINDOWS,
+                        help='comma separated window lengths in days (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is kept')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    current = run(args.sizes, args.windows, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(current, baseline) else 0
+    if not args.output:
+        json.dump(current, sys.stdout, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
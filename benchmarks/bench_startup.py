@@ -0,0 +1,109 @@
+"""Benchmark cold-start import times and keep heavy imports off the light request paths
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json
+
+Every target module is imported in a fresh interpreter under `python -X importtime` and
+its cumulative import time is reported. The light-paths check imports the app, requests
+the login page, OAuth callback and logout, and fails (exit status 1) if any of those
+loaded pandas, numpy, Plotly or pyarrow.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_analytics import compare, run_metadata
+
+DEFAULT_TARGETS = ['app', 'analytics', 'charts']
+HEAVY_MODULES = ('pandas', 'numpy', 'plotly', 'pyarrow')
+LIGHT_PATHS_SCRIPT = '''
+import json, sys
+import app
+client = app.app.test_client()
+for path in ('/', '/callback', '/logout'):
+    client.get(path)
+print(json.dumps(sorted({name.split('.')[0] for name in sys.modules} & set(%r))))
+''' % (HEAVY_MODULES,)
+
+
+def _environment():
+    """Environment for the child interpreters, with every data file in a temp directory"""
+    directory = tempfile.mkdtemp()
+    return {**os.environ,
+            'ACTIVITY_STORE_PATH': os.path.join(directory, 'activities.db'),
+            'ACTIVITY_SNAPSHOT_PATH': os.path.join(directory, 'snapshots'),
+            'SYNC_QUEUE_PATH': os.path.join(directory, 'sync_queue.db')}
+
+
+def import_seconds(module, env):
+    """Cumulative import time of module in a fresh interpreter, from -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=env, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.startswith('import time:') and line.rsplit('|', 1)[-1].strip() == module:
+            return int(line.split('|')[1]) / 1e6
+    raise RuntimeError(f'No -X importtime line for {module}')
+
+
+def light_paths(env):
+    """(seconds, heavy modules loaded) for importing the app and serving login/callback/logout"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', LIGHT_PATHS_SCRIPT], env=env,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(targets, repeat):
+    env = _environment()
+    results = []
+    for target in targets:
+        import_seconds(target, env)  # warm-up, so disk caches are hot for every measured run
+        timings = [import_seconds(target, env) for _ in range(repeat)]
+        results.append({'target': f'import {target}', 'seconds': min(timings),
+                        'mean_seconds': sum(timings) / len(timings)})
+
+    light_paths(env)
+    runs = [light_paths(env) for _ in range(repeat)]
+    heavy = sorted({name for _, loaded in runs for name in loaded})
+    timings = [seconds for seconds, _ in runs]
+    results.append({'target': 'login/callback/logout', 'seconds': min(timings),
+                    'mean_seconds': sum(timings) / len(timings),
+                    'status': f'loaded {", ".join(heavy)}' if heavy else 'ok'})
+
+    for row in results:
+        print(f'{row["target"]:<24} {row["seconds"] * 1000:9.1f} ms  {row.get("status", "")}', file=sys.stderr)
+    return {'meta': run_metadata(repeat), 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--targets', type=lambda value: [part for part in value.split(',') if part],
+                        default=DEFAULT_TARGETS, help='comma separated modules to import (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is kept')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    current = run(args.targets, args.repeat)
+    failed = any(row.get('status', 'ok') != 'ok' for row in current['results'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed = compare(current, baseline) or failed
+    elif not args.output:
+        json.dump(current, sys.stdout, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Local stand-in for the Strava API, backed by the synthetic activity generator
+
+Start it on its own and point the app at it:
+
+    python -m benchmarks.mock_strava --port 8001 --activities 5000 --latency 0.05
+    STRAVA_API_URL=http://127.0.0.1:8001/api/v3 STRAVA_OAUTH_URL=http://127.0.0.1:8001/oauth python app.py
+
+or embed it in a benchmark with `with MockStrava(...) as strava:` and use strava.api_url.
+"""
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from benchmarks.synthetic import activity_detail, activity_streams, generate_activities
+
+# Same natural windows as Strava (and rate_limiter.py): 15 minutes and one UTC day
+SHORT_WINDOW_SECONDS = 15 * 60
+DAILY_WINDOW_SECONDS = 24 * 60 * 60
+MAX_PER_PAGE = 200
+
+
+class MockStrava:
+    """Threaded HTTP server speaking the subset of the Strava API the app uses
+
+    Serves GET /oauth/authorize (redirects straight back with a code), POST /oauth/token,
+    GET /api/v3/athlete/activities with Strava's after/before/page/per_page semantics and
+    GET /api/v3/activities/{id} (best efforts and splits for runs, see synthetic.activity_detail)
+    and GET /api/v3/activities/{id}/streams (key_by_type, see synthetic.activity_streams).
+    Every response carries X-RateLimit-Limit/Usage headers; requests over the limit get a
+    429. latency (+ up to latency_jitter) seconds are added per request, error_rate of the
+    activity requests fail with error_status, and fail_pages always fail.
+    """
+
+    def __init__(self, activities=None, count=1000, years=3, athlete_id=1, seed=0,
+                 latency=0.0, latency_jitter=0.0, error_rate=0.0, error_status=500,
+                 fail_pages=(), rate_limit=(100, 1000), host='127.0.0.1', port=0):
+        if activities is None:
+            end = datetime.now(timezone.utc).replace(microsecond=0)
+            activities = generate_activities(count, end - timedelta(days=365 * years), end,
+                                             seed=seed, athlete_id=athlete_id)
+        self.athlete_id = athlete_id
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_pages = set(fail_pages)
+        self.short_limit, self.daily_limit = rate_limit
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._short_window = self._daily_window = None
+        self._short_usage = self._daily_usage = 0
+        # Counters for benchmarks: requests served by path and responses by status
+        self.requests = {}
+        self.statuses = {}
+        self.set_activities(activities)
+
+        self._server = ThreadingHTTPServer((host, port), _handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return f'{self.url}/api/v3'
+
+    @property
+    def oauth_url(self):
+        return f'{self.url}/oauth'
+
+    def set_activities(self, activities):
+        """Replace the served activities (kept sorted by start_date for range queries)"""
+        rows = sorted(((_timestamp(a['start_date']), a) for a in activities), key=lambda row: row[0])
+        with self._lock:
+            self._timestamps = [timestamp for timestamp, _ in rows]
+            self._activities = [activity for _, activity in rows]
+            self._by_id = {activity['id']: activity for activity in self._activities}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _count_request(self):
+        """Charge one request to the rate limit; returns (allowed, headers)"""
+        with self._lock:
+            now = time.time()
+            short_window, daily_window = int(now // SHORT_WINDOW_SECONDS), int(now // DAILY_WINDOW_SECONDS)
+            if short_window != self._short_window:
+                self._short_window, self._short_usage = short_window, 0
+            if daily_window != self._daily_window:
+                self._daily_window, self._daily_usage = daily_window, 0
+            allowed = self._short_usage < self.short_limit and self._daily_usage < self.daily_limit
+            if allowed:
+                self._short_usage += 1
+                self._daily_usage += 1
+            headers = {
+                'X-RateLimit-Limit': f'{self.short_limit},{self.daily_limit}',
+                'X-RateLimit-Usage': f'{self._short_usage},{self._daily_usage}',
+            }
+            if not allowed:
+                headers['Retry-After'] = str(int((short_window + 1) * SHORT_WINDOW_SECONDS - now) + 1)
+            return allowed, headers
+
+    def _delay(self):
+        with self._lock:
+            jitter = self._rng.uniform(0, self.latency_jitter) if self.latency_jitter else 0.0
+        if self.latency or jitter:
+            time.sleep(self.latency + jitter)
+
+    def _inject_error(self, page):
+        if page in self.fail_pages:
+            return True
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def _activities_page(self, params):
+        after = int(params.get('after', 0) or 0)
+        before = params.get('before')
+        page = max(1, int(params.get('page', 1)))
+        per_page = min(MAX_PER_PAGE, max(1, int(params.get('per_page', 30))))
+        with self._lock:
+            # after/before are exclusive bounds on start_date, like Strava's
+            low = bisect.bisect_right(self._timestamps, after)
+            high = bisect.bisect_left(self._timestamps, int(before)) if before else len(self._timestamps)
+            selected = self._activities[low:high]
+        if 'after' not in params:
+            # Without after, Strava lists newest first
+            selected = selected[::-1]
+        return selected[(page - 1) * per_page:page * per_page]
+
+    def _activity(self, activity_id, streams=False):
+        """Detailed representation (or the streams) of one activity, None if there is no such activity"""
+        with self._lock:
+            activity = self._by_id.get(activity_id)
+        if activity is None:
+            return None
+        return activity_streams(activity) if streams else activity_detail(activity)
+
+    def _token(self):
+        return {
+            'token_type': 'Bearer',
+            'access_token': 'mock-access-token',
+            'refresh_token': 'mock-refresh-token',
+            'expires_at': int(time.time()) + 6 * 3600,
+            'expires_in': 6 * 3600,
+            'athlete': {'id': self.athlete_id, 'username': 'mock', 'firstname': 'Mock',
+                        'lastname': 'Athlete', 'profile': '', 'profile_medium': ''},
+        }
+
+    def _record(self, path, status):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def _handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path == '/oauth/authorize':
+                query = urlencode({'state': params.get('state', ''), 'code': 'mock-code',
+                                   'scope': params.get('scope', 'read')})
+                location = f'{params.get("redirect_uri", "/")}?{query}'
+                return self._send(302, b'', url.path, {'Location': location})
+            streams = url.path.startswith('/api/v3/activities/') and url.path.endswith('/streams')
+            activity_path = url.path.removesuffix('/streams') if streams else url.path
+            detail = activity_path.startswith('/api/v3/activities/') and activity_path.rsplit('/', 1)[-1].isdigit()
+            if url.path != '/api/v3/athlete/activities' and not detail:
+                return self._json(404, {'message': 'Record Not Found'}, url.path)
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self._json(401, {'message': 'Authorization Error'}, url.path)
+
+            # Detail and stream requests are counted under one path each so benchmarks can tell them apart
+            path = ('/api/v3/activities/{id}/streams' if streams else '/api/v3/activities/{id}') if detail else url.path
+            allowed, headers = mock._count_request()
+            mock._delay()
+            if not allowed:
+                return self._json(429, {'message': 'Rate Limit Exceeded'}, path, headers)
+            if mock._inject_error(None if detail else int(params.get('page', 1))):
+                return self._json(mock.error_status, {'message': 'Injected error'}, path, headers)
+            if detail:
+                activity = mock._activity(int(activity_path.rsplit('/', 1)[-1]), streams)
+                if activity is None:
+                    return self._json(404, {'message': 'Record Not Found'}, path, headers)
+                return self._json(200, activity, path, headers)
+            self._json(200, mock._activities_page(params), url.path, headers)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if url.path != '/oauth/token':
+                return self._json(404, {'message': 'Record Not Found'}, url.path)
+            mock._delay()
+            self._json(200, mock._token(), url.path)
+
+        def _json(self, status, payload, path, headers=None):
+            self._send(status, json.dumps(payload).encode(), path,
+                       {'Content-Type': 'application/json; charset=utf-8', **(headers or {})})
+
+        def _send(self, status, body, path, headers):
+            mock._record(path, status)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _timestamp(value):
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--activities', type=int, default=1000, help='number of synthetic activities')
+    parser.add_argument('--years', type=float, default=3, help='history they are spread over')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='extra random seconds, up to')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of activity requests that fail')
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--rate-limit', default='100,1000', help='15-minute,daily request limits')
+    args = parser.parse_args(argv)
+
+    mock = MockStrava(count=args.activities, years=args.years, seed=args.seed,
+                      latency=args.latency, latency_jitter=args.latency_jitter,
+                      error_rate=args.error_rate, error_status=args.error_status,
+                      rate_limit=tuple(int(part) for part in args.rate_limit.split(',')),
+                      host=args.host, port=args.port)
+    print(f'Mock Strava listening on {mock.url}')
+    print(f'  STRAVA_API_URL={mock.api_url} STRAVA_OAUTH_URL={mock.oauth_url}')
+    try:
+        mock.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# (type, weight, distance range in km or None, speed range in km/h or duration range in minutes)
+# Weights follow a typical Strava mix; VirtualRun/VirtualRide/Workout exercise the type aliases
+ACTIVITY_MIX = [
+    ('Run', 40, (3, 21), (8.5, 15)),
+    ('VirtualRun', 5, (3, 12), (9, 14)),
+    ('Ride', 14, (10, 100), (20, 32)),
+    ('VirtualRide', 6, (15, 60), (25, 35)),
+    ('Walk', 9, (1, 8), (4.5, 6)),
+    ('Hike', 3, (5, 20), (3, 5)),
+    ('Swim', 3, (0.5, 4), (2, 3.5)),
+    ('WeightTraining', 9, None, (20, 90)),
+    ('Workout', 6, None, (15, 60)),
+    ('Yoga', 5, None, (20, 75)),
+]
+
+# Home timezones (label, UTC offset in hours); athletes occasionally travel to another one
+TIMEZONES = [
+    ('America/Los_Angeles', -8),
+    ('America/Denver', -7),
+    ('America/New_York', -5),
+    ('Europe/London', 0),
+    ('Europe/Berlin', 1),
+    ('Asia/Kolkata', 5.5),
+    ('Asia/Tokyo', 9),
+    ('Australia/Sydney', 10),
+]
+TRAVEL_PROBABILITY = 0.08
+# Strava's standard best-effort distances (name, meters), reported for runs at least that long
+BEST_EFFORT_DISTANCES = [
+    ('400m', 400), ('1/2 mile', 804.67), ('1K', 1000), ('1 mile', 1609.34), ('2 mile', 3218.69),
+    ('5K', 5000), ('10K', 10000), ('15K', 15000), ('10 mile', 16093.4), ('20K', 20000),
+    ('Half-Marathon', 21097.5), ('30K', 30000), ('Marathon', 42195),
+]
+MILE_METERS = 1609.34
+# Runs recorded without GPS or distance (e.g. a treadmill run logged by time only)
+ZERO_DISTANCE_RUN_PROBABILITY = 0.02
+
+
+def generate_activities(count, start, end, seed=0, athlete_id=1):
+    """Deterministic list of Strava-like activity summary dicts, oldest first
+
+    Activities are spread evenly over [start, end) (timezone-aware UTC datetimes) at
+    morning or evening local times, with the same fields and nesting as the
+    /athlete/activities endpoint returns. The same arguments always yield the same list.
+    """
+    rng = random.Random(seed)
+    home = rng.choice(TIMEZONES)
+    types = [entry[0] for entry in ACTIVITY_MIX]
+    weights = [entry[1] for entry in ACTIVITY_MIX]
+    models = {entry[0]: entry[2:] for entry in ACTIVITY_MIX}
+    span = (end - start).total_seconds()
+
+    activities = []
+    for index in range(count):
+        zone_name, offset = rng.choice(TIMEZONES) if rng.random() < TRAVEL_PROBABILITY else home
+        activity_type = rng.choices(types, weights)[0]
+        distance_km, rate = models[activity_type]
+
+        # Spread evenly over the window, then move to a plausible local time of day
+        day_start = start + timedelta(seconds=span * index / max(count, 1))
+        hour = rng.choice([rng.uniform(5.5, 8.5), rng.uniform(11.5, 13), rng.uniform(17, 20.5)])
+        local = datetime.combine(day_start.date(), datetime.min.time()) + timedelta(hours=hour)
+        start_date = (local - timedelta(hours=offset)).replace(tzinfo=timezone.utc)
+        start_date = min(max(start_date, start), end - timedelta(seconds=1))
+        local = start_date.replace(tzinfo=None) + timedelta(hours=offset)
+
+        if distance_km is None:
+            distance = 0.0
+            moving_time = int(rng.uniform(*rate) * 60)
+        else:
+            distance = round(rng.uniform(*distance_km) * 1000, 1)
+            moving_time = int(distance / 1000 / rng.uniform(*rate) * 3600)
+            if activity_type in ('Run', 'VirtualRun') and rng.random() < ZERO_DISTANCE_RUN_PROBABILITY:
+                distance = 0.0
+        elevation = 0.0 if activity_type.startswith('Virtual') or distance == 0 else round(
+            rng.uniform(0, 15) * distance / 1000, 1)
+
+        activity_id = 1_000_000_000 + index
+        activities.append({
+            'resource_state': 2,
+            'athlete': {'id': athlete_id, 'resource_state': 1},
+            'name': f'{activity_type} #{index + 1}',
+            'distance': distance,
+            'moving_time': moving_time,
+            'elapsed_time': moving_time + rng.randint(0, 600),
+            'total_elevation_gain': elevation,
+            'type': activity_type,
+            'sport_type': activity_type,
+            'id': activity_id,
+            'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            # Strava formats local wall-clock time with a 'Z' suffix as well
+            'start_date_local': local.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'timezone': f'(GMT{_format_offset(offset)}) {zone_name}',
+            'utc_offset': int(offset * 3600),
+            'achievement_count': rng.randint(0, 5),
+            'kudos_count': rng.randint(0, 30),
+            'trainer': activity_type.startswith('Virtual'),
+            'manual': False,
+            'private': False,
+            'visibility': 'everyone',
+            'average_speed': round(distance / moving_time, 3) if moving_time else 0.0,
+            'max_speed': round(distance / moving_time * rng.uniform(1.2, 2.0), 3) if moving_time else 0.0,
+            'has_heartrate': rng.random() < 0.7,
+            'map': {'id': f'a{activity_id}', 'summary_polyline': _polyline(rng), 'resource_state': 2},
+        })
+    activities.sort(key=lambda activity: (activity['start_date'], activity['id']))
+    return activities
+
+
+def activity_detail(activity):
+    """Strava-like /activities/{id} response for a generated activity
+
+    Runs with a distance get best_efforts and per-mile splits_standard consistent with
+    their distance and moving time; the same activity always gets the same detail.
+    """
+    detail = {**activity, 'resource_state': 3, 'best_efforts': [], 'splits_standard': []}
+    distance, moving_time = activity['distance'], activity['moving_time']
+    if activity['type'] not in ('Run', 'VirtualRun') or not distance or not moving_time:
+        return detail
+    rng = random.Random(activity['id'])
+    seconds_per_meter = moving_time / distance
+    for effort_id, (name, meters) in enumerate(BEST_EFFORT_DISTANCES):
+        if meters > distance:
+            break
+        # Shorter efforts are run a little faster than the whole run's average
+        elapsed = int(meters * seconds_per_meter * rng.uniform(0.88, 1.0))
+        detail['best_efforts'].append({
+            'id': activity['id'] * 100 + effort_id, 'resource_state': 2, 'name': name,
+            'elapsed_time': elapsed, 'moving_time': elapsed, 'distance': meters,
+            'start_date': activity['start_date'], 'start_date_local': activity['start_date_local'],
+            'pr_rank': None, 'achievements': [],
+        })
+    covered = 0.0
+    split = 1
+    while covered < distance:
+        meters = min(MILE_METERS, distance - covered)
+        elapsed = int(meters * seconds_per_meter * rng.uniform(0.95, 1.05))
+        detail['splits_standard'].append({
+            'distance': round(meters, 1), 'elapsed_time': elapsed, 'moving_time': elapsed, 'split': split,
+            'elevation_difference': round(rng.uniform(-10, 10), 1),
+            'average_speed': round(meters / elapsed, 2) if elapsed else 0.0, 'pace_zone': 0,
+        })
+        covered += meters
+        split += 1
+    return detail
+
+
+def activity_streams(activity):
+    """Strava-like /activities/{id}/streams?key_by_type=true response for a generated activity
+
+    Runs with a distance get one sample every couple of seconds: pace drifting around the
+    run's average (so shorter stretches come out faster than the whole), ending on its
+    distance and moving time. Anything else has no streams. Deterministic per activity.
+    """
+    distance, moving_time = activity['distance'], activity['moving_time']
+    if activity['type'] not in ('Run', 'VirtualRun') or not distance or not moving_time:
+        return {}
+    rng = random.Random(activity['id'])
+    times, speeds = [0], [0.0]
+    pace_drift = 1.0
+    while times[-1] < moving_time:
+        times.append(min(moving_time, times[-1] + rng.choice((1, 2, 2, 3))))
+        pace_drift = min(1.15, max(0.85, pace_drift + rng.gauss(0, 0.01)))
+        speeds.append((times[-1] - times[-2]) * pace_drift)
+    # Scale the cumulative distance so the last sample lands on the activity's distance
+    scale = distance / sum(speeds)
+    distances, covered = [], 0.0
+    for step in speeds:
+        covered += step * scale
+        distances.append(round(covered, 1))
+    altitude, heartrate = rng.uniform(0, 500), rng.uniform(120, 150)
+    altitudes, heartrates = [], []
+    for _ in times:
+        altitude += rng.gauss(0, 0.3)
+        heartrate = min(195, max(90, heartrate + rng.gauss(0.02, 0.8)))
+        altitudes.append(round(altitude, 1))
+        heartrates.append(round(heartrate))
+
+    def stream(data):
+        return {'data': data, 'series_type': 'distance', 'original_size': len(data), 'resolution': 'high'}
+
+    streams = {'time': stream(times), 'distance': stream(distances), 'altitude': stream(altitudes)}
+    if activity.get('has_heartrate'):
+        streams['heartrate'] = stream(heartrates)
+    return streams
+
+
+def _format_offset(offset):
+    hours, minutes = divmod(int(abs(offset) * 60), 60)
+    return f"{'-' if offset < 0 else '+'}{hours:02d}:{minutes:02d}"
+
+
+def _polyline(rng):
+    # Summary polylines are opaque encoded strings of a few hundred characters
+    alphabet = '?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~'
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(150, 400)))
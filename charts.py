@@ -0,0 +1,484 @@
+import base64
+import json
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+from rollup import METERS_PER_MILE, ROLLUP_COLUMNS, normalize_type
+
+try:
+    import orjson
+except ImportError:  # optional; charts are then serialized with the json module
+    orjson = None
+
+DAY_MS = 86400000  # one day on a Plotly date axis, in milliseconds
+
+
+def prepare_activity_frame(activities):
+    """Compact typed frame of the activity fields the analytics use
+
+    Only these columns are projected out of the raw Strava dicts (nested map/athlete
+    objects and everything else are dropped), with a categorical type, 32-bit numbers
+    and both start dates parsed once as datetime64.
+    """
+    def field(name):
+        return [activity.get(name) for activity in activities]
+
+    def timestamps(name):
+        # Strava marks start_date_local with a 'Z' too, so both parse as UTC;
+        # the local one is kept naive since it is wall-clock time
+        return pd.to_datetime(pd.Series(field(name), dtype='string'), utc=True, errors='coerce', format='ISO8601')
+
+    return pd.DataFrame({
+        'type': pd.Categorical([normalize_type(activity_type) for activity_type in field('type')]),
+        'start_date': timestamps('start_date'),
+        'start_date_local': timestamps('start_date_local').dt.tz_localize(None),
+        'distance': pd.Series(field('distance'), dtype='float32'),
+        'moving_time': pd.Series([value or 0 for value in field('moving_time')], dtype='int32'),
+        'total_elevation_gain': pd.Series(field('total_elevation_gain'), dtype='float32'),
+    })
+
+
+def rollup_frame(rows, requested_start_date=None, requested_end_date=None):
+    """DataFrame of daily rollup rows (see rollup.ROLLUP_COLUMNS) with day as a date
+
+    Rows outside the requested range are dropped so every trend covers the same local days.
+    """
+    rollup = pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+    rollup['day'] = pd.to_datetime(rollup['day'])
+    if requested_start_date and requested_end_date:
+        window_start, window_end = analysis_window(rollup, requested_start_date, requested_end_date)
+        rollup = rollup[(rollup['day'] >= window_start) & (rollup['day'] <= window_end)]
+    return rollup.reset_index(drop=True)
+
+
+def analysis_window(rollup, requested_start_date=None, requested_end_date=None):
+    """Common (start, end) day range for all daily series
+
+    Uses the requested date range if provided, otherwise falls back to activity dates.
+    """
+    if requested_start_date and requested_end_date:
+        return _to_day(requested_start_date), _to_day(requested_end_date)
+    if not rollup.empty:
+        return rollup['day'].min(), rollup['day'].max()
+    return None, None
+
+
+def _to_day(value):
+    """Calendar day of a date string / datetime as a naive Timestamp"""
+    return pd.Timestamp(pd.Timestamp(value).date())
+
+
+def window_days(window_start, window_end):
+    """Explicit daily date index covering the analysis window"""
+    return pd.date_range(window_start, window_end, freq='D')
+
+
+def daily_totals(rollup, column, index, activity_type=None):
+    """Per-day sum of a rollup column (optionally for one activity type), reindexed to every day"""
+    if activity_type is not None:
+        rollup = rollup[rollup['type'] == activity_type]
+    return rollup.groupby('day')[column].sum().reindex(index, fill_value=0)
+
+
+def running_rollup(rollup):
+    """Rollup rows for runs, or None if there are none"""
+    runs = rollup[rollup['type'] == 'Run']
+    return None if runs.empty else runs
+
+
+def _bucket_totals(runs, bucket_starts):
+    """Run distance (miles) and average pace (sec/mile) per bucket, skipping empty buckets"""
+    totals = runs.groupby(bucket_starts)[['distance', 'pace_sum', 'pace_count']].sum()
+    totals = totals[totals['distance'] > 0]
+    miles = totals['distance'] / METERS_PER_MILE
+    pace = totals['pace_sum'] / totals['pace_count'].replace(0, float('nan'))
+    return miles, pace.dropna()
+
+
+def _week_starts(runs):
+    # Monday of each day's Mon-Sun week
+    return runs['day'] - pd.to_timedelta(runs['day'].dt.weekday, unit='D')
+
+
+def _month_starts(runs):
+    return runs['day'].dt.to_period('M').dt.to_timestamp()
+
+
+def pace_to_mmss(pace_seconds):
+    """Convert pace to MM:SS format for display"""
+    mins = int(pace_seconds // 60)
+    secs = int(pace_seconds % 60)
+    return f"{mins}:{secs:02d}"
+
+
+def _daily_dtick(num_days):
+    """Appropriate tick interval (ms) for a daily x-axis spanning num_days"""
+    if num_days <= 30:
+        return DAY_MS  # Show every day for <= 30 days
+    elif num_days <= 90:
+        return DAY_MS * 7  # Show every week for <= 90 days
+    return DAY_MS * 14  # Show every 2 weeks for > 90 days
+
+
+@lru_cache(maxsize=None)
+def plotly_template():
+    """Plotly's default layout template, which go.Figure embeds in every figure (read once)"""
+    import plotly.io as pio
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def _trace(trace_type, **props):
+    """Trace dict as Plotly emits it: properties (and nested ones) sorted, type last"""
+    trace = {key: dict(sorted(value.items())) if isinstance(value, dict) else value
+             for key, value in sorted(props.items())}
+    trace['type'] = trace_type
+    return trace
+
+
+def _axis(title, **props):
+    return {'title': {'text': title}, **props}
+
+
+def _figure(trace, title, xaxis=None, yaxis=None, **layout):
+    """Figure spec equal to go.Figure(...).to_plotly_json(), without Plotly's per-property validation"""
+    figure_layout = {'template': plotly_template()}
+    if yaxis is not None:
+        figure_layout['yaxis'] = yaxis
+    if xaxis is not None:
+        figure_layout['xaxis'] = xaxis
+    figure_layout['title'] = {'text': title}
+    figure_layout.update(layout)
+    return {'data': [trace], 'layout': figure_layout}
+
+
+def activity_types_figure(rollup, window_start, window_end):
+    activity_counts = rollup.groupby('type')['count'].sum().sort_values(ascending=False, kind='stable')
+    return _figure(_trace(
+        'pie',
+        labels=list(activity_counts.index),
+        values=activity_counts.to_numpy(),
+        hole=0.3,
+        texttemplate='%{label}<br>%{value} (%{percent:.1f})',
+        textposition='inside',
+        insidetextorientation='horizontal',
+        hovertemplate='%{label}<br>%{value} activities<br>%{percent:.1f}<extra></extra>'
+    ), title="Activity Types Distribution")
+
+
+def duration_by_type_figure(rollup, window_start, window_end):
+    duration_by_type = rollup.groupby('type')['moving_time'].sum()
+    seconds = duration_by_type.to_numpy()
+
+    # Create duration pie chart with formatted time labels
+    duration_text = [f"{int(value // 3600)}h {int((value % 3600) // 60)}m" for value in seconds]
+
+    return _figure(_trace(
+        'pie',
+        labels=list(duration_by_type.index),
+        values=seconds / 3600,  # Keep as hours for proper percentage calculation
+        hole=0.3,
+        text=duration_text,
+        texttemplate='%{label}<br>%{text} (%{percent:.1f})',
+        textposition='inside',
+        insidetextorientation='horizontal',
+        hovertemplate='%{label}<br>%{text}<br>%{percent:.1f}<extra></extra>'
+    ), title="Time Distribution by Activity Type")
+
+
+def mileage_daily_figure(rollup, window_start, window_end):
+    if running_rollup(rollup) is None:
+        return None
+    daily_index = window_days(window_start, window_end)
+    daily = daily_totals(rollup, 'distance', daily_index, 'Run') / METERS_PER_MILE
+
+    return _figure(
+        _trace(
+            'scatter',
+            # One point per day from the first one, instead of a date string per point
+            x0=daily_index[0].strftime('%Y-%m-%d'),
+            dx=DAY_MS,
+            y=daily.to_numpy(dtype='float64'),
+            mode='lines+markers',
+            line=dict(color="#4e79a7", shape='spline', smoothing=0.3),
+            marker=dict(size=6),
+            hovertemplate='%{x|%Y-%m-%d}<br>%{y:.2f} mi<extra></extra>'
+        ),
+        title="Daily Running Mileage",
+        yaxis=_axis("Miles", rangemode='tozero'),
+        xaxis=_axis(
+            "Day",
+            type='date',
+            tickformat='%b %d',
+            tickangle=-45,
+            dtick=_daily_dtick(len(daily_index))
+        )
+    )
+
+
+def mileage_weekly_figure(rollup, window_start, window_end):
+    runs = running_rollup(rollup)
+    if runs is None:
+        return None
+    # Weekly aggregate (Mon-Sun weeks, labeled by their Monday) as line graph
+    weekly, _ = _bucket_totals(runs, _week_starts(runs))
+    y_weekly = weekly.to_numpy(dtype='float64')
+    # Create hover data with week number and full date range
+    week_numbers = [d.isocalendar()[1] for d in weekly.index]  # ISO week number
+    week_end_dates = [(d + timedelta(days=6)).strftime('%b %d, %Y') for d in weekly.index]
+    hover_text = [f"Week {wk} of {d.year}<br>{d.strftime('%b %d')} - {end}<br>{miles:.2f} mi"
+                 for wk, d, end, miles in zip(week_numbers, weekly.index, week_end_dates, y_weekly)]
+
+    return _figure(
+        _trace(
+            'scatter',
+            x=weekly.index.strftime('%b %d').tolist(),  # Week start date labels (e.g., "Nov 4")
+            y=y_weekly,
+            mode='lines+markers',
+            line=dict(color="#59a14f", shape='spline', smoothing=0.3),
+            marker=dict(size=8),
+            text=hover_text,
+            hovertemplate='%{text}<extra></extra>'
+        ),
+        title="Weekly Running Mileage",
+        yaxis=_axis("Miles", rangemode='tozero'),
+        xaxis=_axis("Week Start Date", type='category')
+    )
+
+
+def mileage_monthly_figure(rollup, window_start, window_end):
+    runs = running_rollup(rollup)
+    if runs is None:
+        return None
+    # Monthly aggregate as line graph
+    monthly, _ = _bucket_totals(runs, _month_starts(runs))
+
+    return _figure(
+        _trace(
+            'scatter',
+            x=monthly.index.strftime('%b %Y').tolist(),  # Month labels like "Jan 2024", "Feb 2024", etc.
+            y=monthly.to_numpy(dtype='float64'),
+            mode='lines+markers',
+            line=dict(color="#f28e2c", shape='spline', smoothing=0.3),
+            marker=dict(size=8),
+            hovertemplate='%{x}<br>%{y:.2f} mi<extra></extra>'
+        ),
+        title="Monthly Running Mileage",
+        yaxis=_axis("Miles", rangemode='tozero'),
+        xaxis=_axis("Month", type='category')
+    )
+
+
+def pace_daily_figure(rollup, window_start, window_end):
+    runs = running_rollup(rollup)
+    if runs is None:
+        return None
+    daily_index = window_days(window_start, window_end)
+
+    # Daily average pace over the days that have a run with a distance, for ALL days in the range
+    runs = runs[runs['pace_count'] > 0].set_index('day')
+    daily_pace = (runs['pace_sum'] / runs['pace_count']).reindex(daily_index).to_numpy(dtype='float64')
+    hover_text_daily_pace = [f"{label}<br>No run" if np.isnan(pace) else f"{label}<br>Pace: {pace_to_mmss(pace)}"
+                             for label, pace in zip(daily_index.strftime('%b %d'), daily_pace)]
+
+    return _figure(
+        _trace(
+            'scatter',
+            x0=daily_index[0].isoformat(),
+            dx=DAY_MS,
+            y=np.nan_to_num(daily_pace, nan=0.0),  # Explicitly 0.0 for non-running days
+            mode='lines+markers',
+            line=dict(color="#e15759", width=2, shape='spline', smoothing=0.3),
+            marker=dict(size=5, symbol='circle'),
+            text=hover_text_daily_pace,
+            hovertemplate='%{text}<extra></extra>'
+        ),
+        title="Daily Average Pace",
+        yaxis=_axis(
+            "Pace (min/mile)",
+            rangemode='tozero',
+            tickmode='array',
+            tickvals=[0] + [i * 60 for i in range(6, 15)],
+            ticktext=['0:00'] + [f"{i}:00" for i in range(6, 15)]
+        ),
+        xaxis=_axis(
+            "Day",
+            type='date',
+            tickformat='%b %d',
+            tickangle=-45,
+            dtick=_daily_dtick(len(daily_index)),
+            range=[daily_index[0].isoformat(), daily_index[-1].isoformat()]  # Ensure full range is shown
+        ),
+        hovermode='x unified'
+    )
+
+
+def pace_weekly_figure(rollup, window_start, window_end):
+    runs = running_rollup(rollup)
+    if runs is None:
+        return None
+    # Weekly average pace
+    _, weekly_pace = _bucket_totals(runs, _week_starts(runs))
+
+    y_weekly_pace = weekly_pace.to_numpy(dtype='float64')
+    week_numbers_pace = [d.isocalendar()[1] for d in weekly_pace.index]
+    week_end_dates_pace = [(d + timedelta(days=6)).strftime('%b %d, %Y') for d in weekly_pace.index]
+    hover_text_pace = [f"Week {wk} of {d.year}<br>{d.strftime('%b %d')} - {end}<br>Pace: {pace_to_mmss(pace)}"
+                      for wk, d, end, pace in zip(week_numbers_pace, weekly_pace.index, week_end_dates_pace, y_weekly_pace)]
+
+    return _figure(
+        _trace(
+            'scatter',
+            x=weekly_pace.index.strftime('%b %d').tolist(),
+            y=y_weekly_pace,
+            mode='lines+markers',
+            line=dict(color="#e15759", shape='spline', smoothing=0.3),
+            marker=dict(size=8),
+            text=hover_text_pace,
+            hovertemplate='%{text}<extra></extra>'
+        ),
+        title="Weekly Average Pace",
+        yaxis=_axis(
+            "Pace (min/mile)",
+            autorange='reversed',  # Lower pace (faster) at top
+            tickmode='array',
+            tickvals=[i * 60 for i in range(6, 15)],  # 6:00 to 14:00 min/mile
+            ticktext=[f"{i}:00" for i in range(6, 15)]
+        ),
+        xaxis=_axis("Week Start Date", type='category')
+    )
+
+
+def pace_monthly_figure(rollup, window_start, window_end):
+    runs = running_rollup(rollup)
+    if runs is None:
+        return None
+    # Monthly average pace
+    _, monthly_pace = _bucket_totals(runs, _month_starts(runs))
+
+    x_monthly_pace = monthly_pace.index.strftime('%b %Y').tolist()
+    y_monthly_pace = monthly_pace.to_numpy(dtype='float64')
+    hover_text_monthly_pace = [f"{month}<br>Pace: {pace_to_mmss(pace)}"
+                              for month, pace in zip(x_monthly_pace, y_monthly_pace)]
+
+    return _figure(
+        _trace(
+            'scatter',
+            x=x_monthly_pace,
+            y=y_monthly_pace,
+            mode='lines+markers',
+            line=dict(color="#e15759", shape='spline', smoothing=0.3),
+            marker=dict(size=8),
+            text=hover_text_monthly_pace,
+            hovertemplate='%{text}<extra></extra>'
+        ),
+        title="Monthly Average Pace",
+        yaxis=_axis(
+            "Pace (min/mile)",
+            autorange='reversed',  # Lower pace (faster) at top
+            tickmode='array',
+            tickvals=[i * 60 for i in range(6, 15)],
+            ticktext=[f"{i}:00" for i in range(6, 15)]
+        ),
+        xaxis=_axis("Month", type='category')
+    )
+
+
+def compact_daily_series(daily_index, values, scale):
+    """Wire format for a value per day, decoded by decodeDailySeries in results.html
+
+    Instead of a date string and a float for every day: the first day and the number of
+    days, a bitmap of the days with a value above zero (base64, least significant bit
+    first), and only those days' values, as integers of 1/scale units.
+    """
+    values = np.asarray(values, dtype='float64')
+    active = values > 0
+    return {
+        'start': daily_index[0].strftime('%Y-%m-%d') if len(daily_index) else None,
+        'days': len(daily_index),
+        'scale': scale,
+        'active': base64.b64encode(np.packbits(active, bitorder='little').tobytes()).decode('ascii'),
+        'values': np.rint(values[active] * scale).astype('int64'),
+    }
+
+
+def running_timeline(rollup, window_start, window_end):
+    """Run miles for every day in the window, for the running streak timeline"""
+    if running_rollup(rollup) is None:
+        return None
+    daily_index = window_days(window_start, window_end)
+    daily = daily_totals(rollup, 'distance', daily_index, 'Run') / METERS_PER_MILE
+    return compact_daily_series(daily_index, daily, scale=100)  # the 0.01 mi the timeline shows
+
+
+def workout_timeline(rollup, window_start, window_end):
+    """Hours of activity (all types) for every day in the window, for the workout streak timeline"""
+    if window_start is None or window_end is None:
+        return None
+    daily_index = window_days(window_start, window_end)
+    hours = daily_totals(rollup, 'moving_time', daily_index) / 3600
+    return compact_daily_series(daily_index, hours, scale=3600)  # whole seconds, i.e. lossless
+
+
+# Charts served by /api/chart/<name>
+CHARTS = {
+    'activity_types': activity_types_figure,
+    'duration_by_type': duration_by_type_figure,
+    'mileage_daily': mileage_daily_figure,
+    'mileage_weekly': mileage_weekly_figure,
+    'mileage_monthly': mileage_monthly_figure,
+    'pace_daily': pace_daily_figure,
+    'pace_weekly': pace_weekly_figure,
+    'pace_monthly': pace_monthly_figure,
+}
+
+# Streak timelines served by /api/timeline/<name>
+TIMELINES = {
+    'running': running_timeline,
+    'workout': workout_timeline,
+}
+
+
+def figure_json(figure):
+    """Serialize a figure spec for Plotly.newPlot, encoding numpy arrays and datetime64 natively"""
+    if orjson is not None:
+        return orjson.dumps(figure, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(figure, default=_json_default, separators=(',', ':'))
+
+
+def _json_default(value):
+    # numpy values orjson can't take natively (e.g. non-contiguous arrays), or any without orjson
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'M':
+            return np.datetime_as_string(value, unit='s').tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def build_chart(name, rollup, requested_start_date=None, requested_end_date=None):
+    """Serialize a single chart (built from a rollup_frame) as Plotly JSON, or None if there is no data for it"""
+    return _build(CHARTS[name], name, rollup, requested_start_date, requested_end_date)
+
+
+def build_timeline(name, rollup, requested_start_date=None, requested_end_date=None):
+    """Serialize a streak timeline (built from a rollup_frame) as JSON, or None if there is no data for it"""
+    return _build(TIMELINES[name], name, rollup, requested_start_date, requested_end_date)
+
+
+def _build(builder, name, rollup, requested_start_date, requested_end_date):
+    window_start, window_end = analysis_window(rollup, requested_start_date, requested_end_date)
+    try:
+        with span('chart_figure', chart=name):
+            figure = builder(rollup, window_start, window_end)
+    except Exception:
+        # Silently handle errors in trend generation
+        return None
+    if figure is None:
+        return None
+    with span('chart_json', chart=name):
+        return figure_json(figure)
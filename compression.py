@@ -0,0 +1,48 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional; without it responses are only gzip-compressed
+    brotli = None
+
+# Response types worth compressing; images and other binary types already are
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+                          'application/json'}
+# Preferred first when the client accepts several at the same quality
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # well past gzip's ratio while still fast enough for per-request pages
+
+
+def compress_response(response, accept_encodings, min_size=1024):
+    """Compress a finished response body with the best encoding the client accepts
+
+    Only complete 200 responses of a compressible type are touched (streamed and file
+    responses pass through). A strong ETag gets the encoding appended, since the encoded
+    bytes differ from the identity ones; see strip_encoding for matching it again.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accept_encodings.best_match(ENCODINGS)
+    body = response.get_data()
+    if encoding is None or len(body) < min_size:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+def strip_encoding(etag):
+    """The ETag a view set, from one compress_response may have suffixed with the encoding"""
+    base, _, encoding = etag.rpartition('-')
+    return base if base and encoding in ('br', 'gzip') else etag
+
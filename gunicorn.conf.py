@@ -0,0 +1,32 @@
+"""Gunicorn settings for the production serving mode (./run.sh production)
+
+Each worker process handles up to WEB_THREADS requests at once, all sharing that process'
+pooled Strava session, so a request waiting on Strava costs an idle thread rather than a
+blocked worker.
+"""
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"{os.getenv('WEB_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', '3000')}"
+workers = int(os.getenv('WEB_WORKERS', '2'))  # processes
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '16'))  # concurrent requests per process
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))  # seconds before a stuck worker is restarted
+keepalive = 5
+# Every worker keeps its own Strava rate-limit counters, so each may only use its share of
+# the quota (see rate_limiter.py); set STRAVA_RATE_LIMIT_PROCESSES to count other servers too
+raw_env = [f"STRAVA_RATE_LIMIT_PROCESSES={os.getenv('STRAVA_RATE_LIMIT_PROCESSES', workers)}"]
+accesslog = '-'
+# Import pandas/Plotly/pyarrow in the background as soon as a worker is up, so it can
+# serve the login page right away and the first dashboard doesn't pay for the imports
+ANALYTICS_PREWARM = os.getenv('ANALYTICS_PREWARM', 'true').lower() in ('1', 'true', 'yes')
+
+
+def post_worker_init(worker):
+    if ANALYTICS_PREWARM:
+        from app import prewarm_analytics
+        threading.Thread(target=prewarm_analytics, name='analytics-prewarm', daemon=True).start()
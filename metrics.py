@@ -0,0 +1,100 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds in seconds (Prometheus' defaults plus a finer low end)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Spans recorded while handling the current request, for the Server-Timing header
+_request_spans = ContextVar('request_spans', default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, in Prometheus' exposition format"""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # sorted label tuple -> [bucket counts..., sum, count]
+
+    def observe(self, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, values in series:
+                for bound, count in zip(self.buckets, values):
+                    lines.append(f'{self.name}_bucket{_labels(key, le=f"{bound:g}")} {count}')
+                lines.append(f'{self.name}_bucket{_labels(key, le="+Inf")} {values[-1]}')
+                lines.append(f'{self.name}_sum{_labels(key)} {values[-2]:.6f}')
+                lines.append(f'{self.name}_count{_labels(key)} {values[-1]}')
+        return '\n'.join(lines)
+
+
+# Time spent in named hot-path sections (fetch, frame build, analytics, chart JSON, ...)
+span_duration = Histogram('strava_analyzer_span_duration_seconds', 'Time spent in instrumented code sections')
+# End-to-end request latency per Flask endpoint
+request_duration = Histogram('strava_analyzer_request_duration_seconds', 'HTTP request latency by endpoint')
+
+
+@contextmanager
+def span(name, **labels):
+    """Time a block, adding it to the span histogram and the current request's spans"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started, **labels)
+
+
+def record_span(name, elapsed, **labels):
+    """Add a span timed elsewhere (e.g. in a worker process) as if span() had timed it"""
+    span_duration.observe(elapsed, span=name, **labels)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, elapsed))
+
+
+def start_request():
+    """Begin collecting spans for the request being handled on this thread"""
+    _request_spans.set([])
+
+
+def request_spans():
+    """(name, total seconds) per span name for the current request, in first-seen order"""
+    totals = {}
+    for name, elapsed in _request_spans.get() or ():
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return list(totals.items())
+
+
+def server_timing_header(spans):
+    """Server-Timing header value for (name, seconds) pairs"""
+    return ', '.join(f'{name};dur={elapsed * 1000:.1f}' for name, elapsed in spans)
+
+
+def render_metrics():
+    """Every histogram in the Prometheus text exposition format"""
+    return '\n'.join(histogram.render() for histogram in (span_duration, request_duration)) + '\n'
+
+
+def _labels(key, **extra):
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
@@ -0,0 +1,87 @@
+import numpy as np
+
+from rollup import METERS_PER_MILE, ROLLUP_COLUMNS
+
+# Summed rollup columns, in the order they are stored in RangeIndex._sums
+METRICS = tuple(ROLLUP_COLUMNS[2:])
+
+
+class RangeIndex:
+    """Prefix sums of an athlete's daily rollup, so totals over any range of days take two lookups
+
+    Built once per data version from all of the athlete's rollup rows: a dense day axis from
+    their first to their last active day and, per activity type, cumulative sums of every
+    rollup metric, plus cumulative counts of active days (any moving time) and run days (any
+    run distance). Totals for [start_day, end_day] are the difference of two rows, whatever
+    the length of the range. Days are the athletes' local days, as in the rollup.
+    """
+
+    def __init__(self, rows):
+        self.types = sorted({row[1] for row in rows})
+        days = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        self.first_day = days.min() if len(days) else np.datetime64('1970-01-01')
+        day_count = int((days.max() - self.first_day).astype(int)) + 1 if len(days) else 0
+
+        # Row 0 is all zeros so the sum of days [i, j) is always _sums[j] - _sums[i]
+        daily = np.zeros((day_count + 1, len(self.types), len(METRICS)))
+        if rows:
+            offsets = (days - self.first_day).astype(int) + 1
+            type_indices = np.searchsorted(self.types, [row[1] for row in rows])
+            np.add.at(daily, (offsets, type_indices), np.array([row[2:] for row in rows], dtype='float64'))
+        self._sums = np.cumsum(daily, axis=0)
+
+        moving_time = daily[:, :, METRICS.index('moving_time')].sum(axis=1)
+        self._active_days = np.cumsum(moving_time > 0)
+        run_distance = (daily[:, self.types.index('Run'), METRICS.index('distance')] if 'Run' in self.types
+                        else np.zeros(day_count + 1))
+        self._run_days = np.cumsum(run_distance > 0)
+
+    def __sizeof__(self):
+        # Lets analysis_cache.estimate_size account for the arrays
+        return object.__sizeof__(self) + self._sums.nbytes + self._active_days.nbytes + self._run_days.nbytes
+
+    def totals(self, start_day, end_day):
+        """Per-type metric sums and active/run day counts over local days in [start_day, end_day]"""
+        first, last = self._bounds(start_day, end_day)
+        sums = self._sums[last] - self._sums[first]
+        return {
+            'types': {activity_type: dict(zip(METRICS, sums[index].tolist()))
+                      for index, activity_type in enumerate(self.types) if sums[index][0] > 0},
+            'active_days': int(self._active_days[last] - self._active_days[first]),
+            'run_days': int(self._run_days[last] - self._run_days[first]),
+        }
+
+    def summary(self, start_day, end_day):
+        """The results page's summary card values for [start_day, end_day], formatted the same way"""
+        totals = self.totals(start_day, end_day)
+        types = totals['types']
+        run = types.get('Run', dict.fromkeys(METRICS, 0))
+        moving_time = sum(metrics['moving_time'] for metrics in types.values())
+        running_miles = run['distance'] / METERS_PER_MILE
+
+        avg_pace_formatted = "0:00"
+        if running_miles > 0:
+            pace_seconds = run['moving_time'] / running_miles
+            avg_pace_formatted = f"{int(pace_seconds // 60)}:{int(pace_seconds % 60):02d}"
+        breakdown = sorted(((activity_type, int(metrics['count'])) for activity_type, metrics in types.items()),
+                           key=lambda item: -item[1])
+        return {
+            'start_date': str(start_day)[:10],
+            'end_date': str(end_day)[:10],
+            'total_activities': sum(count for _, count in breakdown),
+            'total_duration_formatted': f"{int(moving_time // 3600)}h {int((moving_time % 3600) // 60)}m",
+            'total_elevation_feet': round(sum(metrics['elevation'] for metrics in types.values()) * 3.28084, 2),
+            'activity_breakdown': dict(breakdown),
+            'total_runs': int(run['count']),
+            'running_miles': round(running_miles, 2),
+            'avg_pace_formatted': avg_pace_formatted,
+            'workout_active_days': totals['active_days'],
+            'running_active_days': totals['run_days'],
+        }
+
+    def _bounds(self, start_day, end_day):
+        """Rows of the prefix sums before start_day and through end_day, clipped to the index"""
+        size = len(self._sums) - 1
+        start = int((np.datetime64(str(start_day)[:10], 'D') - self.first_day).astype(int))
+        end = int((np.datetime64(str(end_day)[:10], 'D') - self.first_day).astype(int)) + 1
+        return min(max(start, 0), size), min(max(end, start, 0), size)
@@ -0,0 +1,176 @@
+import math
+import threading
+import time
+
+# Strava's short-term quota resets on natural 15-minute boundaries (:00, :15, :30, :45)
+# and the daily quota at midnight UTC
+SHORT_WINDOW_SECONDS = 15 * 60
+DAILY_WINDOW_SECONDS = 24 * 60 * 60
+
+
+class RateLimiter:
+    """Shared Strava request budget, driven by the X-RateLimit-Limit/Usage response headers
+
+    Every outgoing request calls acquire() first and every response is fed back through
+    update(). Requests are counted locally between responses so concurrent callers share
+    one budget; once the remaining short-term budget gets low, grants are spaced evenly
+    over what is left of the window, and at the cap callers wait for the window to reset
+    (up to max_wait seconds) instead of burning a request on a guaranteed 429.
+
+    The counters live in this process only. When several server processes call Strava with
+    the same app credentials, each gets a limiter with share set to its fraction of the
+    quota (1 / processes): limits are scaled down by share, and so is the app-wide usage
+    Strava reports, so together the processes stay within the quota without coordinating.
+    """
+
+    def __init__(self, short_limit=100, daily_limit=1000, max_wait=30, pace_threshold=0.2, share=1.0,
+                 clock=time.time):
+        self.share = share
+        self.short_limit = self._scale_limit(short_limit)
+        self.daily_limit = self._scale_limit(daily_limit)
+        self.max_wait = max_wait
+        # Fraction of the short-term budget below which requests are paced
+        self.pace_threshold = pace_threshold
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._short_usage = 0
+        self._daily_usage = 0
+        self._short_window = None
+        self._daily_window = None
+        self._last_grant = 0.0
+        self._last_update = None
+        self._waiting = 0
+
+    def _scale_limit(self, limit):
+        return max(1, int(limit * self.share))
+
+    def _scale_usage(self, usage):
+        # Rounded up, so a process never assumes less of the quota is used than its share
+        return math.ceil(usage * self.share)
+
+    def _roll_windows(self, now):
+        short_window = int(now // SHORT_WINDOW_SECONDS)
+        daily_window = int(now // DAILY_WINDOW_SECONDS)
+        if short_window != self._short_window:
+            self._short_window = short_window
+            self._short_usage = 0
+        if daily_window != self._daily_window:
+            self._daily_window = daily_window
+            self._daily_usage = 0
+
+    def _wait_time(self, now):
+        """Seconds until the next request may be sent (0 if it can go now)"""
+        if self._daily_usage >= self.daily_limit:
+            return (self._daily_window + 1) * DAILY_WINDOW_SECONDS - now
+        short_reset = (self._short_window + 1) * SHORT_WINDOW_SECONDS - now
+        remaining = self.short_limit - self._short_usage
+        if remaining <= 0:
+            return short_reset
+        if remaining <= self.short_limit * self.pace_threshold:
+            # Spread the remaining requests evenly over what is left of the window
+            interval = short_reset / remaining
+            return max(0.0, self._last_grant + interval - now)
+        return 0.0
+
+    def acquire(self, max_wait=None):
+        """Reserve budget for one request, blocking while paced or at the cap
+
+        Returns False without reserving anything if the request could not be sent
+        within max_wait seconds, so the caller can fall back to cached data.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = self._clock() + max_wait
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    wait = self._reserve()
+                    if wait <= 0:
+                        return True
+                    if self._clock() + wait > deadline:
+                        return False
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def _reserve(self):
+        """Take one request's budget if it can go now; else seconds to wait (lock held)"""
+        now = self._clock()
+        self._roll_windows(now)
+        wait = self._wait_time(now)
+        if wait <= 0:
+            self._short_usage += 1
+            self._daily_usage += 1
+            self._last_grant = now
+        return wait
+
+    def spare(self, reserve=0.0):
+        """Requests that could go out now while leaving reserve (a fraction) of both budgets unused
+
+        For background work, such as fetching activity details, that should only ever use
+        budget page loads and syncs won't need.
+        """
+        with self._cond:
+            self._roll_windows(self._clock())
+            short = self.short_limit * (1 - reserve) - self._short_usage
+            daily = self.daily_limit * (1 - reserve) - self._daily_usage
+            return max(0, int(min(short, daily)))
+
+    def update(self, headers):
+        """Sync the budget with the X-RateLimit-* headers of a Strava response"""
+        limit = _parse_pair(headers.get('X-RateLimit-Limit'))
+        usage = _parse_pair(headers.get('X-RateLimit-Usage'))
+        if limit is None and usage is None:
+            return
+        with self._cond:
+            now = self._clock()
+            self._roll_windows(now)
+            if limit is not None:
+                self.short_limit, self.daily_limit = (self._scale_limit(value) for value in limit)
+            if usage is not None:
+                # Requests still in flight are already counted locally but not yet by
+                # Strava, so never let a response lower the local count
+                self._short_usage = max(self._short_usage, self._scale_usage(usage[0]))
+                self._daily_usage = max(self._daily_usage, self._scale_usage(usage[1]))
+            self._last_update = now
+            self._cond.notify_all()
+
+    def mark_exhausted(self):
+        """Treat the short-term window as used up (e.g. after an unexpected 429)"""
+        with self._cond:
+            self._roll_windows(self._clock())
+            self._short_usage = max(self._short_usage, self.short_limit)
+
+    def snapshot(self):
+        """Current budget as a JSON-serializable dict"""
+        with self._cond:
+            now = self._clock()
+            self._roll_windows(now)
+            return {
+                'short_term': {
+                    'limit': self.short_limit,
+                    'usage': self._short_usage,
+                    'remaining': max(0, self.short_limit - self._short_usage),
+                    'resets_in_seconds': int((self._short_window + 1) * SHORT_WINDOW_SECONDS - now),
+                },
+                'daily': {
+                    'limit': self.daily_limit,
+                    'usage': self._daily_usage,
+                    'remaining': max(0, self.daily_limit - self._daily_usage),
+                    'resets_in_seconds': int((self._daily_window + 1) * DAILY_WINDOW_SECONDS - now),
+                },
+                'share': self.share,
+                'waiting_requests': self._waiting,
+                'seconds_since_last_update': round(now - self._last_update, 1) if self._last_update else None,
+            }
+
+
+def _parse_pair(value):
+    """Parse a '15-minute,daily' header value such as '100,1000'"""
+    if not value:
+        return None
+    try:
+        short, daily = (int(part.strip()) for part in value.split(',')[:2])
+    except ValueError:
+        return None
+    return short, daily
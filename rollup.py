@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+METERS_PER_MILE = 1609.34
+
+# Normalize activity types - combine similar activities
+ACTIVITY_TYPE_ALIASES = {
+    'Workout': 'WeightTraining',  # Combine Workout with WeightTraining
+    'VirtualRun': 'Run',  # Combine VirtualRun with Run
+    'VirtualRide': 'Ride'  # Combine VirtualRide with Ride
+}
+
+# One row per (day, activity type); pace is seconds per mile summed over the activities
+# that have a distance, so any bucket's average pace is pace_sum / pace_count
+ROLLUP_COLUMNS = ['day', 'type', 'count', 'distance', 'moving_time', 'elevation', 'pace_sum', 'pace_count']
+
+
+def normalize_type(activity_type):
+    return ACTIVITY_TYPE_ALIASES.get(activity_type, activity_type)
+
+
+def activity_day(activity):
+    """Calendar day (YYYY-MM-DD) of an activity in the athlete's local time"""
+    start = activity.get('start_date_local') or activity.get('start_date')
+    return start[:10] if start else None
+
+
+def rollup_rows(activities):
+    """Aggregate raw Strava activity dicts into daily rollup rows (see ROLLUP_COLUMNS)"""
+    daily = DailyRollup()
+    daily.add_page(activities)
+    return daily.rows()
+
+
+class DailyRollup:
+    """Daily rollup rows built up incrementally, one page of raw activity dicts at a time
+
+    Holds one bucket per (local day, activity type), never the activities themselves.
+    """
+
+    def __init__(self):
+        self._buckets = defaultdict(lambda: [0, 0.0, 0, 0.0, 0.0, 0])
+
+    def add_page(self, activities):
+        for activity in activities:
+            day = activity_day(activity)
+            if day is None:
+                continue
+            bucket = self._buckets[(day, normalize_type(activity.get('type') or 'Unknown'))]
+            distance = activity.get('distance') or 0.0
+            moving_time = activity.get('moving_time') or 0
+            bucket[0] += 1
+            bucket[1] += distance
+            bucket[2] += moving_time
+            bucket[3] += activity.get('total_elevation_gain') or 0.0
+            if distance > 0:
+                bucket[4] += moving_time / (distance / METERS_PER_MILE)
+                bucket[5] += 1
+
+    def rows(self):
+        """Rollup rows so far, sorted by day and type"""
+        return [(day, activity_type, *values) for (day, activity_type), values in sorted(self._buckets.items())]
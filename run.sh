@@ -2,9 +2,15 @@
 
 echo "🛑 Stopping any existing Flask processes..."
 pkill -f "python app.py" 2>/dev/null || true
+pkill -f "gunicorn -c gunicorn.conf.py" 2>/dev/null || true
 
 # Wait a moment for processes to stop
 sleep 1
 
+if [ "$1" = "production" ]; then
+    echo "🚀 Starting production server (gunicorn)..."
+    exec gunicorn -c gunicorn.conf.py app:app
+fi
+
 echo "🚀 Starting Flask application..."
 python app.py
@@ -0,0 +1,73 @@
+import numpy as np
+
+# Streak lengths (in days) shown as the next goal on the heatmap tabs
+STREAK_MILESTONES = (7, 14, 30, 60, 100)
+
+
+def compute_streaks(active, start_date, milestones=STREAK_MILESTONES):
+    """Streak and gap metrics for a run of consecutive calendar days
+
+    active is a boolean per day (True = at least one activity) starting at start_date.
+    The days are run-length encoded in one vectorized pass, and every metric is derived
+    from the resulting runs instead of separate Python loops over the days.
+    """
+    active = np.asarray(active, dtype=bool)
+    total_days = int(active.size)
+    if hasattr(start_date, 'date'):
+        # datetime / pandas Timestamp (possibly tz-aware) -> calendar date
+        start_date = start_date.date()
+    first_day = np.datetime64(start_date, 'D')
+
+    metrics = {
+        'current_streak': 0,
+        'longest_streak': 0,
+        'last_active_date': None,
+        'days_since_last': None,
+        'gap_spans': [],
+        'total_gap_days': 0,
+        'longest_gap_days': 0,
+        'active_days': int(active.sum()),
+        'missed_days': total_days - int(active.sum()),
+        'total_days': total_days,
+        'next_milestone': None,
+        'days_to_next_milestone': None,
+        'eta_next_milestone': None,
+    }
+    if total_days == 0:
+        return metrics
+
+    # Run-length encoding: a new run starts wherever the value changes
+    run_starts = np.concatenate(([0], np.flatnonzero(active[1:] != active[:-1]) + 1))
+    run_lengths = np.diff(np.append(run_starts, total_days))
+    run_active = active[run_starts]
+
+    active_lengths = run_lengths[run_active]
+    gap_starts = run_starts[~run_active]
+    gap_lengths = run_lengths[~run_active]
+
+    metrics['current_streak'] = int(run_lengths[-1]) if run_active[-1] else 0
+    metrics['longest_streak'] = int(active_lengths.max(initial=0))
+    metrics['total_gap_days'] = int(gap_lengths.sum())
+    metrics['longest_gap_days'] = int(gap_lengths.max(initial=0))
+
+    if active_lengths.size:
+        last_active = int(run_starts[run_active][-1] + active_lengths[-1] - 1)
+        metrics['last_active_date'] = str(first_day + last_active)
+        metrics['days_since_last'] = total_days - 1 - last_active
+
+    gap_start_dates = (first_day + gap_starts).astype(str)
+    gap_end_dates = (first_day + gap_starts + gap_lengths - 1).astype(str)
+    metrics['gap_spans'] = [
+        {'start': start, 'end': end, 'length': int(length)}
+        for start, end, length in zip(gap_start_dates.tolist(), gap_end_dates.tolist(), gap_lengths.tolist())
+    ]
+
+    for milestone in milestones:
+        if metrics['current_streak'] < milestone:
+            metrics['next_milestone'] = int(milestone)
+            metrics['days_to_next_milestone'] = int(milestone - metrics['current_streak'])
+            last_day = first_day + total_days - 1
+            metrics['eta_next_milestone'] = str(last_day + metrics['days_to_next_milestone'])
+            break
+
+    return metrics
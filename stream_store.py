@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+from activity_parser import STREAM_KEYS
+
+logger = logging.getLogger(__name__)
+
+# Stream samples concatenated into one kernel call: enough to amortize the per-call overhead
+# over many short streams while the searched axis stays cache-sized (larger batches are slower)
+KERNEL_BATCH_POINTS = 8192
+
+
+class StreamStore:
+    """Activity streams (time, distance, heartrate, altitude) as memory-mappable NumPy arrays
+
+    One .npy file per activity (<root>/<athlete_id>/<activity_id>.npy) holds a float32
+    array of shape (len(STREAM_KEYS), samples), one row per stream in STREAM_KEYS order
+    and NaN for a stream Strava did not record. Files are written once, moved into place
+    atomically, and opened with mmap_mode='r', so reading a row only pages in that row.
+    Which activities have streams is tracked in the ActivityStore (activity_streams).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, athlete_id, activity_id):
+        return os.path.join(self.root, str(athlete_id), f'{activity_id}.npy')
+
+    def save(self, athlete_id, activity_id, streams):
+        """Store one activity's streams (as parse_activity_streams returns them); returns the sample count"""
+        samples = len(streams.get('time') or ())
+        if not samples or len(streams.get('distance') or ()) != samples:
+            return 0  # no GPS (or truncated streams): nothing a best effort can be computed from
+        array = np.full((len(STREAM_KEYS), samples), np.nan, dtype='float32')
+        for row, key in enumerate(STREAM_KEYS):
+            values = streams.get(key)
+            if values is not None and len(values) == samples:
+                array[row] = np.asarray(values, dtype='float32')
+        path = self.path(athlete_id, activity_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temp_path, path)
+        return samples
+
+    def load(self, athlete_id, activity_id):
+        """Memory-mapped (len(STREAM_KEYS), samples) array of an activity, or None if it has none"""
+        try:
+            return np.load(self.path(athlete_id, activity_id), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+
+
+def fastest_times(streams, distances):
+    """Fastest elapsed time over each distance within each activity, from its time and distance streams
+
+    streams is a list of (time, distance) sample arrays, one pair per activity; returns a
+    float64 array of shape (len(streams), len(distances)), NaN where an activity is shorter
+    than the distance. An effort starts at any sample and ends where the distance stream
+    reaches start + distance, with the end time interpolated between the two samples
+    around it (as Strava's best efforts do).
+
+    All activities are searched at once: their distance streams are concatenated into one
+    non-decreasing axis, each shifted to start where the previous one ends, so one
+    searchsorted per distance finds every effort's end (the vectorized form of a two-pointer
+    scan). An end past the activity's own last sample means the effort does not fit.
+    """
+    distances = np.asarray(distances, dtype='float64')
+    result = np.full((len(streams), len(distances)), np.nan)
+    kept = [index for index, (_, distance) in enumerate(streams) if len(distance) >= 2]
+    if not kept or not len(distances):
+        return result
+
+    lengths = np.array([len(streams[index][1]) for index in kept])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    time = np.concatenate([np.asarray(streams[index][0], dtype='float64') for index in kept])
+    segments = []
+    offset = 0.0
+    for index in kept:
+        # GPS corrections can make the cumulative distance dip; searchsorted needs it sorted
+        distance = np.maximum.accumulate(np.asarray(streams[index][1], dtype='float64'))
+        segments.append(distance - distance[0] + offset)
+        offset = segments[-1][-1]
+    axis = np.concatenate(segments)
+    # Where each sample's own activity ends on the axis: an effort ending past it does not fit
+    activity_end = np.repeat([segment[-1] for segment in segments], lengths)
+
+    best = np.empty((len(kept), len(distances)))
+    for column, target in enumerate(distances):
+        ends = axis + target
+        end_index = np.minimum(np.searchsorted(axis, ends, side='left'), len(axis) - 1)
+        previous = np.maximum(end_index - 1, 0)
+        valid = ends <= activity_end
+        span = axis[end_index] - axis[previous]
+        fraction = np.divide(ends - axis[previous], span, out=np.ones_like(span), where=span > 0)
+        end_time = time[previous] + fraction * (time[end_index] - time[previous])
+        elapsed = np.where(valid, end_time - time, np.inf)
+        best[:, column] = np.minimum.reduceat(elapsed, starts)
+    best[np.isinf(best)] = np.nan
+    result[kept] = best
+    return result
+
+
+def update_stream_efforts(stream_store, store, athlete_id, distances):
+    """Compute and cache the fastest times over distances for activities whose streams have none yet
+
+    Only activities with streams missing a cached time for one of the distances are loaded,
+    so a new stream or a new distance costs work proportional to it alone. distances must be
+    ones the cache keeps (see ActivityStore.touch_effort_distances). Returns the number of
+    activities computed.
+    """
+    activity_ids = store.streams_missing_efforts(athlete_id, distances)
+    for batch, times in _kernel_batches(stream_store, athlete_id, activity_ids, distances):
+        store.save_stream_efforts(athlete_id, [
+            (activity_id, distance, None if np.isnan(elapsed) else float(elapsed))
+            for activity_id, row in zip(batch, times) for distance, elapsed in zip(distances, row)])
+    if activity_ids:
+        logger.debug('Computed stream efforts for %d activities of athlete %s', len(activity_ids), athlete_id)
+    return len(activity_ids)
+
+
+def fastest_efforts(stream_store, athlete_id, runs, distances):
+    """Fastest effort per distance among runs ((activity_id, start_date_local) pairs), without caching
+
+    For distances the cache does not keep; returns the same shape as
+    ActivityStore.get_stream_efforts, keyed by distance.
+    """
+    dates = dict(runs)
+    best = {}
+    for batch, times in _kernel_batches(stream_store, athlete_id, list(dates), distances):
+        for activity_id, row in zip(batch, times):
+            for distance, elapsed in zip(distances, row):
+                if not np.isnan(elapsed) and (distance not in best or elapsed < best[distance]['elapsed_time']):
+                    best[distance] = {'distance': distance, 'activity_id': activity_id,
+                                      'elapsed_time': float(elapsed), 'start_date_local': dates[activity_id]}
+    return best
+
+
+def _kernel_batches(stream_store, athlete_id, activity_ids, distances):
+    """(activity ids, fastest_times result) for activity_ids, KERNEL_BATCH_POINTS samples at a time"""
+    time_row, distance_row = STREAM_KEYS.index('time'), STREAM_KEYS.index('distance')
+    done = 0
+    while done < len(activity_ids):
+        batch, streams, points = [], [], 0
+        for activity_id in activity_ids[done:]:
+            array = stream_store.load(athlete_id, activity_id)
+            batch.append(activity_id)
+            streams.append((array[time_row], array[distance_row]) if array is not None else ((), ()))
+            points += array.shape[1] if array is not None else 0
+            if points >= KERNEL_BATCH_POINTS:
+                break
+        yield batch, fastest_times(streams, distances)
+        done += len(batch)
@@ -0,0 +1,530 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Job kinds: 'import' pulls everything since job['since'] (0 = full history),
+# 'sync' only pulls activities newer than the last synced one, 'details' fetches best
+# efforts and splits for runs that have none yet, and 'streams' their activity streams
+IMPORT, SYNC, DETAILS, STREAMS = 'import', 'sync', 'details', 'streams'
+# Each athlete has at most one queued or running job per lane: detail and stream fetches
+# run alongside syncs and never hold one up
+SYNC_KINDS = (IMPORT, SYNC)
+DETAIL_KINDS = (DETAILS, STREAMS)
+# Delay before retrying a failed job, doubled per attempt
+RETRY_BASE_SECONDS = 60
+MAX_ATTEMPTS = 4
+# Tokens are not refreshed, so a job without a valid one fails at once instead of retrying
+TOKEN_ERROR = 'No valid Strava access token, log in again to resume syncing'
+
+
+class MemoryQueueBackend:
+    """Job queue kept in process memory; jobs and tokens are lost on restart"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._tokens = {}
+        self._next_id = 1
+
+    def push(self, athlete_id, kind, since=None, run_at=None):
+        """Queue a job unless the athlete has one queued or running in its lane; returns that job or the new one"""
+        with self._lock:
+            for job in self._jobs.values():
+                if (job['athlete_id'] == athlete_id and job['status'] in ('queued', 'running')
+                        and job['kind'] in _lane(kind)):
+                    return dict(job)
+            job = {'id': self._next_id, 'athlete_id': athlete_id, 'kind': kind, 'since': since,
+                   'status': 'queued', 'attempts': 0, 'run_at': run_at or time.time(),
+                   'created_at': time.time(), 'error': None, 'worker': None, 'started_at': None,
+                   'fetched': None}
+            self._jobs[job['id']] = job
+            self._next_id += 1
+            return dict(job)
+
+    def claim(self):
+        """Mark the oldest due queued job as running and return it, or None"""
+        with self._lock:
+            due = [job for job in self._jobs.values() if job['status'] == 'queued' and job['run_at'] <= time.time()]
+            if not due:
+                return None
+            job = min(due, key=lambda job: (job['run_at'], job['id']))
+            job.update(status='running', worker=os.getpid(), started_at=time.time(), fetched=0)
+            job['attempts'] += 1
+            return dict(job)
+
+    def progress(self, job_id, fetched):
+        """Record how many activities a running job has fetched so far"""
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]['fetched'] = fetched
+
+    def finish(self, job_id):
+        """Drop a completed job along with the athlete's earlier failures in the same lane"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                for other in [other for other in self._jobs.values()
+                              if other['athlete_id'] == job['athlete_id'] and other['status'] == 'failed'
+                              and other['kind'] in _lane(job['kind'])]:
+                    del self._jobs[other['id']]
+
+    def retry(self, job_id, run_at, error):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status='queued', run_at=run_at, error=error, worker=None, started_at=None, fetched=None)
+
+    def fail(self, job_id, error):
+        """Mark a job failed, replacing the athlete's earlier failure in the same lane"""
+        with self._lock:
+            job = self._jobs[job_id]
+            for other in [other for other in self._jobs.values()
+                          if other['athlete_id'] == job['athlete_id'] and other['status'] == 'failed'
+                          and other['kind'] in _lane(job['kind'])]:
+                del self._jobs[other['id']]
+            job.update(status='failed', error=error)
+
+    def active_job(self, athlete_id, kinds=None):
+        """The athlete's queued or running job (of one of kinds, if given), if any"""
+        with self._lock:
+            for job in self._jobs.values():
+                if (job['athlete_id'] == athlete_id and job['status'] in ('queued', 'running')
+                        and (kinds is None or job['kind'] in kinds)):
+                    return dict(job)
+        return None
+
+    def last_failure(self, athlete_id, kinds=None):
+        with self._lock:
+            failed = [job for job in self._jobs.values()
+                      if job['athlete_id'] == athlete_id and job['status'] == 'failed'
+                      and (kinds is None or job['kind'] in kinds)]
+        return dict(max(failed, key=lambda job: job['id'])) if failed else None
+
+    def depth(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+
+    def recover(self):
+        """Requeue jobs whose worker process is gone"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job['status'] == 'running' and _orphaned(job['worker']):
+                    job['status'] = 'queued'
+
+    def save_token(self, athlete_id, access_token, expires_at=None):
+        with self._lock:
+            self._tokens[athlete_id] = (access_token, expires_at)
+
+    def get_token(self, athlete_id):
+        with self._lock:
+            return self._tokens.get(athlete_id, (None, None))
+
+    def athletes(self):
+        with self._lock:
+            return list(self._tokens)
+
+
+class SQLiteQueueBackend:
+    """Job queue persisted in SQLite, so pending imports survive restarts"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS sync_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    athlete_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    since INTEGER,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    error TEXT,
+                    worker INTEGER,
+                    started_at REAL,
+                    fetched INTEGER,
+                    lane TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_sync_jobs_status_run_at ON sync_jobs (status, run_at);
+                CREATE TABLE IF NOT EXISTS sync_tokens (
+                    athlete_id INTEGER PRIMARY KEY,
+                    access_token TEXT NOT NULL,
+                    expires_at INTEGER
+                );
+            ''')
+            # Queues created before jobs had a lane: fill it in and drop duplicate active jobs
+            if 'lane' not in {row['name'] for row in conn.execute('PRAGMA table_info(sync_jobs)')}:
+                conn.execute('ALTER TABLE sync_jobs ADD COLUMN lane TEXT')
+            conn.execute(f'''
+                UPDATE sync_jobs SET lane = CASE WHEN kind IN ({','.join('?' * len(DETAIL_KINDS))})
+                    THEN ? ELSE ? END
+                WHERE lane IS NULL
+            ''', (*DETAIL_KINDS, _lane_name(DETAILS), _lane_name(SYNC)))
+            conn.execute('''
+                DELETE FROM sync_jobs WHERE status IN ('queued', 'running') AND id NOT IN (
+                    SELECT MIN(id) FROM sync_jobs WHERE status IN ('queued', 'running') GROUP BY athlete_id, lane)
+            ''')
+            # At most one queued or running job per athlete and lane, even across processes
+            conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_active_lane ON sync_jobs (athlete_id, lane)
+                WHERE status IN ('queued', 'running')
+            ''')
+
+    @contextmanager
+    def _connect(self):
+        # Same short-lived connection per operation pattern as ActivityStore
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def push(self, athlete_id, kind, since=None, run_at=None):
+        # The unique index on active (athlete_id, lane) makes the check and the insert one step,
+        # so processes sharing the queue (or a page load racing the scheduler) can't both queue
+        lane = _lane_name(kind)
+        while True:
+            now = time.time()
+            with self._lock, self._connect() as conn:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO sync_jobs (athlete_id, kind, lane, since, status, run_at, created_at)
+                    VALUES (?, ?, ?, ?, 'queued', ?, ?)
+                ''', (athlete_id, kind, lane, since, run_at or now, now))
+                if cursor.rowcount:
+                    row = conn.execute('SELECT * FROM sync_jobs WHERE id = ?', (cursor.lastrowid,)).fetchone()
+                else:
+                    row = conn.execute('''
+                        SELECT * FROM sync_jobs WHERE athlete_id = ? AND lane = ? AND status IN ('queued', 'running')
+                    ''', (athlete_id, lane)).fetchone()
+            if row is not None:  # None only if the active job finished in between: try again
+                return dict(row)
+
+    def claim(self):
+        with self._lock, self._connect() as conn:
+            row = conn.execute('''
+                SELECT * FROM sync_jobs WHERE status = 'queued' AND run_at <= ?
+                ORDER BY run_at, id LIMIT 1
+            ''', (time.time(),)).fetchone()
+            if row is None:
+                return None
+            # Conditional so another process sharing the queue can't claim the same job
+            now = time.time()
+            claimed = conn.execute('''
+                UPDATE sync_jobs SET status = 'running', attempts = attempts + 1,
+                    worker = ?, started_at = ?, fetched = 0
+                WHERE id = ? AND status = 'queued'
+            ''', (os.getpid(), now, row['id'])).rowcount
+            if not claimed:
+                return None
+        job = dict(row)
+        job.update(status='running', attempts=job['attempts'] + 1, worker=os.getpid(), started_at=now, fetched=0)
+        return job
+
+    def progress(self, job_id, fetched):
+        # Kept in the row so any process serving /api/sync-status can report it
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE sync_jobs SET fetched = ? WHERE id = ?', (fetched, job_id))
+
+    def finish(self, job_id):
+        with self._lock, self._connect() as conn:
+            job = conn.execute('SELECT athlete_id, kind FROM sync_jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is None:
+                return
+            kinds = _lane(job['kind'])
+            conn.execute(f'''
+                DELETE FROM sync_jobs
+                WHERE id = ? OR (status = 'failed' AND athlete_id = ? AND kind IN ({','.join('?' * len(kinds))}))
+            ''', (job_id, job['athlete_id'], *kinds))
+
+    def retry(self, job_id, run_at, error):
+        with self._lock, self._connect() as conn:
+            conn.execute('''
+                UPDATE sync_jobs SET status = 'queued', run_at = ?, error = ?,
+                    worker = NULL, started_at = NULL, fetched = NULL
+                WHERE id = ?
+            ''', (run_at, error, job_id))
+
+    def fail(self, job_id, error):
+        with self._lock, self._connect() as conn:
+            job = conn.execute('SELECT athlete_id, kind FROM sync_jobs WHERE id = ?', (job_id,)).fetchone()
+            if job is None:
+                return
+            kinds = _lane(job['kind'])
+            conn.execute(f'''
+                DELETE FROM sync_jobs
+                WHERE status = 'failed' AND athlete_id = ? AND kind IN ({','.join('?' * len(kinds))})
+            ''', (job['athlete_id'], *kinds))
+            conn.execute("UPDATE sync_jobs SET status = 'failed', error = ? WHERE id = ?", (error, job_id))
+
+    def active_job(self, athlete_id, kinds=None):
+        with self._connect() as conn:
+            row = conn.execute(f'''
+                SELECT * FROM sync_jobs WHERE athlete_id = ? AND status IN ('queued', 'running'){_kind_filter(kinds)}
+                ORDER BY id LIMIT 1
+            ''', (athlete_id, *(kinds or ()))).fetchone()
+        return dict(row) if row else None
+
+    def last_failure(self, athlete_id, kinds=None):
+        with self._connect() as conn:
+            row = conn.execute(f'''
+                SELECT * FROM sync_jobs WHERE athlete_id = ? AND status = 'failed'{_kind_filter(kinds)}
+                ORDER BY id DESC LIMIT 1
+            ''', (athlete_id, *(kinds or ()))).fetchone()
+        return dict(row) if row else None
+
+    def depth(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sync_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def recover(self):
+        # Several server processes may share the queue, so only requeue the jobs of dead ones
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("SELECT id, worker FROM sync_jobs WHERE status = 'running'").fetchall()
+            orphans = [(row['id'],) for row in rows if _orphaned(row['worker'])]
+            conn.executemany("UPDATE sync_jobs SET status = 'queued' WHERE id = ?", orphans)
+
+    def save_token(self, athlete_id, access_token, expires_at=None):
+        with self._lock, self._connect() as conn:
+            conn.execute('''
+                INSERT INTO sync_tokens (athlete_id, access_token, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (athlete_id) DO UPDATE SET
+                    access_token = excluded.access_token,
+                    expires_at = COALESCE(excluded.expires_at, expires_at)
+            ''', (athlete_id, access_token, expires_at))
+
+    def get_token(self, athlete_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT access_token, expires_at FROM sync_tokens WHERE athlete_id = ?',
+                               (athlete_id,)).fetchone()
+        return (row['access_token'], row['expires_at']) if row else (None, None)
+
+    def athletes(self):
+        with self._connect() as conn:
+            return [row['athlete_id'] for row in conn.execute('SELECT athlete_id FROM sync_tokens')]
+
+
+class SyncWorker:
+    """Background threads that keep each athlete's local activity store current
+
+    Jobs come from a pluggable queue backend (MemoryQueueBackend or SQLiteQueueBackend)
+    and run StravaAPI.sync_activities, so page requests only ever read the local store.
+    A scheduler thread enqueues an incremental sync for every known athlete each
+    interval; at most one job per athlete is queued or running at a time. Failed jobs
+    are retried with exponential backoff before being marked failed, and only the latest
+    failure per athlete and lane is kept. Athletes whose stored token has expired are
+    not scheduled, and a job without a valid token fails without retries.
+
+    With fetch_details, every finished job queues a 'details' job (in its own lane) while
+    the athlete has runs without details and the rate limiter has budget to spare, then
+    'streams' jobs the same way if the StravaAPI has a stream store.
+    """
+
+    def __init__(self, strava_api, backend, workers=1, interval=300, poll_interval=1.0, fetch_details=False):
+        self.strava_api = strava_api
+        self.backend = backend
+        self.fetch_details = fetch_details
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        """Start the worker and scheduler threads (safe to call more than once)"""
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            self.backend.recover()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'sync-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            scheduler = threading.Thread(target=self._schedule, name='sync-scheduler', daemon=True)
+            scheduler.start()
+            self._threads.append(scheduler)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        with self._wake:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def remember_token(self, athlete_id, access_token, expires_at=None):
+        """Keep the athlete's latest access token for background jobs"""
+        self.backend.save_token(athlete_id, access_token, expires_at)
+
+    def enqueue(self, athlete_id, kind=SYNC, since=None):
+        """Queue a job unless the athlete already has one queued or running in its lane; returns the job"""
+        job = self.backend.push(athlete_id, kind, since)
+        with self._wake:
+            self._wake.notify()
+        return job
+
+    def enqueue_if_stale(self, athlete_id):
+        """Queue an incremental sync if the last one is older than the store's sync interval
+
+        Athletes whose stored token has expired are skipped: the job could only fail.
+        """
+        if not _token_valid(*self.backend.get_token(athlete_id)):
+            return None
+        state = self.strava_api.store.get_sync_state(athlete_id)
+        if state is None or time.time() - state['synced_at'] >= self.strava_api.min_sync_interval:
+            return self.enqueue(athlete_id, SYNC)
+        return None
+
+    def status(self, athlete_id):
+        """JSON-serializable sync status for an athlete"""
+        job = self.backend.active_job(athlete_id, SYNC_KINDS)
+        details = self.backend.active_job(athlete_id, DETAIL_KINDS)
+        state = self.strava_api.store.get_sync_state(athlete_id)
+        running = job is not None and job['status'] == 'running'
+        failure = self.backend.last_failure(athlete_id, SYNC_KINDS) if job is None else None
+        return {
+            'state': job['status'] if job else ('failed' if failure else 'idle'),
+            'job': job['kind'] if job else None,
+            'attempts': job['attempts'] if job else None,
+            'activities_fetched': job['fetched'] if running else None,
+            'running_for_seconds': round(time.time() - job['started_at'], 1) if running else None,
+            'error': (job or failure or {}).get('error'),
+            'has_data': state is not None,
+            'last_synced_at': state['synced_at'] if state else None,
+            'data_version': self.strava_api.store.get_data_version(athlete_id),
+            'queue_depth': self.backend.depth(),
+            'details': details['status'] if details else None,
+        }
+
+    def run_pending(self):
+        """Run due jobs on the calling thread until none are left (for tests and scripts)"""
+        while self._run_one():
+            pass
+
+    def _work(self):
+        while not self._stop.is_set():
+            if not self._run_one():
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+
+    def _schedule(self):
+        while not self._stop.wait(self.interval):
+            for athlete_id in self.backend.athletes():
+                try:
+                    self.enqueue_if_stale(athlete_id)
+                except Exception:
+                    logger.exception('Could not schedule sync for athlete %s', athlete_id)
+
+    def _run_one(self):
+        job = self.backend.claim()
+        if job is None:
+            return False
+        athlete_id = job['athlete_id']
+        try:
+            error = self._run(job)
+        except Exception as e:
+            logger.exception('Sync job %s failed', job['id'])
+            error = str(e)
+
+        if error is None:
+            self.backend.finish(job['id'])
+            if self.fetch_details:
+                self._queue_details(athlete_id)
+        elif error != TOKEN_ERROR and job['attempts'] < MAX_ATTEMPTS:
+            delay = RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1)
+            logger.warning('Sync job %s for athlete %s failed (%s), retrying in %ds',
+                           job['id'], athlete_id, error, delay)
+            self.backend.retry(job['id'], time.time() + delay, error)
+        else:
+            logger.error('Sync job %s for athlete %s failed permanently: %s', job['id'], athlete_id, error)
+            self.backend.fail(job['id'], error)
+        return True
+
+    def _queue_details(self, athlete_id):
+        try:
+            if self.strava_api.details_pending(athlete_id):
+                self.enqueue(athlete_id, DETAILS)
+            elif self.strava_api.streams_pending(athlete_id):
+                self.enqueue(athlete_id, STREAMS)
+        except Exception:
+            logger.exception('Could not queue activity details for athlete %s', athlete_id)
+
+    def _run(self, job):
+        """Run one job; returns None on success or an error message"""
+        athlete_id = job['athlete_id']
+        access_token, expires_at = self.backend.get_token(athlete_id)
+        if not _token_valid(access_token, expires_at):
+            return TOKEN_ERROR
+
+        def progress(fetched):
+            self.backend.progress(job['id'], fetched)
+
+        if job['kind'] == DETAILS:
+            return self.strava_api.fetch_activity_details(access_token, athlete_id, progress=progress)
+        if job['kind'] == STREAMS:
+            return self.strava_api.fetch_activity_streams(access_token, athlete_id, progress=progress)
+        now = int(time.time())
+        if job['kind'] == IMPORT:
+            since = job['since'] or 0
+            return self.strava_api.sync_activities(access_token, athlete_id, since, now,
+                                                   progress=progress, force=True)
+        state = self.strava_api.store.get_sync_state(athlete_id)
+        since = state['covered_from'] if state else 0
+        return self.strava_api.sync_activities(access_token, athlete_id, since, now, progress=progress)
+
+
+def _token_valid(access_token, expires_at):
+    """Whether a stored token can still be used (Strava's expire after six hours)"""
+    return access_token is not None and not (expires_at and expires_at < time.time())
+
+
+def _lane(kind):
+    """Job kinds that share kind's one-job-per-athlete lane"""
+    return DETAIL_KINDS if kind in DETAIL_KINDS else SYNC_KINDS
+
+
+def _lane_name(kind):
+    """Name of kind's lane, as stored in sync_jobs.lane"""
+    return DETAILS if kind in DETAIL_KINDS else SYNC
+
+
+def _kind_filter(kinds):
+    """SQL condition (with a leading AND) restricting sync_jobs to kinds, if given"""
+    return f" AND kind IN ({','.join('?' * len(kinds))})" if kinds else ''
+
+
+def _orphaned(pid):
+    """Whether a job claimed by process pid can no longer be running"""
+    if pid is None or pid == os.getpid():
+        # Either never claimed or left over from before this process started
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def queue_backend(kind, path):
+    """Build the queue backend named by SYNC_QUEUE_BACKEND ('sqlite' or 'memory')"""
+    if kind == 'memory':
+        return MemoryQueueBackend()
+    if kind == 'sqlite':
+        return SQLiteQueueBackend(path)
+    raise ValueError(f'Unknown sync queue backend: {kind}')